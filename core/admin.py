@@ -1,11 +1,29 @@
 # /var/www/gea/core/admin.py
 
 from django.contrib import admin
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, When
+from django.db.models.functions import ExtractDay, Now
 from django.utils import timezone
+from . import busca, distribuicao, exportacao
+from .hierarquia import DEPARTAMENTO, DIVISAO, obter_arvore
 from .models import (
-    Entidade, Secretaria, Departamento, Divisao, 
-    CartaDeServicos, Processo
+    Entidade, Secretaria, Departamento, Divisao, Lotacao,
+    CartaDeServicos, Processo, ProcessoEvento, Calendario, Feriado, TransicaoPrazo, STATUS_ABERTOS
 )
+from .paginacao import PaginadorEstimado
+from .prazos import recalcular_prazos_abertos
+
+# --- AÇÕES ---
+
+@admin.action(description='Exportar selecionados (CSV)')
+def exportar_csv(modeladmin, request, queryset):
+    return exportacao.exportar(queryset, 'csv', request)
+
+
+@admin.action(description='Exportar selecionados (XLSX)')
+def exportar_xlsx(modeladmin, request, queryset):
+    return exportacao.exportar(queryset, 'xlsx', request)
+
 
 # --- INLINES ---
 
@@ -13,48 +31,152 @@ class DepartamentoInline(admin.TabularInline):
     model = Departamento
     extra = 1
 
+class FeriadoInline(admin.TabularInline):
+    model = Feriado
+    extra = 1
+
+class ProcessoEventoInline(admin.TabularInline):
+    # Histórico somente leitura (core.eventos)
+    model = ProcessoEvento
+    fields = ('registrado_em', 'origem', 'status_anterior', 'status', 'responsavel_anterior', 'responsavel', 'data_conclusao')
+    readonly_fields = fields
+    ordering = ('-registrado_em',)
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('responsavel_anterior', 'responsavel')
+
+# --- FILTROS ---
+
+class SecretariaCacheadaFilter(admin.RelatedFieldListFilter):
+    """Opções do filtro de secretaria vindas da árvore da hierarquia em memória (core.hierarquia)."""
+
+    def field_choices(self, field, request, model_admin):
+        return [(no.id, f"{no.nome} ({no.sigla})") for no in obter_arvore().secretarias()]
+
+
+class DepartamentoCacheadoFilter(admin.RelatedFieldListFilter):
+    """Departamentos da árvore em memória, com a sigla da secretaria (os nomes se repetem entre elas)."""
+
+    def field_choices(self, field, request, model_admin):
+        arvore = obter_arvore()
+        return [
+            (no.id, f"{no.nome} ({secretaria.sigla})")
+            for secretaria in arvore.secretarias()
+            for no in arvore.descendentes(secretaria.tipo, secretaria.id, so_tipo=DEPARTAMENTO)
+        ]
+
 # --- MODEL ADMINS ---
 
+@admin.register(Calendario)
+class CalendarioAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'contagem')
+    inlines = [FeriadoInline]
+    actions = ['recalcular_prazos']
+
+    @admin.action(description='Recalcular prazos dos processos em aberto')
+    def recalcular_prazos(self, request, queryset):
+        alterados = sum(recalcular_prazos_abertos(calendario.pk) for calendario in queryset)
+        self.message_user(request, f"{alterados} processos tiveram o prazo recalculado.")
+
 @admin.register(Entidade)
 class EntidadeAdmin(admin.ModelAdmin):
-    list_display = ('nome',)
+    list_display = ('nome', 'calendario')
     search_fields = ('nome',)
 
 @admin.register(Secretaria)
 class SecretariaAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'sigla')
+    list_display = ('nome', 'sigla', 'calendario')
     search_fields = ('nome', 'sigla')
     inlines = [DepartamentoInline]
 
+# Departamento e Divisão: secretaria/departamento de cada linha e opções dos filtros vêm da
+# árvore em memória (core.hierarquia), sem JOIN nem consulta por linha
+
 @admin.register(Departamento)
 class DepartamentoAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'secretaria')
-    list_filter = ('secretaria',)
+    list_display = ('nome', 'secretaria_da_arvore')
+    list_filter = (('secretaria', SecretariaCacheadaFilter),)
     search_fields = ('nome',)
 
+    @admin.display(description='Secretaria', ordering='secretaria__sigla')
+    def secretaria_da_arvore(self, obj):
+        return obter_arvore().sigla(obj.secretaria_id)
+
 @admin.register(Divisao)
 class DivisaoAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'departamento')
-    list_filter = ('departamento__secretaria', 'departamento')
+    list_display = ('nome', 'departamento_da_arvore', 'secretaria_da_arvore')
+    list_filter = (('departamento__secretaria', SecretariaCacheadaFilter), ('departamento', DepartamentoCacheadoFilter))
     search_fields = ('nome',)
 
+    @admin.display(description='Departamento', ordering='departamento__nome')
+    def departamento_da_arvore(self, obj):
+        departamento = obter_arvore().departamento(obj.departamento_id)
+        return departamento.nome if departamento else None
+
+    @admin.display(description='Secretaria', ordering='departamento__secretaria__sigla')
+    def secretaria_da_arvore(self, obj):
+        secretaria = obter_arvore().secretaria_de(DIVISAO, obj.pk)
+        return secretaria.sigla if secretaria else None
+
+@admin.register(Lotacao)
+class LotacaoAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'divisao', 'recebe_distribuicao', 'carga_aberta')
+    list_filter = ('recebe_distribuicao', ('divisao__departamento__secretaria', SecretariaCacheadaFilter))
+    list_select_related = ('usuario', 'divisao')
+    autocomplete_fields = ('usuario',)
+    search_fields = ('usuario__username', 'usuario__first_name', 'divisao__nome')
+
+    def get_queryset(self, request):
+        # Subconsulta por linha da página (processo_aberto_resp_idx), não um GROUP BY da tabela toda
+        abertos = Processo.objects.filter(responsavel_atual=OuterRef('usuario'), status__in=STATUS_ABERTOS).order_by()
+        return super().get_queryset(request).annotate(
+            carga=Subquery(abertos.values('responsavel_atual').annotate(total=Count('pk')).values('total')),
+        )
+
+    @admin.display(description='Processos em Aberto', ordering='carga')
+    def carga_aberta(self, obj):
+        return obj.carga or 0
+
 @admin.register(CartaDeServicos)
 class CartaDeServicosAdmin(admin.ModelAdmin):
     # 4. ATUALIZAMOS O ADMIN DA CARTA DE SERVIÇOS
-    list_display = ('nome_servico', 'entidade', 'forma_solicitacao', 'tipo_sistema')
-    list_filter = ('entidade', 'forma_solicitacao', 'tipo_sistema', 'divisao_responsavel__departamento__secretaria')
+    list_display = ('nome_servico', 'entidade', 'forma_solicitacao', 'tipo_sistema', 'canal')
+    list_filter = ('canal', 'entidade', 'forma_solicitacao', 'tipo_sistema', ('secretaria', SecretariaCacheadaFilter), ('removido_em', admin.EmptyFieldListFilter))
+    list_select_related = ('entidade',)
+    # A busca usa o vetor textual (core.busca); search_fields só habilita a caixa de busca
     search_fields = ('nome_servico', 'orgao_responsavel')
+    # Calculados no save() a partir de forma_solicitacao e tipo_sistema; origem gravada pela importação
+    readonly_fields = ('canal', 'sistema', 'arquivo_origem', 'linha_origem')
+    actions = [exportar_csv, exportar_xlsx]
     # Removemos o inline antigo
     inlines = [] 
 
+    def get_search_results(self, request, queryset, search_term):
+        return busca.filtrar_servicos(queryset, search_term), False
+
 @admin.register(Processo)
 class ProcessoAdmin(admin.ModelAdmin):
     list_display = ('numero_protocolo', 'servico_solicitado', 'status', 'data_prazo', 'responsavel_atual', 'dias_em_aberto')
-    list_filter = ('status', 'servico_solicitado__divisao_responsavel__departamento__secretaria', 'data_prazo')
+    list_filter = ('status', 'situacao_prazo', ('secretaria', SecretariaCacheadaFilter), 'data_prazo')
+    # __str__ de Processo e as colunas de FK leem estes objetos: um JOIN em vez de uma consulta por linha
+    list_select_related = ('servico_solicitado', 'responsavel_atual')
+    # A busca usa o vetor textual (core.busca); search_fields só habilita a caixa de busca
     search_fields = ('numero_protocolo', 'solicitante', 'responsavel_atual__username')
+    autocomplete_fields = ('servico_solicitado', 'responsavel_atual')
     readonly_fields = ('data_protocolo', 'data_prazo')
+    # Em tabelas grandes: total estimado pelo planejador e sem o segundo COUNT(*) da tabela inteira.
+    # A date_hierarchy é servida do cache pelo template admin/core/processo/change_list.html
+    # (sem filtros, a partir dos dias gravados pela tarefa core.tasks.atualizar_resumos_datas).
+    paginator = PaginadorEstimado
+    show_full_result_count = False
     date_hierarchy = 'data_protocolo'
-    actions = ['marcar_como_concluido']
+    actions = ['marcar_como_concluido', 'distribuir_automaticamente', exportar_csv, exportar_xlsx]
+    inlines = [ProcessoEventoInline]
 
     fieldsets = (
         ('Informações Gerais', {
@@ -71,13 +193,52 @@ class ProcessoAdmin(admin.ModelAdmin):
         }),
     )
 
-    @admin.display(description='Dias em Aberto')
+    def get_queryset(self, request):
+        # Dias em aberto calculados pelo banco (e ordenáveis na changelist)
+        return super().get_queryset(request).annotate(
+            dias_aberto=Case(
+                When(~Q(status='CONCLUIDO'), then=ExtractDay(Now() - F('data_protocolo'))),
+                output_field=IntegerField(),
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        return busca.filtrar_processos(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Aberto e sem responsável: o sistema escolhe alguém da divisão do serviço
+        if obj.responsavel_atual_id is None and obj.status in STATUS_ABERTOS:
+            atribuicoes = distribuicao.distribuir(Processo.objects.filter(pk=obj.pk))
+            obj.responsavel_atual_id = atribuicoes.get(obj.pk)
+
+    @admin.display(description='Dias em Aberto', ordering='dias_aberto')
     def dias_em_aberto(self, obj):
-        if obj.status != 'CONCLUIDO' and obj.data_protocolo:
-            return (timezone.now() - obj.data_protocolo).days
-        return "-"
+        return "-" if obj.dias_aberto is None else obj.dias_aberto
 
     @admin.action(description='Marcar processos selecionados como Concluído')
     def marcar_como_concluido(self, request, queryset):
-        queryset.update(status='CONCLUIDO', data_conclusao=timezone.now())
-        self.message_user(request, f"{queryset.count()} processos foram marcados como concluídos.")
\ No newline at end of file
+        pendentes = Processo.objects.filter(pk__in=list(queryset.exclude(status='CONCLUIDO').values_list('pk', flat=True)))
+        # update() não passa pelo save(): métricas e histórico são ajustados em lote pelo ProcessoQuerySet
+        atualizados = pendentes.update(status='CONCLUIDO', data_conclusao=timezone.now())
+        self.message_user(request, f"{atualizados} processos foram marcados como concluídos.")
+
+    @admin.action(description='Distribuir automaticamente os selecionados sem responsável')
+    def distribuir_automaticamente(self, request, queryset):
+        atribuicoes = distribuicao.distribuir(Processo.objects.filter(pk__in=list(queryset.values_list('pk', flat=True))))
+        self.message_user(request, f"{len(atribuicoes)} processos receberam um responsável.")
+
+
+@admin.register(TransicaoPrazo)
+class TransicaoPrazoAdmin(admin.ModelAdmin):
+    # Histórico gravado por core.alertas: só consulta
+    list_display = ('processo', 'situacao_anterior', 'situacao_nova', 'data', 'responsavel', 'notificada_em')
+    list_filter = ('situacao_nova', 'data')
+    list_select_related = ('processo__servico_solicitado', 'responsavel')
+    search_fields = ('processo__numero_protocolo', 'responsavel__username')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
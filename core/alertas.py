@@ -0,0 +1,134 @@
+# /var/www/gea/core/alertas.py
+
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Processo, SituacaoPrazo, TransicaoPrazo
+
+# Verificação periódica dos prazos (tarefa core.tasks.verificar_prazos).
+# Processo.situacao_prazo guarda a última situação registrada; só entram na varredura os
+# processos em aberto cuja situação registrada não bate com o prazo, e cada caso é uma faixa
+# de processo_situacao_prazo_idx (situacao_prazo, data_prazo). Rodar de novo não acha nada.
+
+TAMANHO_LOTE = 1000
+
+
+def antecedencia_padrao():
+    return getattr(settings, 'GEA_ALERTA_ANTECEDENCIA_DIAS', 3)
+
+
+def situacao_para(data_prazo, hoje, antecedencia):
+    if data_prazo < hoje:
+        return SituacaoPrazo.ATRASADO
+    if data_prazo <= hoje + datetime.timedelta(days=antecedencia):
+        return SituacaoPrazo.PROXIMO
+    return SituacaoPrazo.NO_PRAZO
+
+
+def faixas_divergentes(hoje, antecedencia):
+    """(situação registrada, filtro de data_prazo) de quem precisa mudar de situação."""
+    limite = hoje + datetime.timedelta(days=antecedencia)
+    return [
+        (SituacaoPrazo.NO_PRAZO, Q(data_prazo__lte=limite)),
+        (SituacaoPrazo.PROXIMO, Q(data_prazo__lt=hoje) | Q(data_prazo__gt=limite)),
+        # Prazo prorrogado (recálculo de calendário, edição manual)
+        (SituacaoPrazo.ATRASADO, Q(data_prazo__gte=hoje)),
+    ]
+
+
+def iterar_por_chave(processos, tamanho_lote=TAMANHO_LOTE):
+    """Paginação por chave (data_prazo, id): cada lote é uma faixa do índice, sem OFFSET."""
+    ultimo = None
+    while True:
+        lote = processos
+        if ultimo is not None:
+            lote = lote.filter(Q(data_prazo__gt=ultimo[0]) | Q(data_prazo=ultimo[0], pk__gt=ultimo[1]))
+        lote = list(lote.order_by('data_prazo', 'pk')[:tamanho_lote])
+        if not lote:
+            return
+        yield lote
+        ultimo = (lote[-1].data_prazo, lote[-1].pk)
+
+
+def detectar_transicoes(hoje=None, antecedencia=None, tamanho_lote=TAMANHO_LOTE):
+    """Registra as mudanças de situação dos prazos desde a última execução. Retorna quantas."""
+    hoje = hoje or timezone.localdate()
+    antecedencia = antecedencia_padrao() if antecedencia is None else antecedencia
+    total = 0
+    for situacao_registrada, faixa in faixas_divergentes(hoje, antecedencia):
+        candidatos = Processo.objects.filter(faixa, status__in=Processo.STATUS_ABERTOS, situacao_prazo=situacao_registrada).only(
+            'pk', 'data_prazo', 'situacao_prazo', 'responsavel_atual_id',
+        )
+        for lote in iterar_por_chave(candidatos, tamanho_lote):
+            total += registrar_lote(lote, hoje, antecedencia)
+    return total
+
+
+@transaction.atomic
+def registrar_lote(processos, hoje, antecedencia):
+    por_situacao = defaultdict(list)
+    transicoes = []
+    for processo in processos:
+        nova = situacao_para(processo.data_prazo, hoje, antecedencia)
+        por_situacao[nova].append(processo.pk)
+        transicoes.append(TransicaoPrazo(
+            processo_id=processo.pk,
+            situacao_anterior=processo.situacao_prazo,
+            situacao_nova=nova,
+            data=hoje,
+            responsavel_id=processo.responsavel_atual_id,
+            # Voltar a ficar no prazo não gera aviso
+            notificada_em=timezone.now() if nova == SituacaoPrazo.NO_PRAZO else None,
+        ))
+    TransicaoPrazo.objects.bulk_create(transicoes, ignore_conflicts=True)
+    for situacao, pks in por_situacao.items():
+        # A situação registrada entra no filtro: uma execução concorrente não registra de novo
+        Processo.objects.filter(pk__in=pks).exclude(situacao_prazo=situacao).update(situacao_prazo=situacao)
+    return len(transicoes)
+
+
+# --- Avisos agrupados por responsável ---
+
+def montar_aviso(responsavel, transicoes):
+    atrasados = sum(t.situacao_nova == SituacaoPrazo.ATRASADO for t in transicoes)
+    linhas = [
+        f"- {t.processo.numero_protocolo or t.processo_id} | {t.processo.servico_solicitado.nome_servico} | "
+        f"prazo {t.processo.data_prazo:%d/%m/%Y} | {t.get_situacao_nova_display()}"
+        for t in transicoes
+    ]
+    assunto = f"[GEA] {len(transicoes)} processo(s) com prazo vencido ou próximo ({atrasados} atrasado(s))"
+    corpo = (
+        f"Olá, {responsavel.get_full_name() or responsavel.username}.\n\n"
+        "Os processos abaixo, sob sua responsabilidade, mudaram de situação de prazo:\n\n"
+        + "\n".join(linhas)
+    )
+    return mail.EmailMessage(assunto, corpo, settings.DEFAULT_FROM_EMAIL, [responsavel.email])
+
+
+def enviar_avisos(tamanho_lote=TAMANHO_LOTE):
+    """Um e-mail por responsável com todas as transições pendentes dele. Retorna (e-mails, transições)."""
+    pendentes = TransicaoPrazo.objects.filter(notificada_em__isnull=True)
+    # Sem responsável (ou sem e-mail) não há a quem avisar: sai da fila
+    sem_destino = pendentes.filter(Q(responsavel__isnull=True) | Q(responsavel__email=''))
+    sem_destino.update(notificada_em=timezone.now())
+
+    emails = avisadas = 0
+    conexao = mail.get_connection()
+    while True:
+        lote = list(
+            pendentes.select_related('responsavel', 'processo__servico_solicitado').order_by('responsavel_id', 'pk')[:tamanho_lote]
+        )
+        if not lote:
+            return emails, avisadas
+        por_responsavel = defaultdict(list)
+        for transicao in lote:
+            por_responsavel[transicao.responsavel].append(transicao)
+        conexao.send_messages([montar_aviso(responsavel, transicoes) for responsavel, transicoes in por_responsavel.items()])
+        TransicaoPrazo.objects.filter(pk__in=[t.pk for t in lote]).update(notificada_em=timezone.now())
+        emails += len(por_responsavel)
+        avisadas += len(lote)
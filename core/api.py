@@ -0,0 +1,343 @@
+# /var/www/gea/core/api.py
+
+import datetime
+import hashlib
+import json
+import re
+from urllib.parse import urlencode
+
+from django.contrib.auth.decorators import permission_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_safe
+from .cache import NAMESPACE_CATALOGO, NAMESPACE_PROCESSOS, modificado_em, obter_ou_calcular, versao
+from . import busca, catalogo, exportacao, mapa
+from .hierarquia import obter_arvore
+from .metricas import obter_analise_servicos, obter_kpis_dashboard
+from .models import CanalAtendimento, CartaDeServicos, Processo
+
+# API JSON somente leitura das métricas (v1). ETag e Last-Modified saem do carimbo de versão
+# do cache: uma requisição condicional sem mudanças responde 304 sem nenhuma consulta ao banco.
+VERSAO_API = 'v1'
+
+
+def _inicio_do_dia():
+    return timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+
+
+def etag_dashboard(request):
+    # O dia entra na ETag: atrasados e críticos mudam na virada do dia mesmo sem alterações
+    return f'{VERSAO_API}-dashboard-{versao(NAMESPACE_PROCESSOS)}-{timezone.localdate().isoformat()}'
+
+
+def modificacao_dashboard(request):
+    return max(modificado_em(NAMESPACE_PROCESSOS), _inicio_do_dia())
+
+
+def etag_analise_servicos(request):
+    return f'{VERSAO_API}-analise-servicos-{versao(NAMESPACE_CATALOGO)}'
+
+
+def modificacao_analise_servicos(request):
+    return modificado_em(NAMESPACE_CATALOGO)
+
+
+def resposta_json(dados):
+    return JsonResponse({'versao_api': VERSAO_API, 'dados': dados})
+
+
+# Painéis de parede consultam a cada poucos segundos: sempre revalidar (no-cache), nunca reenviar à toa
+
+@gzip_page
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=etag_dashboard, last_modified_func=modificacao_dashboard)
+def dashboard_api(request):
+    return resposta_json(obter_kpis_dashboard())
+
+
+@gzip_page
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=etag_analise_servicos, last_modified_func=modificacao_analise_servicos)
+def analise_servicos_api(request):
+    return resposta_json(obter_analise_servicos().as_dict())
+
+
+# --- Mapa dos processos ---
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+# Só dígitos ASCII: str.isdigit() aceita '²' e afins, que o int() recusa
+_ID = re.compile(r'[0-9]+')
+
+
+def ler_id(valor):
+    """int do id vindo da query string; None se não for um número inteiro sem sinal."""
+    return int(valor) if _ID.fullmatch(valor) else None
+
+
+def ler_filtros_mapa(request):
+    """status (lista separada por vírgula, padrão: os em aberto) e secretaria (id)."""
+    status = [s for s in request.GET.get('status', '').upper().split(',') if s]
+    validos = dict(Processo.STATUS_CHOICES)
+    if any(s not in validos for s in status):
+        raise ParametroInvalido(f"status inválido; use {', '.join(validos)}")
+    secretaria = request.GET.get('secretaria') or None
+    if secretaria is not None:
+        secretaria = ler_id(secretaria)
+        if secretaria is None:
+            raise ParametroInvalido("secretaria deve ser o id numérico")
+    return status or None, secretaria
+
+
+def ler_bbox(request):
+    try:
+        bbox = tuple(float(v) for v in request.GET['bbox'].split(','))
+    except (KeyError, ValueError):
+        bbox = ()
+    if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+        raise ParametroInvalido("bbox deve ser lon_min,lat_min,lon_max,lat_max")
+    return bbox
+
+
+def ler_zoom(valor):
+    try:
+        zoom = int(valor)
+    except (TypeError, ValueError):
+        zoom = -1
+    if not 0 <= zoom <= mapa.ZOOM_MAXIMO:
+        raise ParametroInvalido(f"zoom deve estar entre 0 e {mapa.ZOOM_MAXIMO}")
+    return zoom
+
+
+def erro_parametro(erro):
+    return JsonResponse({'versao_api': VERSAO_API, 'erro': str(erro)}, status=400)
+
+
+def etag_mapa(request, *args, **kwargs):
+    # Qualquer alteração de processo muda a versão; a URL completa separa bbox/zoom/filtros
+    return f'{VERSAO_API}-mapa-{versao(NAMESPACE_PROCESSOS)}-{hashlib.md5(request.get_full_path().encode()).hexdigest()[:12]}'
+
+
+def modificacao_mapa(request, *args, **kwargs):
+    return modificado_em(NAMESPACE_PROCESSOS)
+
+
+def etag_tile(request, *args, **kwargs):
+    # Tiles seguem a janela de tempo do cache deles (core.mapa), não a versão dos processos
+    return f'{VERSAO_API}-tile-{mapa.janela_tiles()}-{hashlib.md5(request.get_full_path().encode()).hexdigest()[:12]}'
+
+
+@gzip_page
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=etag_mapa, last_modified_func=modificacao_mapa)
+def mapa_grupos_api(request):
+    """Contagens agrupadas em grade para bbox e zoom: ?bbox=...&zoom=...&status=...&secretaria=..."""
+    try:
+        bbox = ler_bbox(request)
+        zoom = ler_zoom(request.GET.get('zoom'))
+        status, secretaria = ler_filtros_mapa(request)
+    except ParametroInvalido as erro:
+        return erro_parametro(erro)
+    return resposta_json(mapa.agrupar(bbox, zoom, status, secretaria))
+
+
+@gzip_page
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=etag_tile)
+def mapa_tile_api(request, z, x, y):
+    """Vector tile (MVT) da camada 'processos' no esquema z/x/y do Mapbox/MapLibre."""
+    try:
+        z = ler_zoom(z)
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ParametroInvalido("tile fora da grade do zoom")
+        status, secretaria = ler_filtros_mapa(request)
+    except ParametroInvalido as erro:
+        return erro_parametro(erro)
+    return HttpResponse(mapa.obter_tile(z, x, y, status, secretaria), content_type='application/vnd.mapbox-vector-tile')
+
+
+# --- Busca pública na Carta de Serviços ---
+
+def etag_busca_servicos(request):
+    # Resultado só depende do catálogo e dos parâmetros
+    return f'{VERSAO_API}-busca-{versao(NAMESPACE_CATALOGO)}-{hashlib.md5(request.get_full_path().encode()).hexdigest()[:12]}'
+
+
+def ler_limite(valor, padrao=busca.LIMITE_PADRAO, maximo=busca.LIMITE_MAXIMO):
+    try:
+        limite = int(valor or padrao)
+    except ValueError:
+        limite = 0
+    if not 1 <= limite <= maximo:
+        raise ParametroInvalido(f"limite deve estar entre 1 e {maximo}")
+    return limite
+
+
+@gzip_page
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=etag_busca_servicos, last_modified_func=modificacao_analise_servicos)
+def busca_servicos_api(request):
+    """Serviços por relevância: ?q=...&limite=... ; 'modo' indica se caiu na similaridade (erro de digitação)."""
+    try:
+        termo = request.GET.get('q', '').strip()
+        if not termo:
+            raise ParametroInvalido("informe o termo de busca em q")
+        limite = ler_limite(request.GET.get('limite'))
+    except ParametroInvalido as erro:
+        return erro_parametro(erro)
+    modo, servicos = busca.buscar_servicos(termo, limite)
+    arvore = obter_arvore()
+    return resposta_json({
+        'modo': modo,
+        'resultados': [
+            {
+                'id': servico.pk,
+                'nome': servico.nome_servico,
+                'secretaria': arvore.sigla(servico.secretaria_id),
+                'orgao': servico.orgao_responsavel,
+                'url_solicitacao': servico.url_solicitacao,
+                'relevancia': round(servico.relevancia, 4),
+            }
+            for servico in servicos
+        ],
+    })
+
+
+# --- Catálogo público (paginação por cursor, ver core.catalogo) ---
+
+def ler_consulta_catalogo(parametros):
+    """ConsultaCatalogo de ?secretaria=id|sigla&entidade=id&tipo_servico=...&canal=...&campos=...&limite=...&cursor=..."""
+    secretaria = parametros.get('secretaria') or None
+    if secretaria is not None and ler_id(secretaria) is None:
+        no = obter_arvore().secretaria_por_sigla(secretaria.upper())
+        if no is None:
+            raise ParametroInvalido("secretaria deve ser o id numérico ou a sigla")
+        secretaria = no.id
+    elif secretaria is not None:
+        secretaria = ler_id(secretaria)
+    entidade = parametros.get('entidade') or None
+    if entidade is not None:
+        entidade = ler_id(entidade)
+        if entidade is None:
+            raise ParametroInvalido("entidade deve ser o id numérico")
+    canal = (parametros.get('canal') or '').upper() or None
+    if canal is not None and canal not in CanalAtendimento.values:
+        raise ParametroInvalido(f"canal inválido; use {', '.join(CanalAtendimento.values)}")
+    campos = tuple(c for c in parametros.get('campos', '').split(',') if c) or tuple(catalogo.CAMPOS)
+    if any(c not in catalogo.CAMPOS for c in campos) or len(set(campos)) != len(campos):
+        raise ParametroInvalido(f"campos inválidos; use {', '.join(catalogo.CAMPOS)}")
+    apos = 0
+    if parametros.get('cursor'):
+        try:
+            apos = catalogo.decodificar_cursor(parametros['cursor'])
+        except ValueError:
+            raise ParametroInvalido("cursor inválido; use o 'proximo_cursor' da página anterior")
+    return catalogo.ConsultaCatalogo(
+        secretaria=secretaria,
+        entidade=entidade,
+        tipo_servico=(parametros.get('tipo_servico') or '').strip() or None,
+        canal=canal,
+        campos=campos,
+        limite=ler_limite(parametros.get('limite'), catalogo.LIMITE_PADRAO, catalogo.LIMITE_MAXIMO),
+        apos=apos,
+    )
+
+
+def _montar_pagina_servicos(consulta):
+    itens, proximo = catalogo.listar_servicos(consulta)
+    dados = {'resultados': itens, 'proximo_cursor': None, 'proximo': None}
+    if proximo is not None:
+        parametros = consulta.parametros(apos=proximo)
+        dados['proximo_cursor'] = parametros['cursor']
+        dados['proximo'] = f"{reverse('api_servicos')}?{urlencode(parametros)}"
+    corpo = json.dumps({'versao_api': VERSAO_API, 'dados': dados}, cls=DjangoJSONEncoder).encode()
+    # ETag forte: o próprio conteúdo, então duas respostas com a mesma ETag são idênticas byte a byte
+    return hashlib.sha256(corpo).hexdigest()[:32], corpo
+
+
+def pagina_servicos(request):
+    """
+    (ETag, corpo) da página pedida, ou o ParametroInvalido. O corpo fica no cache por combinação
+    de parâmetros até a próxima mudança no catálogo; calculado uma vez por requisição.
+    """
+    if not hasattr(request, '_pagina_servicos'):
+        try:
+            consulta = ler_consulta_catalogo(request.GET)
+        except ParametroInvalido as erro:
+            request._pagina_servicos = erro
+        else:
+            chave = hashlib.md5(urlencode(consulta.parametros()).encode()).hexdigest()
+            request._pagina_servicos = obter_ou_calcular(
+                NAMESPACE_CATALOGO, f'servicos:{chave}', lambda: _montar_pagina_servicos(consulta)
+            )
+    return request._pagina_servicos
+
+
+def etag_servicos(request):
+    pagina = pagina_servicos(request)
+    return None if isinstance(pagina, ParametroInvalido) else pagina[0]
+
+
+# Portais e chatbots consultam sem parar: caches compartilhados podem guardar, mas revalidam
+# (304 pela ETag, sem banco). Sem gzip_page: a compressão enfraqueceria a ETag (W/).
+
+@require_safe
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=etag_servicos, last_modified_func=modificacao_analise_servicos)
+def servicos_api(request):
+    """Serviços ativos em páginas por cursor; 'proximo' é a URL da página seguinte (None na última)."""
+    pagina = pagina_servicos(request)
+    if isinstance(pagina, ParametroInvalido):
+        return erro_parametro(pagina)
+    return HttpResponse(pagina[1], content_type='application/json')
+
+
+# --- Exportação (CSV/XLSX enviados enquanto são lidos, ver core.exportacao) ---
+
+def ler_formato(formato):
+    if formato not in exportacao.FORMATOS:
+        raise ParametroInvalido(f"formato inválido; use {', '.join(exportacao.FORMATOS)}")
+    return formato
+
+
+@require_safe
+@permission_required('core.view_processo', raise_exception=True)
+def exportar_processos_api(request, formato):
+    """Processos em CSV ou XLSX: ?status=...&secretaria=... (sem status, todos)."""
+    try:
+        formato = ler_formato(formato)
+        status, secretaria = ler_filtros_mapa(request)
+    except ParametroInvalido as erro:
+        return erro_parametro(erro)
+    processos = Processo.objects.all()
+    if status:
+        processos = processos.filter(status__in=status)
+    if secretaria is not None:
+        processos = processos.filter(secretaria_id=secretaria)
+    return exportacao.exportar(processos, formato, request)
+
+
+@require_safe
+@permission_required('core.view_cartadeservicos', raise_exception=True)
+def exportar_servicos_api(request, formato):
+    """Carta de Serviços (sem os removidos) em CSV ou XLSX: ?secretaria=..."""
+    try:
+        formato = ler_formato(formato)
+        _, secretaria = ler_filtros_mapa(request)
+    except ParametroInvalido as erro:
+        return erro_parametro(erro)
+    servicos = CartaDeServicos.objects.ativos()
+    if secretaria is not None:
+        servicos = servicos.filter(secretaria_id=secretaria)
+    return exportacao.exportar(servicos, formato, request)
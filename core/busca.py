@@ -0,0 +1,80 @@
+# /var/www/gea/core/busca.py
+
+import re
+
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q
+from .models import CONFIGURACAO_BUSCA, CartaDeServicos
+
+# Busca textual sobre as colunas `busca` (GeneratedField, mantidas pelo banco, índice GIN):
+# português com radicais e sem acentos. A similaridade de trigramas (pg_trgm) só entra quando
+# a busca textual não encontra nada — tipicamente um erro de digitação no nome do serviço.
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 50
+
+
+def consulta_textual(termo, prefixo=False):
+    """
+    SearchQuery do termo (None se não houver palavras). Com prefixo=True cada palavra casa
+    como início de palavra ("pod arv" acha "Poda de Árvore"), para a busca enquanto se digita.
+    """
+    if prefixo:
+        palavras = re.findall(r'\w+', termo)
+        if not palavras:
+            return None
+        return SearchQuery(' & '.join(f'{palavra}:*' for palavra in palavras), config=CONFIGURACAO_BUSCA, search_type='raw')
+    termo = termo.strip()
+    return SearchQuery(termo, config=CONFIGURACAO_BUSCA, search_type='websearch') if termo else None
+
+
+def similares(servicos, termo):
+    """Serviços cujo nome tem uma palavra parecida com o termo (operador %>, índice servico_nome_trgm_idx)."""
+    return servicos.filter(nome_servico__trigram_word_similar=termo).annotate(
+        relevancia=TrigramWordSimilarity(termo, 'nome_servico'),
+    )
+
+
+def buscar_servicos(termo, limite=LIMITE_PADRAO):
+    """Serviços da Carta por relevância. Retorna (modo, serviços); modo é 'textual' ou 'similaridade'."""
+    consulta = consulta_textual(termo)
+    if consulta is None:
+        return 'textual', []
+    servicos = CartaDeServicos.objects.ativos()
+    encontrados = list(
+        servicos.filter(busca=consulta).annotate(relevancia=SearchRank(F('busca'), consulta))
+        .order_by('-relevancia', 'nome_servico')[:limite]
+    )
+    if encontrados:
+        return 'textual', encontrados
+    return 'similaridade', list(similares(servicos, termo.strip()).order_by('-relevancia', 'nome_servico')[:limite])
+
+
+# --- Busca do admin ---
+# A changelist mantém a própria ordenação; aqui só o filtro, no lugar dos icontains de search_fields.
+
+def filtrar_servicos(servicos, termo):
+    consulta = consulta_textual(termo, prefixo=True)
+    if consulta is None:
+        return servicos
+    encontrados = servicos.filter(busca=consulta)
+    if encontrados.exists():
+        return encontrados
+    return servicos.filter(nome_servico__trigram_word_similar=termo.strip())
+
+
+def filtrar_processos(processos, termo):
+    """Texto do processo, número do protocolo exato ou login exato do responsável."""
+    termo = termo.strip()
+    if not termo:
+        return processos
+    condicoes = Q(numero_protocolo=termo)
+    consulta = consulta_textual(termo, prefixo=True)
+    if consulta is not None:
+        condicoes |= Q(busca=consulta)
+    # ids resolvidos antes: o OR fica só entre índices de processo (BitmapOr), sem JOIN
+    responsaveis = list(User.objects.filter(username=termo).values_list('pk', flat=True))
+    if responsaveis:
+        condicoes |= Q(responsavel_atual_id__in=responsaveis)
+    return processos.filter(condicoes)
@@ -0,0 +1,114 @@
+# /var/www/gea/core/cache.py
+
+import datetime
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Namespaces versionados: invalidar um namespace descarta todas as chaves dele de uma vez.
+# A versão fica no próprio cache, então ele precisa ser compartilhado entre os processos
+# (workers do servidor, Celery, comandos): num cache local a invalidação feita por um processo
+# não chega aos outros. core.checks avisa (core.W001) quando o backend é local.
+NAMESPACE_CATALOGO = 'catalogo'
+# Processos e métricas derivadas (invalidado por core.consolidacao a cada alteração)
+NAMESPACE_PROCESSOS = 'processos'
+# Calendários e feriados (o motor de prazos recarrega as tabelas quando muda)
+NAMESPACE_CALENDARIOS = 'calendarios'
+# Secretaria -> Departamento -> Divisão (a árvore em memória de core.hierarquia é recarregada quando muda)
+NAMESPACE_HIERARQUIA = 'hierarquia'
+# Vector tiles do mapa (core.mapa): não acompanham as gravações de processos, expiram por tempo
+NAMESPACE_MAPA = 'mapa'
+
+# Chaves de versões antigas ficam órfãs; expiram sozinhas depois de um dia
+TIMEOUT_PADRAO = 60 * 60 * 24
+
+# Backends que outros processos não enxergam
+BACKENDS_LOCAIS = (LocMemCache, DummyCache)
+
+_cache_local = None
+
+
+def get_cache():
+    """Cache configurado em GEA_CACHE_ALIAS (padrão: 'default'), com fallback em memória local."""
+    global _cache_local
+    try:
+        return caches[getattr(settings, 'GEA_CACHE_ALIAS', 'default')]
+    except InvalidCacheBackendError:
+        if _cache_local is None:
+            _cache_local = LocMemCache('gea-fallback', {})
+        return _cache_local
+
+
+def cache_compartilhado():
+    """Se o cache de get_cache() é visto por todos os processos (e não só por este)."""
+    return not isinstance(get_cache(), BACKENDS_LOCAIS)
+
+
+def _chave_versao(namespace):
+    return f'gea:versao:{namespace}'
+
+
+def versao(namespace):
+    cache = get_cache()
+    chave = _chave_versao(namespace)
+    atual = cache.get(chave)
+    if atual is None:
+        # Versão baseada no relógio: se a chave for despejada, não volta para um valor antigo
+        cache.add(chave, time.time_ns(), timeout=None)
+        atual = cache.get(chave, time.time_ns())
+    return atual
+
+
+def _chave_modificacao(namespace):
+    return f'gea:modificado:{namespace}'
+
+
+def invalidar(namespace):
+    cache = get_cache()
+    chave = _chave_versao(namespace)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, time.time_ns(), timeout=None)
+    cache.set(_chave_modificacao(namespace), time.time(), timeout=None)
+
+
+def modificado_em(namespace):
+    """Quando o namespace foi invalidado pela última vez (ou, se não se sabe, agora)."""
+    cache = get_cache()
+    chave = _chave_modificacao(namespace)
+    cache.add(chave, time.time(), timeout=None)
+    # Sem fração de segundo: Last-Modified/If-Modified-Since têm resolução de 1 s
+    instante = int(cache.get(chave, time.time()))
+    return datetime.datetime.fromtimestamp(instante, tz=datetime.timezone.utc)
+
+
+def _chave_versionada(namespace, chave):
+    return f'gea:{namespace}:{versao(namespace)}:{chave}'
+
+
+def obter_ou_calcular(namespace, chave, calcular, timeout=TIMEOUT_PADRAO):
+    """Lê `chave` na versão atual do namespace; em caso de falta, calcula e grava."""
+    cache = get_cache()
+    chave_versionada = _chave_versionada(namespace, chave)
+    valor = cache.get(chave_versionada)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave_versionada, valor, timeout)
+    return valor
+
+
+async def aobter_ou_calcular(namespace, chave, acalcular, timeout=TIMEOUT_PADRAO):
+    """obter_ou_calcular() para views assíncronas: `acalcular` é uma função assíncrona."""
+    cache = get_cache()
+    chave_versionada = await sync_to_async(_chave_versionada)(namespace, chave)
+    valor = await cache.aget(chave_versionada)
+    if valor is None:
+        valor = await acalcular()
+        await cache.aset(chave_versionada, valor, timeout)
+    return valor
@@ -0,0 +1,100 @@
+# /var/www/gea/core/catalogo.py
+
+import base64
+import binascii
+from dataclasses import dataclass
+
+from .hierarquia import obter_arvore
+from .models import CartaDeServicos
+
+# Listagem pública da Carta de Serviços (api/v1/servicos/). Paginação por cursor (keyset) sobre
+# o id: cada página é um "id > último id da anterior" com LIMIT, lido pelo índice da chave
+# primária, com o mesmo custo na primeira ou na milésima página (OFFSET leria e descartaria
+# todas as anteriores) e sem pular ou repetir serviços quando o catálogo muda entre as páginas.
+# Só as colunas dos campos pedidos são lidas; a sigla da secretaria vem da árvore em memória.
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+# Campo da API -> coluna do values_list
+CAMPOS = {
+    'id': 'pk',
+    'nome': 'nome_servico',
+    'descricao': 'descricao',
+    'secretaria': 'secretaria_id',
+    'entidade': 'entidade__nome',
+    'orgao': 'orgao_responsavel',
+    'tipo_servico': 'tipo_servico',
+    'tipos_atendimento': 'tipos_atendimento',
+    'url_solicitacao': 'url_solicitacao',
+    'canal': 'canal',
+    'sistema': 'sistema',
+    'prazo_maximo_dias': 'prazo_maximo_dias',
+}
+
+
+@dataclass(frozen=True)
+class ConsultaCatalogo:
+    """Filtros, campos e página já validados; também é a chave do cache da resposta."""
+    secretaria: int = None
+    entidade: int = None
+    tipo_servico: str = None
+    canal: str = None
+    campos: tuple = tuple(CAMPOS)
+    limite: int = LIMITE_PADRAO
+    apos: int = 0                 # id do último serviço da página anterior
+
+    def parametros(self, apos=None):
+        """Query string canônica (sem os valores padrão), com outro cursor se `apos` for dado."""
+        apos = self.apos if apos is None else apos
+        parametros = {
+            'secretaria': self.secretaria, 'entidade': self.entidade,
+            'tipo_servico': self.tipo_servico, 'canal': self.canal,
+            'campos': ','.join(self.campos) if self.campos != tuple(CAMPOS) else None,
+            'limite': self.limite if self.limite != LIMITE_PADRAO else None,
+            'cursor': codificar_cursor(apos) if apos else None,
+        }
+        return {nome: valor for nome, valor in parametros.items() if valor is not None}
+
+
+def codificar_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """id do cursor; ValueError se não for um cursor gerado por codificar_cursor()."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(cursor)
+    # isascii(): isdigit() sozinho aceita '²', que o int() recusa
+    if not (texto.isascii() and texto.isdigit()):
+        raise ValueError(cursor)
+    return int(texto)
+
+
+def listar_servicos(consulta):
+    """Serviços ativos da página ([{campo: valor}]) e o id para o cursor da próxima (None na última)."""
+    servicos = CartaDeServicos.objects.ativos().filter(pk__gt=consulta.apos)
+    if consulta.secretaria is not None:
+        servicos = servicos.filter(secretaria_id=consulta.secretaria)
+    if consulta.entidade is not None:
+        servicos = servicos.filter(entidade_id=consulta.entidade)
+    if consulta.tipo_servico is not None:
+        servicos = servicos.filter(tipo_servico__iexact=consulta.tipo_servico)
+    if consulta.canal is not None:
+        servicos = servicos.filter(canal=consulta.canal)
+
+    # O id vai sempre na primeira coluna: é dele que sai o cursor
+    colunas = ['pk', *(CAMPOS[campo] for campo in consulta.campos)]
+    linhas = list(servicos.order_by('pk').values_list(*colunas)[:consulta.limite + 1])
+    proximo = linhas[consulta.limite - 1][0] if len(linhas) > consulta.limite else None
+
+    arvore = obter_arvore()
+    itens = []
+    for _, *valores in linhas[:consulta.limite]:
+        item = dict(zip(consulta.campos, valores))
+        if 'secretaria' in item:
+            item['secretaria'] = arvore.sigla(item['secretaria'])
+        itens.append(item)
+    return itens, proximo
@@ -0,0 +1,21 @@
+# /var/www/gea/core/checks.py
+
+from django.core.checks import Warning, register
+from .cache import cache_compartilhado
+
+
+@register()
+def verificar_cache_compartilhado(app_configs, **kwargs):
+    """Versões de core.cache, árvore da hierarquia e histogramas dependem de um cache entre processos."""
+    if cache_compartilhado():
+        return []
+    return [Warning(
+        "O cache do GEA (CACHES[GEA_CACHE_ALIAS]) é local a cada processo.",
+        hint=(
+            "Invalidações feitas por um processo (importação no Celery, recalcular_prazos, edição da "
+            "hierarquia) não chegam aos outros, que seguem servindo dados antigos até o cache expirar, "
+            "e metricas_requisicoes não enxerga o que o servidor registrou. Configure em CACHES um "
+            "backend compartilhado (Redis ou Memcached)."
+        ),
+        id='core.W001',
+    )]
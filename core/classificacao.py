@@ -0,0 +1,39 @@
+# /var/www/gea/core/classificacao.py
+
+import re
+
+from .models import CanalAtendimento
+
+# Formas de solicitação que não passam por um sistema digital
+TERMOS_MANUAIS = ('presencial', 'telefone', 'whatsapp', 'e-mail')
+
+# Tipos de sistema tratados como desenvolvimento próprio da Prefeitura
+TIPOS_PROPRIOS = {'próprio', 'proprio'}
+
+# Grafias alternativas -> nome canônico do sistema
+ALIASES_SISTEMA = {
+    '1 doc': '1Doc',
+    '1doc': '1Doc',
+    'colab': 'Colab',
+    'colab gov': 'Colab',
+    'colabgov': 'Colab',
+}
+
+
+def normalizar_sistema(forma_solicitacao):
+    nome = re.sub(r'\s+', ' ', (forma_solicitacao or '').strip())
+    return ALIASES_SISTEMA.get(nome.casefold(), nome)
+
+
+def classificar_servico(forma_solicitacao, tipo_sistema):
+    """
+    Retorna (canal, sistema) de um serviço da Carta. É a mesma regra que antes era
+    aplicada em tempo de consulta com icontains (ver CanalAtendimento).
+    """
+    forma = (forma_solicitacao or '').strip().casefold()
+    if not forma or any(termo in forma for termo in TERMOS_MANUAIS):
+        return CanalAtendimento.MANUAL, ''
+
+    if (tipo_sistema or '').strip().casefold() in TIPOS_PROPRIOS:
+        return CanalAtendimento.DIGITAL_PROPRIO, normalizar_sistema(forma_solicitacao)
+    return CanalAtendimento.DIGITAL_TERCEIRO, normalizar_sistema(forma_solicitacao)
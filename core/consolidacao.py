@@ -0,0 +1,141 @@
+# /var/www/gea/core/consolidacao.py
+
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .cache import NAMESPACE_PROCESSOS, invalidar
+from .models import MetricaDiaria, Processo
+
+# Consolidação diária dos processos em MetricaDiaria (data, serviço, status).
+# Cada processo contribui para até três linhas, conforme o estado atual dele:
+#   abertos             -> dia do protocolo, status atual
+#   concluidos / soma   -> dia da conclusão, CONCLUIDO
+#   vencimentos         -> dia do prazo, status atual (só enquanto estiver em aberto)
+# Mudar um processo = retirar a contribuição antiga e somar a nova. Tudo é SQL em conjunto:
+# o custo depende de quantos processos mudaram, não do tamanho da tabela.
+
+TABELA = MetricaDiaria._meta.db_table
+CONTADORES_FLUXO = ('abertos', 'concluidos', 'soma_dias_resolucao', 'vencimentos')
+
+# Campos de Processo de que as contribuições dependem: um update() que mexe em algum deles
+# ajusta as métricas sozinho (ProcessoQuerySet.update). A secretaria das linhas de MetricaDiaria
+# é só uma cópia, mantida por core.denormalizacao.
+CAMPOS_METRICAS = frozenset({
+    'status', 'data_protocolo', 'data_conclusao', 'data_prazo', 'servico_solicitado', 'servico_solicitado_id',
+})
+
+# Dentro de atualizando_metricas() o update() não ajusta as métricas de novo
+_em_atualizacao = contextvars.ContextVar('gea_metricas_em_atualizacao', default=False)
+
+_SQL_CONTRIBUICOES = f"""
+WITH p AS ({{processos}})
+INSERT INTO {TABELA} (data, servico_id, secretaria_id, status, {', '.join(CONTADORES_FLUXO)},
+                      em_aberto_fim_dia, atrasados_fim_dia)
+SELECT data, servico_id, MAX(secretaria_id), status,
+       %s * SUM(abertos), %s * SUM(concluidos),
+       %s * SUM(soma_dias_resolucao), %s * SUM(vencimentos), 0, 0
+FROM (
+    SELECT (data_protocolo AT TIME ZONE %s)::date AS data, servico_solicitado_id AS servico_id,
+           secretaria_id, status, 1 AS abertos, 0 AS concluidos, 0 AS soma_dias_resolucao, 0 AS vencimentos
+    FROM p
+    UNION ALL
+    SELECT (data_conclusao AT TIME ZONE %s)::date, servico_solicitado_id, secretaria_id, status,
+           0, 1, EXTRACT(DAY FROM data_conclusao - data_protocolo)::int, 0
+    FROM p WHERE status = 'CONCLUIDO' AND data_conclusao IS NOT NULL
+    UNION ALL
+    SELECT data_prazo, servico_solicitado_id, secretaria_id, status, 0, 0, 0, 1
+    FROM p WHERE status = ANY(%s)
+) contribuicoes
+GROUP BY data, servico_id, status
+ON CONFLICT (data, servico_id, status) DO UPDATE SET
+    secretaria_id = EXCLUDED.secretaria_id,
+    {', '.join(f'{c} = {TABELA}.{c} + EXCLUDED.{c}' for c in CONTADORES_FLUXO)}
+"""
+
+
+def _aplicar(processos, sinal):
+    sql_processos, params_processos = processos.order_by().values(
+        'data_protocolo', 'data_conclusao', 'data_prazo', 'status', 'servico_solicitado_id', 'secretaria_id',
+    ).query.sql_with_params()
+    # Parâmetros na ordem em que aparecem no SQL: o queryset (CTE), o sinal, o fuso e os status abertos
+    params = [*params_processos, *[sinal] * 4, settings.TIME_ZONE, settings.TIME_ZONE, list(Processo.STATUS_ABERTOS)]
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_CONTRIBUICOES.format(processos=sql_processos), params)
+    # Toda alteração de processo passa por aqui: é o carimbo de versão da API de métricas
+    transaction.on_commit(lambda: invalidar(NAMESPACE_PROCESSOS))
+
+
+def somar(processos):
+    """Soma nas métricas a contribuição dos processos do queryset, no estado atual deles."""
+    _aplicar(processos, 1)
+
+
+def retirar(processos):
+    """Desfaz a contribuição dos processos do queryset (chamar antes de alterá-los ou apagá-los)."""
+    _aplicar(processos, -1)
+
+
+@contextmanager
+def atualizando_metricas(processos):
+    """
+    Para alterações em lote que não passam pelo save() nem pelo update() (bulk_create/bulk_update,
+    SQL direto):
+
+        with atualizando_metricas(Processo.objects.filter(pk__in=ids)):
+            Processo.objects.bulk_update(processos, ['status', ...])
+
+    `processos` precisa selecionar as mesmas linhas antes e depois da alteração
+    (filtre por chave, não pelo campo que está sendo alterado). Os update() de dentro do bloco
+    não ajustam as métricas de novo.
+    """
+    with transaction.atomic():
+        retirar(processos)
+        token = _em_atualizacao.set(True)
+        try:
+            yield
+        finally:
+            _em_atualizacao.reset(token)
+        somar(processos)
+
+
+def metricas_em_atualizacao():
+    return _em_atualizacao.get()
+
+
+def fechar_dia(data=None):
+    """Grava a fotografia do estoque (em aberto e atrasados por serviço/status) no fim de `data`."""
+    data = data or timezone.localdate()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {TABELA} SET em_aberto_fim_dia = 0, atrasados_fim_dia = 0 WHERE data = %s", [data]
+        )
+        cursor.execute(f"""
+            INSERT INTO {TABELA} (data, servico_id, secretaria_id, status, {', '.join(CONTADORES_FLUXO)},
+                                  em_aberto_fim_dia, atrasados_fim_dia)
+            SELECT %(data)s, servico_solicitado_id, MAX(secretaria_id), status, 0, 0, 0, 0,
+                   COUNT(*), COUNT(*) FILTER (WHERE data_prazo < %(data)s)
+            FROM {Processo._meta.db_table}
+            WHERE status = ANY(%(abertos)s)
+            GROUP BY servico_solicitado_id, status
+            ON CONFLICT (data, servico_id, status) DO UPDATE SET
+                em_aberto_fim_dia = EXCLUDED.em_aberto_fim_dia,
+                atrasados_fim_dia = EXCLUDED.atrasados_fim_dia
+        """, {'data': data, 'abertos': list(Processo.STATUS_ABERTOS)})
+
+
+@transaction.atomic
+def reconstruir():
+    """
+    Recalcula os fluxos do zero a partir dos processos. As fotografias de estoque de dias
+    passados são preservadas (não há histórico de status para refazê-las); a de hoje é regravada.
+    """
+    MetricaDiaria.objects.update(**{contador: 0 for contador in CONTADORES_FLUXO})
+    somar(Processo.objects.all())
+    MetricaDiaria.objects.filter(
+        abertos=0, concluidos=0, vencimentos=0, em_aberto_fim_dia=0, atrasados_fim_dia=0,
+    ).delete()
+    fechar_dia()
+    return MetricaDiaria.objects.count()
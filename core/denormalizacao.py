@@ -0,0 +1,81 @@
+# /var/www/gea/core/denormalizacao.py
+
+from django.db.models import F, OuterRef, Q, Subquery
+from .models import Divisao, CartaDeServicos, Processo, MetricaDiaria
+
+# Mantém as cópias desnormalizadas da hierarquia:
+#   CartaDeServicos.departamento / .secretaria  <- divisao_responsavel
+#   Processo.secretaria                         <- servico_solicitado.secretaria
+#   MetricaDiaria.secretaria                    <- servico.secretaria
+# Todas as funções são UPDATEs em conjunto e só tocam linhas divergentes.
+
+
+def propagar_servico(servico):
+    """Serviço mudou de divisão: corrige a secretaria dos processos e das métricas dele."""
+    MetricaDiaria.objects.filter(servico=servico).exclude(
+        secretaria_id=servico.secretaria_id
+    ).update(secretaria_id=servico.secretaria_id)
+    return Processo.objects.filter(servico_solicitado=servico).exclude(
+        secretaria_id=servico.secretaria_id
+    ).update(secretaria_id=servico.secretaria_id)
+
+
+def propagar_divisao(divisao):
+    """Divisão mudou de departamento: corrige serviços e processos abaixo dela."""
+    secretaria_id = Divisao.objects.filter(pk=divisao.pk).values_list('departamento__secretaria_id', flat=True).get()
+    servicos = CartaDeServicos.objects.filter(divisao_responsavel=divisao)
+    total = servicos.filter(
+        ~Q(departamento_id=divisao.departamento_id) | ~Q(secretaria_id=secretaria_id)
+    ).update(departamento_id=divisao.departamento_id, secretaria_id=secretaria_id)
+    total += Processo.objects.filter(servico_solicitado__divisao_responsavel=divisao).exclude(
+        secretaria_id=secretaria_id
+    ).update(secretaria_id=secretaria_id)
+    MetricaDiaria.objects.filter(servico__divisao_responsavel=divisao).exclude(
+        secretaria_id=secretaria_id
+    ).update(secretaria_id=secretaria_id)
+    return total
+
+
+def propagar_departamento(departamento):
+    """Departamento mudou de secretaria: corrige serviços e processos abaixo dele."""
+    total = CartaDeServicos.objects.filter(departamento=departamento).exclude(
+        secretaria_id=departamento.secretaria_id
+    ).update(secretaria_id=departamento.secretaria_id)
+    total += Processo.objects.filter(servico_solicitado__departamento=departamento).exclude(
+        secretaria_id=departamento.secretaria_id
+    ).update(secretaria_id=departamento.secretaria_id)
+    MetricaDiaria.objects.filter(servico__departamento=departamento).exclude(
+        secretaria_id=departamento.secretaria_id
+    ).update(secretaria_id=departamento.secretaria_id)
+    return total
+
+
+def reparar_hierarquia():
+    """Recalcula todas as cópias a partir da hierarquia real. Retorna (serviços, processos) corrigidos."""
+    divisao = Divisao.objects.filter(pk=OuterRef('divisao_responsavel_id'))
+    servicos = CartaDeServicos.objects.filter(
+        ~Q(departamento_id=F('divisao_responsavel__departamento_id'))
+        | ~Q(secretaria_id=F('divisao_responsavel__departamento__secretaria_id'))
+        | Q(departamento__isnull=True)
+        | Q(secretaria__isnull=True)
+    ).update(
+        departamento_id=Subquery(divisao.values('departamento_id')[:1]),
+        secretaria_id=Subquery(divisao.values('departamento__secretaria_id')[:1]),
+    )
+
+    processos = Processo.objects.filter(
+        ~Q(secretaria_id=F('servico_solicitado__secretaria_id')) | Q(secretaria__isnull=True)
+    ).update(
+        secretaria_id=Subquery(
+            CartaDeServicos.objects.filter(pk=OuterRef('servico_solicitado_id')).values('secretaria_id')[:1]
+        ),
+    )
+
+    MetricaDiaria.objects.filter(
+        ~Q(secretaria_id=F('servico__secretaria_id')) | Q(secretaria__isnull=True)
+    ).update(
+        secretaria_id=Subquery(
+            CartaDeServicos.objects.filter(pk=OuterRef('servico_id')).values('secretaria_id')[:1]
+        ),
+    )
+    return servicos, processos
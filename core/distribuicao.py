@@ -0,0 +1,123 @@
+# /var/www/gea/core/distribuicao.py
+
+import heapq
+import itertools
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from .eventos import TAMANHO_LOTE
+from .hierarquia import SECRETARIA, DEPARTAMENTO, DIVISAO, obter_arvore
+from .models import STATUS_ABERTOS, CartaDeServicos, Lotacao, Processo, SituacaoPrazo
+
+# Distribuição automática dos processos abertos sem responsável (responsavel_atual).
+# Candidatos: servidores lotados (Lotacao) na divisão responsável pelo serviço; sem ninguém
+# lá, os do departamento e depois os da secretaria. Vai para quem tem a menor carga, a soma
+# dos pesos dos processos abertos que já tem (atrasados e próximos do vencimento pesam mais).
+# O lote é distribuído dos prazos mais curtos para os mais longos e cada atribuição soma o peso
+# do processo à carga do escolhido. As cargas são lidas numa agregação no início de cada
+# execução (processo_aberto_resp_idx) e mantidas em memória durante o lote; a gravação é um
+# bulk_update só, registrado no histórico (ProcessoEvento) pelo ProcessoQuerySet.update().
+
+PESO_SITUACAO = {SituacaoPrazo.NO_PRAZO: 1, SituacaoPrazo.PROXIMO: 2, SituacaoPrazo.ATRASADO: 3}
+
+
+class IndiceCarga:
+    """
+    Carga de cada servidor e um heap de candidatos por grupo (nível da hierarquia, id). Quando
+    a carga de alguém sobe, uma entrada nova entra nos heaps dos grupos dele; as antigas
+    (carga menor que a atual) são descartadas ao chegar ao topo.
+    """
+
+    def __init__(self, cargas, grupos):
+        self.cargas = defaultdict(int, cargas)
+        self.grupos_do_usuario = defaultdict(list)
+        self.heaps = {}
+        self.ordem = itertools.count()  # desempate estável entre cargas iguais
+        for grupo, usuarios in grupos.items():
+            heap = [(self.cargas[usuario], next(self.ordem), usuario) for usuario in sorted(usuarios)]
+            heapq.heapify(heap)
+            self.heaps[grupo] = heap
+            for usuario in usuarios:
+                self.grupos_do_usuario[usuario].append(grupo)
+
+    def escolher(self, grupos):
+        """Servidor de menor carga no primeiro dos `grupos` que tiver alguém (None se nenhum tiver)."""
+        for grupo in grupos:
+            heap = self.heaps.get(grupo)
+            while heap:
+                carga, _, usuario = heap[0]
+                if carga == self.cargas[usuario]:
+                    return usuario
+                heapq.heappop(heap)
+        return None
+
+    def atribuir(self, usuario, peso):
+        self.cargas[usuario] += peso
+        for grupo in self.grupos_do_usuario[usuario]:
+            heapq.heappush(self.heaps[grupo], (self.cargas[usuario], next(self.ordem), usuario))
+
+
+def montar_indice():
+    """IndiceCarga dos servidores ativos lotados com distribuição automática."""
+    grupos = defaultdict(set)
+    arvore = obter_arvore()
+    for usuario, divisao in Lotacao.objects.filter(
+        recebe_distribuicao=True, usuario__is_active=True,
+    ).values_list('usuario_id', 'divisao_id'):
+        grupos[DIVISAO, divisao].add(usuario)
+        # Departamento e secretaria da divisão pela árvore em memória, sem os dois JOINs
+        for no in arvore.ancestrais(DIVISAO, divisao):
+            grupos[no.tipo, no.id].add(usuario)
+    usuarios = set().union(*grupos.values())
+
+    cargas = defaultdict(int)
+    for usuario, situacao, total in Processo.objects.filter(
+        status__in=STATUS_ABERTOS, responsavel_atual_id__in=usuarios,
+    ).values_list('responsavel_atual_id', 'situacao_prazo').annotate(total=Count('id')).order_by():
+        cargas[usuario] += PESO_SITUACAO[situacao] * total
+    return IndiceCarga(cargas, grupos)
+
+
+def planejar(pendentes, grupos_do_servico, indice):
+    """
+    {processo: usuário} para `pendentes` [(pk, serviço, situação do prazo)] já ordenados por prazo.
+    Só memória: é o trecho que precisa ser rápido para lotes de milhares de processos.
+    """
+    atribuicoes = {}
+    for pk, servico, situacao in pendentes:
+        usuario = indice.escolher(grupos_do_servico.get(servico, ()))
+        if usuario is not None:
+            atribuicoes[pk] = usuario
+            indice.atribuir(usuario, PESO_SITUACAO[situacao])
+    return atribuicoes
+
+
+def distribuir(processos=None):
+    """
+    Atribui responsável aos processos abertos e sem responsável de `processos` (todos, por padrão).
+    Retorna {processo: usuário} do que foi atribuído; quem não tem candidato fica como está.
+    """
+    if processos is None:
+        processos = Processo.objects.all()
+    with transaction.atomic():
+        # Linhas travadas (ou sendo editadas por alguém) ficam para a próxima execução
+        pendentes = list(
+            processos.filter(status__in=STATUS_ABERTOS, responsavel_atual__isnull=True)
+            .select_for_update(skip_locked=True).order_by('data_prazo', 'pk')
+            .values_list('pk', 'servico_solicitado_id', 'situacao_prazo')
+        )
+        if not pendentes:
+            return {}
+        grupos_do_servico = {
+            servico: ((DIVISAO, divisao), (DEPARTAMENTO, departamento), (SECRETARIA, secretaria))
+            for servico, divisao, departamento, secretaria in CartaDeServicos.objects.filter(
+                pk__in={servico for _, servico, _ in pendentes},
+            ).values_list('pk', 'divisao_responsavel_id', 'departamento_id', 'secretaria_id')
+        }
+        atribuicoes = planejar(pendentes, grupos_do_servico, montar_indice())
+        Processo.objects.bulk_update(
+            [Processo(pk=pk, responsavel_atual_id=usuario) for pk, usuario in atribuicoes.items()],
+            ['responsavel_atual'], batch_size=TAMANHO_LOTE,
+        )
+    return atribuicoes
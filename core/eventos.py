@@ -0,0 +1,177 @@
+# /var/www/gea/core/eventos.py
+
+import datetime
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.db import connection, models, transaction
+from django.db.models import Avg, Count, F
+from django.utils import timezone
+from .hierarquia import obter_arvore
+from .models import Processo, ProcessoEvento
+
+# Histórico de status dos processos (ProcessoEvento), somente inclusão.
+# Três caminhos de escrita, todos comparando o estado gravado antes e depois da alteração:
+#   Processo.save()             -> um evento (origem EDICAO)
+#   Processo.objects...update() -> eventos do lote num único INSERT (origem LOTE)
+#   registrando_eventos()       -> para o que não passa por nenhum dos dois (upsert da importação)
+# Cada evento leva status_desde (início do status anterior), então o tempo em um status sai de
+# uma linha só, sem reconstruir a sequência de eventos de cada processo.
+
+CAMPOS_RASTREADOS = frozenset({'status', 'responsavel_atual', 'responsavel_atual_id', 'data_conclusao'})
+TAMANHO_LOTE = 2000
+TABELA = ProcessoEvento._meta.db_table
+
+Estado = namedtuple('Estado', 'status responsavel_id data_conclusao status_desde secretaria_id')
+COLUNAS_ESTADO = ('status', 'responsavel_atual_id', 'data_conclusao', 'status_desde', 'secretaria_id')
+
+
+def estados(processos):
+    """{pk: Estado} dos processos do queryset, numa consulta."""
+    return {pk: Estado(*valores) for pk, *valores in processos.order_by().values_list('pk', *COLUNAS_ESTADO)}
+
+
+def estado_gravado(pk):
+    return estados(Processo.objects.filter(pk=pk)).get(pk)
+
+
+def criar_evento(pk, antes, depois, origem, agora):
+    """Evento da mudança antes -> depois (antes=None: criação); None se nenhum campo rastreado mudou."""
+    if antes is not None and antes[:3] == depois[:3]:
+        return None
+    return ProcessoEvento(
+        registrado_em=agora,
+        processo_id=pk,
+        secretaria_id=depois.secretaria_id,
+        origem=origem,
+        status_anterior=antes and antes.status,
+        status=depois.status,
+        status_desde=antes and antes.status_desde,
+        responsavel_anterior_id=antes and antes.responsavel_id,
+        responsavel_id=depois.responsavel_id,
+        data_conclusao=depois.data_conclusao,
+    )
+
+
+def registrar_edicao(processo, anterior):
+    """Chamado por Processo.save() com o estado lido antes de gravar (None na criação)."""
+    depois = Estado(*(getattr(processo, coluna) for coluna in COLUNAS_ESTADO))
+    evento = criar_evento(processo.pk, anterior, depois, ProcessoEvento.Origem.EDICAO, timezone.now())
+    if evento is not None:
+        evento.save()
+
+
+def registrar_diferencas(antes, depois, origem):
+    """Grava os eventos entre dois retratos {pk: Estado} e avança status_desde de quem mudou de status."""
+    agora = timezone.now()
+    eventos, mudaram_status = [], []
+    for pk, estado in depois.items():
+        evento = criar_evento(pk, antes.get(pk), estado, origem, agora)
+        if evento is None:
+            continue
+        eventos.append(evento)
+        if pk in antes and antes[pk].status != estado.status:
+            mudaram_status.append(pk)
+    if mudaram_status:
+        Processo.objects.filter(pk__in=mudaram_status).update(status_desde=agora)
+    ProcessoEvento.objects.bulk_create(eventos, batch_size=TAMANHO_LOTE)
+    return len(eventos)
+
+
+@contextmanager
+def registrando_eventos(processos, origem=ProcessoEvento.Origem.LOTE):
+    """
+    Para alterações que não passam pelo save() nem pelo update() (bulk_create com upsert).
+    Mesmo contrato de consolidacao.atualizando_metricas: `processos` é filtrado por chave;
+    os que passam a existir dentro do bloco ganham o evento de criação.
+    """
+    with transaction.atomic():
+        antes = estados(processos)
+        yield
+        registrar_diferencas(antes, estados(processos), origem)
+
+
+def atualizar_registrando(processos, valores):
+    """ProcessoQuerySet.update() quando muda um campo rastreado: lotes por chave, eventos de cada lote."""
+    atualizados = 0
+    with transaction.atomic():
+        antes = estados(processos)
+        pks = list(antes)
+        for inicio in range(0, len(pks), TAMANHO_LOTE):
+            lote = Processo.objects.filter(pk__in=pks[inicio:inicio + TAMANHO_LOTE])
+            atualizados += models.QuerySet.update(lote, **valores)
+            registrar_diferencas(antes, estados(lote), ProcessoEvento.Origem.LOTE)
+    return atualizados
+
+
+# --- Consultas ---
+
+def tempo_medio_em_status(status, inicio, fim):
+    """
+    Permanência média em `status`, por secretaria, dos processos que saíram dele em [inicio, fim).
+    O filtro em registrado_em limita a leitura às partições do período (evento_saida_status_idx);
+    a sigla vem da árvore da hierarquia em memória, sem JOIN com secretaria.
+    """
+    arvore = obter_arvore()
+    linhas = [
+        {**linha, 'secretaria__sigla': arvore.sigla(linha['secretaria_id'])}
+        for linha in ProcessoEvento.objects.filter(
+            status_anterior=status, registrado_em__gte=inicio, registrado_em__lt=fim, status_desde__isnull=False,
+        ).exclude(status=status).values('secretaria_id').annotate(
+            saidas=Count('id'), media=Avg(F('registrado_em') - F('status_desde')),
+        ).order_by()
+    ]
+    return sorted(linhas, key=lambda linha: (linha['secretaria__sigla'] is None, linha['secretaria__sigla'] or ''))
+
+
+# --- Partições mensais ---
+# Eventos fora das partições existentes caem na partição padrão; a tarefa diária
+# core.tasks.criar_particoes_eventos mantém os próximos meses criados com antecedência.
+# Se a padrão já tiver linhas do mês (tarefa atrasada, evento com data futura), o PostgreSQL
+# recusa o CREATE ... PARTITION OF: a padrão é desanexada, a partição criada, as linhas
+# movidas para ela e a padrão reanexada, tudo numa transação.
+
+MESES_A_FRENTE = 3
+PARTICAO_PADRAO = f'{TABELA}_padrao'
+
+
+def nome_particao(mes):
+    return f'{TABELA}_{mes:%Y%m}'
+
+
+def mes_seguinte(mes):
+    return (mes.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _criar_particao(cursor, mes, seguinte):
+    nome, faixa = nome_particao(mes), [mes.isoformat(), seguinte.isoformat()]
+    limites = f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{seguinte.isoformat()}')"
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {PARTICAO_PADRAO} WHERE registrado_em >= %s AND registrado_em < %s)", faixa
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {nome} PARTITION OF {TABELA} {limites}")
+        return
+    with transaction.atomic():
+        cursor.execute(f"ALTER TABLE {TABELA} DETACH PARTITION {PARTICAO_PADRAO}")
+        cursor.execute(f"CREATE TABLE {nome} PARTITION OF {TABELA} {limites}")
+        cursor.execute(
+            f"WITH movidas AS (DELETE FROM {PARTICAO_PADRAO} WHERE registrado_em >= %s AND registrado_em < %s "
+            f"RETURNING *) INSERT INTO {nome} SELECT * FROM movidas", faixa
+        )
+        cursor.execute(f"ALTER TABLE {TABELA} ATTACH PARTITION {PARTICAO_PADRAO} DEFAULT")
+
+
+def criar_particoes(meses_a_frente=MESES_A_FRENTE, a_partir_de=None):
+    """Cria as partições que faltarem do mês de `a_partir_de` (hoje) até `meses_a_frente` depois."""
+    mes = (a_partir_de or timezone.localdate()).replace(day=1)
+    criadas = []
+    with connection.cursor() as cursor:
+        for _ in range(meses_a_frente + 1):
+            seguinte = mes_seguinte(mes)
+            cursor.execute("SELECT to_regclass(%s)", [nome_particao(mes)])
+            if cursor.fetchone()[0] is None:
+                _criar_particao(cursor, mes, seguinte)
+                criadas.append(nome_particao(mes))
+            mes = seguinte
+    return criadas
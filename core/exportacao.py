@@ -0,0 +1,294 @@
+# /var/www/gea/core/exportacao.py
+
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .hierarquia import obter_arvore
+from .models import CartaDeServicos, Processo, SituacaoPrazo
+
+# Exportação de processos e da Carta de Serviços em CSV ou XLSX, enviada enquanto é lida.
+# As linhas vêm de um cursor no servidor (iterator) em blocos de TAMANHO_BLOCO, só com as
+# colunas exportadas (values_list); secretaria, departamento e divisão saem da árvore em
+# memória (core.hierarquia) em vez de JOINs. Cada bloco é escrito e enviado antes do próximo
+# ser lido: a memória não cresce com o volume e o cabeçalho sai antes da primeira consulta.
+# O XLSX é montado aqui mesmo, direto num zip sem seek(), com textos inline (sem a tabela de
+# strings compartilhadas, que precisaria de todas as linhas em memória).
+# Sob ASGI, um StreamingHttpResponse com iterador síncrono é consumido inteiro em memória antes
+# do envio (o Django avisa e faz list() dele); por isso, numa requisição ASGI os pedaços saem de
+# um iterador assíncrono, com cada bloco lido por sync_to_async no thread da conexão.
+
+TAMANHO_BLOCO = 2000
+
+# Limite de linhas de uma aba do Excel; acima disso a exportação continua numa aba nova
+LINHAS_POR_ABA = 1048576
+
+
+@dataclass(frozen=True)
+class Layout:
+    nome: str            # nome do arquivo e das abas
+    cabecalho: tuple
+    campos: tuple        # projeção do values_list
+    converter: object    # (valores, árvore) -> linha exportada
+
+
+def _data_hora(valor):
+    return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S') if valor else None
+
+
+def _data(valor):
+    return valor.isoformat() if valor else None
+
+
+def _nome(no):
+    return no.nome if no else None
+
+
+STATUS = dict(Processo.STATUS_CHOICES)
+SITUACOES = dict(SituacaoPrazo.choices)
+
+
+def _linha_processo(valores, arvore):
+    (pk, protocolo, id_colab, solicitante, servico, secretaria, divisao, status, situacao,
+     data_protocolo, data_prazo, data_conclusao, responsavel, detalhes) = valores
+    divisao = arvore.divisao(divisao)
+    departamento = arvore.departamento(divisao.pai) if divisao else None
+    return [
+        pk, protocolo, id_colab, solicitante, servico,
+        arvore.sigla(secretaria), _nome(departamento), _nome(divisao),
+        STATUS.get(status, status), SITUACOES.get(situacao, situacao),
+        _data_hora(data_protocolo), _data(data_prazo), _data_hora(data_conclusao), responsavel, detalhes,
+    ]
+
+
+PROCESSOS = Layout(
+    nome='processos',
+    cabecalho=(
+        'ID', 'Protocolo', 'ID ColabGov', 'Solicitante', 'Serviço', 'Secretaria', 'Departamento', 'Divisão',
+        'Status', 'Situação do Prazo', 'Data do Protocolo', 'Prazo Final', 'Data de Conclusão', 'Responsável',
+        'Detalhes',
+    ),
+    campos=(
+        'pk', 'numero_protocolo', 'id_externo_colab', 'solicitante', 'servico_solicitado__nome_servico',
+        'secretaria_id', 'servico_solicitado__divisao_responsavel_id', 'status', 'situacao_prazo',
+        'data_protocolo', 'data_prazo', 'data_conclusao', 'responsavel_atual__username', 'detalhes_solicitacao',
+    ),
+    converter=_linha_processo,
+)
+
+
+def _linha_servico(valores, arvore):
+    pk, nome, secretaria, departamento, divisao, *demais = valores
+    secretaria = arvore.secretaria(secretaria)
+    return [
+        pk, nome, _nome(secretaria), secretaria.sigla if secretaria else None,
+        _nome(arvore.departamento(departamento)), _nome(arvore.divisao(divisao)), *demais,
+    ]
+
+
+# Cabeçalhos da importação (core.importacao.COLUNAS): o arquivo exportado pode ser reimportado
+SERVICOS = Layout(
+    nome='servicos',
+    cabecalho=(
+        'ID', 'Título', 'Secretaria', 'Sigla', 'Departamento', 'Divisão', 'Entidade', 'Órgão',
+        'Tipos de Atendimento', 'Solicitação pela Internet', 'Tipo', 'Forma Solicitação', 'Tipo Sistema',
+        'Prazo (dias)', 'Canal', 'Sistema',
+    ),
+    campos=(
+        'pk', 'nome_servico', 'secretaria_id', 'departamento_id', 'divisao_responsavel_id', 'entidade__nome',
+        'orgao_responsavel', 'tipos_atendimento', 'url_solicitacao', 'tipo_servico', 'forma_solicitacao',
+        'tipo_sistema', 'prazo_maximo_dias', 'canal', 'sistema',
+    ),
+    converter=_linha_servico,
+)
+
+LAYOUTS = {Processo: PROCESSOS, CartaDeServicos: SERVICOS}
+
+
+def linhas(queryset, layout):
+    """Cabeçalho e linhas de `queryset`, lidas do cursor do servidor bloco a bloco."""
+    yield list(layout.cabecalho)
+    arvore = obter_arvore()
+    for valores in queryset.order_by('pk').values_list(*layout.campos).iterator(chunk_size=TAMANHO_BLOCO):
+        yield layout.converter(valores, arvore)
+
+
+# --- CSV ---
+
+# Texto que começa com um destes vira fórmula ao abrir o CSV no Excel/LibreOffice (injeção de
+# fórmulas via solicitante, detalhes etc.). A célula sai com um apóstrofo na frente, que a
+# planilha mostra como texto; core.importacao o retira ao reimportar.
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+PREFIXO_TEXTO = "'"
+
+
+def _celula_csv(valor):
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return PREFIXO_TEXTO + valor
+    return valor
+
+
+def gerar_csv(linhas, nome):
+    """CSV em UTF-8 com BOM e ';' (abre direto no Excel em português), um pedaço por bloco."""
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    escritor = csv.writer(buffer, delimiter=';')
+    for numero, linha in enumerate(linhas, 1):
+        escritor.writerow([_celula_csv(valor) for valor in linha])
+        if numero == 1 or numero % TAMANHO_BLOCO == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+# --- XLSX ---
+
+class _Saida:
+    """Destino do zip sem seek(): o zipfile grava descritores de dados e o conteúdo sai em pedaços."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NS_PLANILHA = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_RELACOES = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_TIPO_RELACAO = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_TIPO_CONTEUDO = 'application/vnd.openxmlformats-officedocument.spreadsheetml'
+
+# Caracteres de controle não são permitidos em XML 1.0 (aparecem em textos colados de e-mails)
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _coluna(indice):
+    letras = ''
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _linha_xml(numero, linha, colunas):
+    celulas = []
+    for coluna, valor in zip(colunas, linha):
+        if valor is None or valor == '':
+            continue
+        referencia = f'{coluna}{numero}'
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            celulas.append(f'<c r="{referencia}"><v>{valor}</v></c>')
+        else:
+            texto = escape(_INVALIDOS_XML.sub('', str(valor)))
+            celulas.append(f'<c r="{referencia}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>')
+    return f'<row r="{numero}">{"".join(celulas)}</row>'.encode('utf-8')
+
+
+def _estrutura_xlsx(abas):
+    """Partes fixas do pacote; escritas no fim, quando já se sabe quantas abas houve."""
+    planilhas = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="{_TIPO_CONTEUDO}.worksheet+xml"/>'
+        for n in range(1, len(abas) + 1)
+    )
+    yield '[Content_Types].xml', (
+        f'{_XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        f'<Override PartName="/xl/workbook.xml" ContentType="{_TIPO_CONTEUDO}.sheet.main+xml"/>{planilhas}</Types>'
+    )
+    yield '_rels/.rels', (
+        f'{_XML}<Relationships xmlns="{_NS_RELACOES}">'
+        f'<Relationship Id="rId1" Type="{_TIPO_RELACAO}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+    )
+    folhas = ''.join(
+        f'<sheet name="{escape(aba)}" sheetId="{n}" r:id="rId{n}"/>' for n, aba in enumerate(abas, 1)
+    )
+    yield 'xl/workbook.xml', (
+        f'{_XML}<workbook xmlns="{_NS_PLANILHA}" xmlns:r="{_TIPO_RELACAO}"><sheets>{folhas}</sheets></workbook>'
+    )
+    relacoes = ''.join(
+        f'<Relationship Id="rId{n}" Type="{_TIPO_RELACAO}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+        for n in range(1, len(abas) + 1)
+    )
+    yield 'xl/_rels/workbook.xml.rels', f'{_XML}<Relationships xmlns="{_NS_RELACOES}">{relacoes}</Relationships>'
+
+
+def gerar_xlsx(linhas, nome):
+    """XLSX em pedaços; passando de LINHAS_POR_ABA, o restante vai para abas novas (com o cabeçalho)."""
+    saida = _Saida()
+    linhas = iter(linhas)
+    cabecalho = next(linhas)
+    colunas = [_coluna(n) for n in range(1, len(cabecalho) + 1)]
+    abas = []
+    linha = next(linhas, None)
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as pacote:
+        while True:
+            abas.append(nome.capitalize() if not abas else f'{nome.capitalize()} ({len(abas) + 1})')
+            with pacote.open(f'xl/worksheets/sheet{len(abas)}.xml', 'w', force_zip64=True) as planilha:
+                planilha.write(f'{_XML}<worksheet xmlns="{_NS_PLANILHA}"><sheetData>'.encode('utf-8'))
+                planilha.write(_linha_xml(1, cabecalho, colunas))
+                yield saida.retirar()
+                numero = 1
+                while linha is not None and numero < LINHAS_POR_ABA:
+                    numero += 1
+                    planilha.write(_linha_xml(numero, linha, colunas))
+                    if numero % TAMANHO_BLOCO == 0:
+                        yield saida.retirar()
+                    linha = next(linhas, None)
+                planilha.write(b'</sheetData></worksheet>')
+            if linha is None:
+                break
+        for parte, conteudo in _estrutura_xlsx(abas):
+            pacote.writestr(parte, conteudo)
+    yield saida.retirar()
+
+
+FORMATOS = {
+    'csv': (gerar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (gerar_xlsx, f'{_TIPO_CONTEUDO}.sheet'),
+}
+
+
+async def _em_async(pedacos):
+    """Os pedaços de um gerador síncrono, um sync_to_async por pedaço (thread_sensitive: mesmo cursor)."""
+    proximo = sync_to_async(next)
+    try:
+        while (pedaco := await proximo(pedacos, None)) is not None:
+            yield pedaco
+    finally:
+        # Cliente desconectado no meio: fecha o gerador (e o cursor do servidor) no thread dele
+        await sync_to_async(pedacos.close)()
+
+
+def exportar(queryset, formato, request=None):
+    """
+    StreamingHttpResponse com `queryset` (Processo ou CartaDeServicos) no `formato` de FORMATOS.
+    Com o `request` de uma requisição ASGI, o conteúdo é um iterador assíncrono.
+    """
+    layout = LAYOUTS[queryset.model]
+    gerar, tipo = FORMATOS[formato]
+    pedacos = (pedaco for pedaco in gerar(linhas(queryset, layout), layout.nome) if pedaco)
+    if isinstance(request, ASGIRequest):
+        pedacos = _em_async(pedacos)
+    resposta = StreamingHttpResponse(pedacos, content_type=tipo)
+    arquivo = f'{layout.nome}-{timezone.localdate():%Y%m%d}.{formato}'
+    resposta['Content-Disposition'] = f'attachment; filename="{arquivo}"'
+    return resposta
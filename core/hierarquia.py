@@ -0,0 +1,166 @@
+# /var/www/gea/core/hierarquia.py
+
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from .cache import NAMESPACE_HIERARQUIA, invalidar, versao
+from .models import Secretaria, Departamento, Divisao
+
+# Árvore Secretaria -> Departamento -> Divisão em memória, uma por processo. É pequena e quase
+# não muda: carregada inteira (três consultas) e recarregada quando a versão de
+# NAMESPACE_HIERARQUIA no cache compartilhado muda. Consultas por id, nome e sigla são acessos
+# a dicionário; agregações agrupam pelo id e trazem nome/sigla daqui em vez de um JOIN.
+# Gravações invalidam a versão só no commit (sinais para save()/delete(), alterada() para
+# bulk_create/update). Até lá, a transação que alterou a hierarquia lê uma árvore só dela, fora do
+# cache do processo: se houver rollback, nenhum nó fantasma fica na árvore compartilhada.
+
+SECRETARIA, DEPARTAMENTO, DIVISAO = 'secretaria', 'departamento', 'divisao'
+NIVEL_ACIMA = {DEPARTAMENTO: SECRETARIA, DIVISAO: DEPARTAMENTO}
+NIVEL_ABAIXO = {SECRETARIA: DEPARTAMENTO, DEPARTAMENTO: DIVISAO}
+
+# `pai` é o id do nível de cima (None nas secretarias); `sigla` só existe nas secretarias
+No = namedtuple('No', 'tipo id nome sigla pai')
+
+
+def gerar_sigla(nome, usadas=()):
+    """Sigla de uma secretaria nova; com sufixo numérico se já estiver em `usadas`."""
+    words = nome.upper().split()
+    if len(words) == 1:
+        # Se for palavra única (SEMAE, Segurança), usa o nome todo (até 20 chars)
+        sigla = words[0][:20]
+    else:
+        # Se for composto (Secretaria de Saúde), usa iniciais
+        sigla = "".join(word[0] for word in words)[:20]
+    # Evita colisão (ex: duas "Secretaria de S...")
+    base, sufixo = sigla, 2
+    while sigla in usadas:
+        sigla = f"{base[:20 - len(str(sufixo))]}{sufixo}"
+        sufixo += 1
+    return sigla
+
+
+class Arvore:
+    def __init__(self, secretarias, departamentos, divisoes):
+        self.nos = {SECRETARIA: {}, DEPARTAMENTO: {}, DIVISAO: {}}
+        self.filhos = defaultdict(list)          # (tipo, id) -> [No do nível de baixo]
+        self.por_nome_no_pai = {}                # (tipo, id do pai, nome) -> No (o de menor id)
+        for pk, nome, sigla in secretarias:
+            self.nos[SECRETARIA][pk] = No(SECRETARIA, pk, nome, sigla, None)
+        for tipo, linhas in ((DEPARTAMENTO, departamentos), (DIVISAO, divisoes)):
+            for pk, nome, pai in linhas:
+                no = self.nos[tipo][pk] = No(tipo, pk, nome, None, pai)
+                self.filhos[NIVEL_ACIMA[tipo], pai].append(no)
+                self.por_nome_no_pai.setdefault((tipo, pai, nome), no)
+        self.por_nome = {no.nome: no for no in self.nos[SECRETARIA].values()}
+        self.por_sigla = {no.sigla: no for no in self.nos[SECRETARIA].values()}
+
+    @classmethod
+    def carregar(cls):
+        return cls(
+            Secretaria.objects.order_by('pk').values_list('id', 'nome', 'sigla'),
+            Departamento.objects.order_by('pk').values_list('id', 'nome', 'secretaria_id'),
+            Divisao.objects.order_by('pk').values_list('id', 'nome', 'departamento_id'),
+        )
+
+    # --- Consultas diretas ---
+
+    def no(self, tipo, pk):
+        return self.nos[tipo].get(pk)
+
+    def secretaria(self, pk):
+        return self.nos[SECRETARIA].get(pk)
+
+    def departamento(self, pk):
+        return self.nos[DEPARTAMENTO].get(pk)
+
+    def divisao(self, pk):
+        return self.nos[DIVISAO].get(pk)
+
+    def secretaria_por_nome(self, nome):
+        return self.por_nome.get(nome)
+
+    def secretaria_por_sigla(self, sigla):
+        return self.por_sigla.get(sigla)
+
+    def filho_por_nome(self, tipo, pai, nome):
+        """Departamento (ou divisão) chamado `nome` dentro de `pai`; nomes só se repetem entre pais."""
+        return self.por_nome_no_pai.get((tipo, pai, nome))
+
+    def sigla(self, secretaria_id):
+        no = self.nos[SECRETARIA].get(secretaria_id)
+        return no.sigla if no else None
+
+    def secretarias(self):
+        return sorted(self.nos[SECRETARIA].values(), key=lambda no: no.nome)
+
+    @property
+    def siglas(self):
+        return self.por_sigla.keys()
+
+    # --- Navegação ---
+
+    def ancestrais(self, tipo, pk):
+        """Nós acima de (tipo, pk), do pai até a secretaria."""
+        caminho = []
+        no = self.no(tipo, pk)
+        while no is not None and no.pai is not None:
+            no = self.no(NIVEL_ACIMA[no.tipo], no.pai)
+            if no is not None:
+                caminho.append(no)
+        return caminho
+
+    def secretaria_de(self, tipo, pk):
+        """Secretaria de um nó (ele mesmo, se for secretaria)."""
+        if tipo == SECRETARIA:
+            return self.secretaria(pk)
+        acima = self.ancestrais(tipo, pk)
+        return acima[-1] if acima and acima[-1].tipo == SECRETARIA else None
+
+    def descendentes(self, tipo, pk, so_tipo=None):
+        """Nós abaixo de (tipo, pk), nível a nível; com `so_tipo`, só os daquele nível."""
+        encontrados, nivel = [], [(tipo, pk)]
+        while nivel:
+            nivel = [(filho.tipo, filho.id) for chave in nivel for filho in self.filhos.get(chave, ())]
+            encontrados.extend(self.no(*chave) for chave in nivel)
+        if so_tipo is not None:
+            encontrados = [no for no in encontrados if no.tipo == so_tipo]
+        return encontrados
+
+
+_arvore = None
+_versao_arvore = None
+
+
+class _Invalidacao:
+    """Callback de on_commit de uma alteração; enquanto não roda, a alteração está pendente."""
+
+    def __init__(self):
+        self.executada = False
+
+    def __call__(self):
+        self.executada = True
+        invalidar(NAMESPACE_HIERARQUIA)
+
+
+def _alteracao_pendente():
+    """A transação atual alterou a hierarquia e ainda não foi confirmada (rollback descarta o callback)."""
+    conexao = transaction.get_connection()
+    return conexao.in_atomic_block and any(
+        isinstance(funcao, _Invalidacao) and not funcao.executada for _, funcao, _ in conexao.run_on_commit
+    )
+
+
+def obter_arvore():
+    """Árvore compartilhada pelo processo; recarregada quando a hierarquia muda."""
+    global _arvore, _versao_arvore
+    if _alteracao_pendente():
+        return Arvore.carregar()
+    atual = versao(NAMESPACE_HIERARQUIA)
+    if _arvore is None or _versao_arvore != atual:
+        _arvore, _versao_arvore = Arvore.carregar(), atual
+    return _arvore
+
+
+def alterada():
+    """Para gravações na hierarquia que não passam pelos sinais (bulk_create, update)."""
+    transaction.on_commit(_Invalidacao())
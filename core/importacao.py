@@ -0,0 +1,498 @@
+# /var/www/gea/core/importacao.py
+
+import csv
+import hashlib
+import json
+import os
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import django
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils import timezone
+from . import hierarquia
+from .cache import NAMESPACE_CATALOGO, invalidar
+from .classificacao import classificar_servico
+from .exportacao import INICIO_FORMULA, PREFIXO_TEXTO
+from .models import Entidade, Secretaria, Departamento, Divisao, CartaDeServicos
+
+# Importação da Carta de Serviços (comando import_carta_completa) em quatro etapas:
+#   1. leitura    -> CSV ou XLSX em linhas brutas              } por arquivo, em processos
+#   2. validação  -> cabeçalhos reconhecidos, textos limpos    } paralelos, sem banco
+#   3. hierarquia -> entidades, secretarias, departamento e divisão padrão
+#   4. gravação   -> bulk_create/bulk_update só do que mudou, tudo numa transação
+# Vários arquivos são combinados por título (o último arquivo/linha prevalece). Colunas que
+# um arquivo não tem não apagam o que já está gravado. No dry-run as etapas 3 e 4 só calculam.
+# Cada serviço guarda o hash do que foi importado e o arquivo/linha de onde veio: reimportar a
+# mesma planilha não escreve nada, e serviços que sumiram do arquivo são listados (e, com
+# remover_ausentes, marcados em removido_em).
+
+DEPARTAMENTO_PADRAO = "Departamento Geral"
+DIVISAO_PADRAO = "Atendimento Geral"
+PRAZO_PADRAO = 30
+
+# Cabeçalho (sem acentos, minúsculo) -> campo da linha validada
+COLUNAS = {
+    'titulo': 'titulo',
+    'secretaria': 'secretaria',
+    'entidade': 'entidade',
+    'orgao': 'orgao_responsavel',
+    'tipos de atendimento': 'tipos_atendimento',
+    'solicitacao pela internet': 'url_solicitacao',
+    'tipo': 'tipo_servico',
+    'forma solicitacao': 'forma_solicitacao',
+    'tipo sistema': 'tipo_sistema',
+}
+
+# Campos texto da Carta vindos direto da planilha
+CAMPOS_TEXTO = ('orgao_responsavel', 'tipos_atendimento', 'url_solicitacao', 'tipo_servico', 'forma_solicitacao', 'tipo_sistema')
+
+# Campo da linha validada -> (modelo, campo) onde é gravado, para o limite de tamanho
+DESTINOS = {
+    'titulo': (CartaDeServicos, 'nome_servico'),
+    'secretaria': (Secretaria, 'nome'),
+    'entidade': (Entidade, 'nome'),
+    **{campo: (CartaDeServicos, campo) for campo in CAMPOS_TEXTO},
+}
+
+# Campos da Carta de Serviço que a importação pode alterar
+CAMPOS_SERVICO = (
+    'divisao_responsavel_id', 'departamento_id', 'secretaria_id', 'entidade_id',
+    *CAMPOS_TEXTO, 'prazo_maximo_dias', 'canal', 'sistema',
+)
+
+
+def sem_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+
+def limpar(valor):
+    """Texto da célula sem espaços duplicados ('' para vazio/None)."""
+    return ' '.join(str(valor).split()) if valor is not None else ''
+
+
+@dataclass
+class ArquivoLido:
+    caminho: str
+    linhas: list = field(default_factory=list)        # [(número da linha, {campo: valor})]
+    problemas: list = field(default_factory=list)     # [(arquivo, número da linha, mensagem)]
+    colunas_ignoradas: list = field(default_factory=list)
+    completo: bool = True                             # False se a leitura parou no meio
+
+    @property
+    def nome(self):
+        return Path(self.caminho).name
+
+
+# --- Etapa 1: leitura ---
+
+def ler_csv(caminho):
+    with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+        amostra = arquivo.read(64 * 1024)
+        arquivo.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;')
+        except csv.Error:
+            dialeto = csv.excel
+        for linha in csv.reader(arquivo, dialeto):
+            # Desfaz a proteção contra fórmulas do CSV exportado (core.exportacao)
+            yield [
+                celula[1:] if celula.startswith(PREFIXO_TEXTO) and celula[1:].startswith(INICIO_FORMULA) else celula
+                for celula in linha
+            ]
+
+
+def ler_xlsx(caminho):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("leitura de .xlsx requer o pacote openpyxl (pip install openpyxl)")
+    planilha = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        yield from planilha.worksheets[0].iter_rows(values_only=True)
+    finally:
+        planilha.close()
+
+
+LEITORES = {'.csv': ler_csv, '.xlsx': ler_xlsx}
+
+
+# --- Etapa 2: validação e normalização ---
+
+def validar_linha(valores, colunas, tamanhos, validar_url):
+    """{campo: valor} limpo e a lista de problemas; sem título ou secretaria/órgão a linha é descartada."""
+    linha = {campo: limpar(valor) for campo, valor in zip(colunas, valores) if campo}
+    problemas = []
+    if not linha.get('titulo'):
+        return None, ["Título em branco."]
+    if not linha.get('secretaria') and not linha.get('orgao_responsavel'):
+        return None, ["Secretaria (ou Órgão) em branco."]
+    for campo, tamanho in tamanhos.items():
+        if len(linha.get(campo, '')) > tamanho:
+            return None, [f"{campo} com mais de {tamanho} caracteres."]
+    if linha.get('url_solicitacao'):
+        try:
+            validar_url(linha['url_solicitacao'])
+        except ValidationError:
+            problemas.append(f"Link inválido ignorado: {linha.pop('url_solicitacao')}")
+    return linha, problemas
+
+
+def processar_arquivo(caminho):
+    """Etapas 1 e 2 de um arquivo (roda nos processos do pool: não acessa o banco)."""
+    resultado = ArquivoLido(caminho)
+    leitor = LEITORES.get(Path(caminho).suffix.lower())
+    if leitor is None:
+        resultado.problemas.append((caminho, 0, f"Formato não suportado (use {', '.join(LEITORES)})."))
+        resultado.completo = False
+        return resultado
+    try:
+        linhas = leitor(caminho)
+        cabecalho = next(linhas, None) or ()
+        colunas = [COLUNAS.get(sem_acentos(limpar(nome)).lower()) for nome in cabecalho]
+        resultado.colunas_ignoradas = [limpar(nome) for nome, campo in zip(cabecalho, colunas) if not campo and limpar(nome)]
+        if 'titulo' not in colunas:
+            resultado.problemas.append((caminho, 1, "Coluna Título não encontrada no cabeçalho."))
+            resultado.completo = False
+            return resultado
+
+        tamanhos = {
+            campo: modelo._meta.get_field(nome).max_length
+            for campo, (modelo, nome) in DESTINOS.items() if campo in colunas
+        }
+        validar_url = URLValidator()
+        for numero, valores in enumerate(linhas, start=2):
+            if not any(valor not in (None, '') for valor in valores):
+                continue
+            linha, problemas = validar_linha(valores, colunas, tamanhos, validar_url)
+            resultado.problemas.extend((caminho, numero, problema) for problema in problemas)
+            if linha is not None:
+                resultado.linhas.append((numero, linha))
+    except (OSError, ValueError, csv.Error) as erro:
+        resultado.problemas.append((caminho, 0, f"Falha na leitura: {erro}"))
+        resultado.completo = False
+    return resultado
+
+
+def ler_arquivos(caminhos, processos=None):
+    """Etapas 1 e 2 de todos os arquivos, um arquivo por processo do pool. Mantém a ordem."""
+    processos = min(processos or os.cpu_count() or 1, len(caminhos))
+    if processos <= 1:
+        return [processar_arquivo(caminho) for caminho in caminhos]
+    with ProcessPoolExecutor(max_workers=processos, initializer=django.setup) as pool:
+        return list(pool.map(processar_arquivo, caminhos))
+
+
+def combinar(lidos):
+    """
+    ({título: campos}, {título: (arquivo, linha)}), com arquivos e linhas posteriores
+    sobrescrevendo só os campos que trazem; a origem é a última linha do título.
+    """
+    servicos, origens = {}, {}
+    for lido in lidos:
+        for numero, linha in lido.linhas:
+            servicos.setdefault(linha['titulo'], {}).update(linha)
+            origens[linha['titulo']] = (lido.nome, numero)
+    return servicos, origens
+
+
+# --- Etapa 3: hierarquia ---
+
+@dataclass(frozen=True)
+class Pendente:
+    """Registro que a importação criaria (no dry-run fica no lugar do id)."""
+    tipo: str
+    nome: str
+
+    def __str__(self):
+        return f"{self.nome} (nova {self.tipo})"
+
+
+@dataclass
+class Hierarquia:
+    entidades: dict        # nome -> id | Pendente
+    divisoes: dict         # nome da secretaria -> (divisão, departamento, secretaria)
+    nomes: dict            # campo *_id -> {id: nome}, para descrever as diferenças
+    criadas: list          # Pendente de tudo o que foi (ou seria) criado
+    avisos: list = field(default_factory=list)   # [(arquivo, número da linha, mensagem)], como os problemas
+
+
+def secretarias_por_orgao(servicos):
+    """
+    Arquivos sem a coluna Secretaria (como old/carta_de_servicos.csv) trazem só o Órgão.
+    O órgão é associado à secretaria mais frequente para ele nos outros arquivos ou na carta gravada.
+    """
+    contagem = Counter(
+        (campos['orgao_responsavel'], campos['secretaria'])
+        for campos in servicos.values() if campos.get('secretaria') and campos.get('orgao_responsavel')
+    )
+    arvore = hierarquia.obter_arvore()
+    contagem.update(
+        (orgao, arvore.secretaria(secretaria_id).nome)
+        for orgao, secretaria_id in CartaDeServicos.objects.exclude(orgao_responsavel__isnull=True)
+        .exclude(orgao_responsavel='').filter(secretaria__isnull=False).values_list('orgao_responsavel', 'secretaria_id')
+    )
+    mapa = {}
+    for (orgao, secretaria), _ in contagem.most_common():
+        mapa.setdefault(orgao, secretaria)
+    return mapa
+
+
+def resolver_hierarquia(servicos, gravar=True):
+    """
+    Garante (ou, sem gravar, planeja) entidades e secretarias com departamento/divisão padrão.
+    O que já existe vem da árvore em memória (core.hierarquia), sem consultas.
+    """
+    criadas, avisos = [], []
+    arvore = hierarquia.obter_arvore()
+    gravadas = False
+
+    def criar(modelo, objetos, tipo, nome):
+        nonlocal gravadas
+        if gravar:
+            if objetos and modelo is not Entidade:
+                gravadas = True
+            return modelo.objects.bulk_create(objetos)
+        pendentes = [Pendente(tipo, nome(objeto)) for objeto in objetos]
+        for objeto, pendente in zip(objetos, pendentes):
+            objeto.pk = pendente
+        return objetos
+
+    entidades = dict(Entidade.objects.values_list('nome', 'id'))
+    novas = sorted({c['entidade'] for c in servicos.values() if c.get('entidade')} - entidades.keys())
+    for entidade in criar(Entidade, [Entidade(nome=nome) for nome in novas], 'entidade', lambda e: e.nome):
+        entidades[entidade.nome] = entidade.pk
+        criadas.append(Pendente('entidade', entidade.nome))
+
+    secretarias = {no.nome: no.id for no in arvore.secretarias()}
+    siglas_usadas = set(arvore.siglas)
+    novas = []
+    for nome in sorted({c['secretaria'] for c in servicos.values()} - secretarias.keys()):
+        # Sigla com sufixo se colidir: uma duplicata quebraria a transação inteira
+        sigla = hierarquia.gerar_sigla(nome, siglas_usadas)
+        pretendida = hierarquia.gerar_sigla(nome)
+        if sigla != pretendida:
+            # Reportada: a secretaria que já tem a sigla não é alterada
+            dona = arvore.secretaria_por_sigla(pretendida)
+            usada_por = f"'{dona.nome}'" if dona else "outra secretaria desta importação"
+            avisos.append(('', 0, f"Secretaria '{nome}': sigla {pretendida} já usada por {usada_por}; criada como {sigla}."))
+        siglas_usadas.add(sigla)
+        novas.append(Secretaria(nome=nome, sigla=sigla))
+    for secretaria in criar(Secretaria, novas, 'secretaria', lambda s: f"{s.nome} [{s.sigla}]"):
+        secretarias[secretaria.nome] = secretaria.pk
+        criadas.append(secretaria.pk if not gravar else Pendente('secretaria', f"{secretaria.nome} [{secretaria.sigla}]"))
+
+    departamentos = {}
+    for pk in secretarias.values():
+        no = arvore.filho_por_nome(hierarquia.DEPARTAMENTO, pk, DEPARTAMENTO_PADRAO)
+        if no is not None:
+            departamentos[pk] = no.id
+    faltantes = [Departamento(secretaria_id=pk, nome=DEPARTAMENTO_PADRAO) for pk in secretarias.values() if pk not in departamentos]
+    for departamento in criar(Departamento, faltantes, 'departamento', lambda d: f"{DEPARTAMENTO_PADRAO} de {d.secretaria_id}"):
+        departamentos[departamento.secretaria_id] = departamento.pk
+
+    divisoes = {}
+    for pk in departamentos.values():
+        no = arvore.filho_por_nome(hierarquia.DIVISAO, pk, DIVISAO_PADRAO)
+        if no is not None:
+            divisoes[pk] = no.id
+    faltantes = [Divisao(departamento_id=pk, nome=DIVISAO_PADRAO) for pk in departamentos.values() if pk not in divisoes]
+    for divisao in criar(Divisao, faltantes, 'divisão', lambda d: f"{DIVISAO_PADRAO} de {d.departamento_id}"):
+        divisoes[divisao.departamento_id] = divisao.pk
+
+    # bulk_create não dispara os sinais que invalidam a árvore
+    if gravadas:
+        hierarquia.alterada()
+
+    nomes = {
+        'secretaria_id': {pk: nome for nome, pk in secretarias.items()},
+        'entidade_id': {pk: nome for nome, pk in entidades.items()},
+    }
+    return Hierarquia(
+        entidades=entidades,
+        divisoes={nome: (divisoes[departamentos[pk]], departamentos[pk], pk) for nome, pk in secretarias.items()},
+        nomes=nomes,
+        criadas=criadas,
+        avisos=avisos,
+    )
+
+
+# --- Etapa 4: diferenças e gravação ---
+
+@dataclass
+class Diferencas:
+    novos: list = field(default_factory=list)       # CartaDeServicos ainda não gravados
+    alterados: list = field(default_factory=list)   # [(serviço, {campo: (antes, depois)})]
+    rehash: list = field(default_factory=list)      # sem mudança nos campos, só hash/origem a regravar
+    ausentes: list = field(default_factory=list)    # serviços que sumiram dos arquivos de origem
+    inalterados: int = 0                            # inclui os de `rehash`
+
+
+CAMPOS_ORIGEM = ('hash_importacao', 'arquivo_origem', 'linha_origem')
+
+
+def calcular_hash(campos, hierarquia):
+    """SHA-256 dos campos lidos e da hierarquia em que eles caem (uma secretaria recriada muda o hash)."""
+    conteudo = {
+        **campos,
+        'hierarquia': hierarquia.divisoes[campos['secretaria']],
+        'entidade_id': hierarquia.entidades.get(campos.get('entidade')),
+    }
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def valores_do_servico(campos, hierarquia, atual=None):
+    """Valores de CAMPOS_SERVICO para os campos da planilha; o que a planilha não traz fica como está."""
+    valores = {campo: campos[campo] for campo in CAMPOS_TEXTO if campo in campos}
+    valores['divisao_responsavel_id'], valores['departamento_id'], valores['secretaria_id'] = hierarquia.divisoes[campos['secretaria']]
+    if 'entidade' in campos:
+        valores['entidade_id'] = hierarquia.entidades.get(campos['entidade'])
+    if atual is None:
+        valores = {**{campo: '' for campo in CAMPOS_TEXTO}, 'prazo_maximo_dias': PRAZO_PADRAO, **valores}
+    if atual is None or {'forma_solicitacao', 'tipo_sistema'} & valores.keys():
+        # bulk_create/bulk_update não chamam save(): classifica o canal aqui
+        valores['canal'], valores['sistema'] = classificar_servico(
+            valores.get('forma_solicitacao', getattr(atual, 'forma_solicitacao', '')),
+            valores.get('tipo_sistema', getattr(atual, 'tipo_sistema', '')),
+        )
+    return valores
+
+
+def calcular_diferencas(servicos, origens, hierarquia, arquivos_completos):
+    """
+    Compara pelo hash: só os serviços com hash diferente (ou removidos) são lidos por inteiro e
+    comparados campo a campo. `arquivos_completos` delimita quem pode ser dado como ausente.
+    """
+    existentes = {}
+    for servico in CartaDeServicos.objects.only('id', 'nome_servico', 'removido_em', *CAMPOS_ORIGEM).order_by('pk'):
+        existentes.setdefault(servico.nome_servico, servico)
+
+    diferencas = Diferencas()
+    hashes = {titulo: calcular_hash(campos, hierarquia) for titulo, campos in servicos.items()}
+    a_comparar = [
+        existentes[titulo].pk for titulo in servicos
+        if titulo in existentes and (existentes[titulo].hash_importacao != hashes[titulo] or existentes[titulo].removido_em)
+    ]
+    completos = {
+        servico.pk: servico
+        for servico in CartaDeServicos.objects.filter(pk__in=a_comparar).only('id', 'nome_servico', 'removido_em', *CAMPOS_SERVICO)
+    }
+
+    for titulo, campos in servicos.items():
+        origem = {'hash_importacao': hashes[titulo], 'arquivo_origem': origens[titulo][0], 'linha_origem': origens[titulo][1]}
+        existente = existentes.get(titulo)
+        if existente is None:
+            diferencas.novos.append(CartaDeServicos(nome_servico=titulo, **valores_do_servico(campos, hierarquia), **origem))
+            continue
+        atual = completos.get(existente.pk)
+        if atual is None:
+            diferencas.inalterados += 1
+            continue
+        valores = {**valores_do_servico(campos, hierarquia, atual), 'removido_em': None}
+        mudancas = {
+            campo: (getattr(atual, campo), valor)
+            for campo, valor in valores.items() if getattr(atual, campo) != valor
+        }
+        # hash/origem acompanham a gravação, mas não aparecem como diferença
+        for campo, valor in origem.items():
+            setattr(atual, campo, valor)
+        if mudancas:
+            diferencas.alterados.append((atual, mudancas))
+        else:
+            diferencas.rehash.append(atual)
+            diferencas.inalterados += 1
+
+    diferencas.ausentes = [
+        servico for titulo, servico in existentes.items()
+        if titulo not in servicos and servico.arquivo_origem in arquivos_completos and servico.removido_em is None
+    ]
+    return diferencas
+
+
+def gravar_diferencas(diferencas, batch_size=500, remover_ausentes=False):
+    CartaDeServicos.objects.bulk_create(diferencas.novos, batch_size=batch_size)
+    campos = set()
+    for servico, mudancas in diferencas.alterados:
+        for campo, (_, valor) in mudancas.items():
+            setattr(servico, campo, valor)
+        campos |= mudancas.keys()
+    if campos:
+        CartaDeServicos.objects.bulk_update(
+            [s for s, _ in diferencas.alterados], sorted(campos | set(CAMPOS_ORIGEM)), batch_size=batch_size,
+        )
+    if diferencas.rehash:
+        CartaDeServicos.objects.bulk_update(diferencas.rehash, CAMPOS_ORIGEM, batch_size=batch_size)
+    if remover_ausentes and diferencas.ausentes:
+        CartaDeServicos.objects.filter(pk__in=[s.pk for s in diferencas.ausentes]).update(removido_em=timezone.now())
+
+
+def descrever_diferencas(diferencas, hierarquia):
+    """Linhas legíveis do que a importação cria e altera (saída do --dry-run)."""
+    def exibir(campo, valor):
+        return str(hierarquia.nomes.get(campo, {}).get(valor, valor)) if valor is not None else '-'
+
+    for pendente in hierarquia.criadas:
+        yield f"+ {pendente.tipo}: {pendente.nome}"
+    for servico in diferencas.novos:
+        yield f"+ serviço: {servico.nome_servico} [{exibir('secretaria_id', servico.secretaria_id)}]"
+    for servico, mudancas in diferencas.alterados:
+        yield f"~ serviço: {servico.nome_servico}"
+        for campo, (antes, depois) in mudancas.items():
+            if campo in ('divisao_responsavel_id', 'departamento_id'):
+                continue  # acompanham a secretaria
+            yield f"    {campo.removesuffix('_id')}: {exibir(campo, antes)} -> {exibir(campo, depois)}"
+    for servico in diferencas.ausentes:
+        yield f"- serviço: {servico.nome_servico} (ausente de {servico.arquivo_origem}, linha {servico.linha_origem})"
+
+
+# --- Orquestração ---
+
+@dataclass
+class ResultadoImportacao:
+    diferencas: Diferencas
+    hierarquia: Hierarquia
+    problemas: list
+    colunas_ignoradas: dict
+    lidas: int
+
+
+def importar_carta(caminhos, processos=None, dry_run=False, batch_size=500, remover_ausentes=False):
+    lidos = ler_arquivos(caminhos, processos)
+    problemas = [problema for lido in lidos for problema in lido.problemas]
+    servicos, origens = combinar(lidos)
+
+    # Linhas sem secretaria: resolvidas pelo órgão (layout antigo)
+    por_orgao = secretarias_por_orgao(servicos)
+    for titulo, campos in list(servicos.items()):
+        if not campos.get('secretaria'):
+            secretaria = por_orgao.get(campos['orgao_responsavel'])
+            if secretaria is None:
+                problemas.append(('', 0, f"{titulo}: secretaria não identificada para o órgão '{campos['orgao_responsavel']}'."))
+                del servicos[titulo]
+            else:
+                campos['secretaria'] = secretaria
+
+    # Tudo ou nada: uma falha no meio não deixa a carta pela metade
+    with transaction.atomic():
+        hierarquia = resolver_hierarquia(servicos, gravar=not dry_run)
+        problemas.extend(hierarquia.avisos)
+        diferencas = calcular_diferencas(servicos, origens, hierarquia, {lido.nome for lido in lidos if lido.completo})
+        if not dry_run:
+            gravar_diferencas(diferencas, batch_size, remover_ausentes)
+            # bulk_create/bulk_update não disparam post_save: invalida o cache do catálogo aqui
+            # (hash/origem regravados não mudam nada visível no catálogo)
+            if diferencas.novos or diferencas.alterados or hierarquia.criadas or (remover_ausentes and diferencas.ausentes):
+                transaction.on_commit(lambda: invalidar(NAMESPACE_CATALOGO))
+
+    return ResultadoImportacao(
+        diferencas=diferencas,
+        hierarquia=hierarquia,
+        problemas=problemas,
+        colunas_ignoradas={lido.caminho: lido.colunas_ignoradas for lido in lidos if lido.colunas_ignoradas},
+        lidas=sum(len(lido.linhas) for lido in lidos),
+    )
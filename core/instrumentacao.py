@@ -0,0 +1,214 @@
+# /var/www/gea/core/instrumentacao.py
+
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.template.base import Template
+from .cache import get_cache
+
+logger = logging.getLogger('core.instrumentacao')
+
+# Limites das faixas dos histogramas (a última faixa é "acima do maior limite")
+FAIXAS_TEMPO_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+FAIXAS_CONSULTAS = (1, 5, 10, 20, 50, 100, 250)
+
+_medicao_atual = contextvars.ContextVar('gea_medicao_atual', default=None)
+
+
+class Medicao:
+    """Métricas de um trecho de código: consultas SQL, tempo de banco, de templates e de Python."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.tempo_templates = 0.0
+        self.tempo_total = 0.0
+        self.sql_repetidos = Counter()
+        self._em_template = False
+        # Consultas paralelas (core.paralelo) somam aqui a partir dos threads do pool
+        self._trava = threading.Lock()
+
+    # Usado como connection.execute_wrapper: funciona com DEBUG=False
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._trava:
+                self.tempo_banco += time.perf_counter() - inicio
+                self.consultas += 1
+                self.sql_repetidos[sql] += 1
+
+    @property
+    def tempo_python(self):
+        return max(self.tempo_total - self.tempo_banco - self.tempo_templates, 0.0)
+
+    @property
+    def maior_repeticao(self):
+        """Quantas vezes o SQL mais repetido rodou (mesmo texto, parâmetros diferentes): indício de N+1."""
+        return max(self.sql_repetidos.values(), default=0)
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.tempo_banco * 1000:.1f};desc="{self.consultas} consultas"',
+            f'tpl;dur={self.tempo_templates * 1000:.1f};desc="templates"',
+            f'py;dur={self.tempo_python * 1000:.1f};desc="python"',
+            f'total;dur={self.tempo_total * 1000:.1f}',
+        ])
+
+
+@contextmanager
+def medir():
+    """
+    Context manager que mede tudo o que roda dentro dele, em todas as conexões:
+
+        with medir() as medicao:
+            ...
+        print(medicao.consultas, medicao.tempo_banco)
+    """
+    instalar_medicao_templates()
+    medicao = Medicao()
+    token = _medicao_atual.set(medicao)
+    inicio = time.perf_counter()
+    try:
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(medicao))
+            yield medicao
+    finally:
+        medicao.tempo_total = time.perf_counter() - inicio
+        _medicao_atual.reset(token)
+
+
+def medicao_atual():
+    """Medição ativa neste contexto (None fora de medir()), para instalá-la em outras conexões."""
+    return _medicao_atual.get()
+
+
+_render_original = None
+
+
+def instalar_medicao_templates():
+    """Envolve Template.render (uma vez por processo) para somar o tempo de renderização da medição ativa."""
+    global _render_original
+    if _render_original is not None:
+        return
+    _render_original = Template.render
+
+    def render(self, context):
+        medicao = _medicao_atual.get()
+        # Só o template mais externo conta; includes/extends já estão dentro do tempo dele
+        if medicao is None or medicao._em_template:
+            return _render_original(self, context)
+        medicao._em_template = True
+        inicio = time.perf_counter()
+        banco_inicio = medicao.tempo_banco
+        try:
+            return _render_original(self, context)
+        finally:
+            medicao._em_template = False
+            # Consultas disparadas por querysets preguiçosos no template contam como banco, não template
+            medicao.tempo_templates += (time.perf_counter() - inicio) - (medicao.tempo_banco - banco_inicio)
+
+    Template.render = render
+
+
+# --- Histogramas agregados por view (no cache, compartilhados entre processos) ---
+# Só operações atômicas do cache (add/incr), sem ler-alterar-gravar: requisições simultâneas em
+# processos diferentes não perdem contagens nem views. O cache precisa ser compartilhado
+# (core.W001); num cache local cada processo só enxerga as próprias requisições.
+
+# Quantas views já foram registradas; a n-ésima fica em CHAVE_VIEWS:n
+CHAVE_VIEWS = 'gea:instr:views'
+CAMPOS_SOMA = ('requisicoes', 'soma_tempo_ms', 'soma_banco_ms', 'soma_consultas')
+
+
+def _nomes_faixas(limites):
+    return [str(limite) for limite in limites] + [f'>{limites[-1]}']
+
+
+HISTOGRAMAS = {
+    'tempo_ms': (FAIXAS_TEMPO_MS, _nomes_faixas(FAIXAS_TEMPO_MS)),
+    'consultas': (FAIXAS_CONSULTAS, _nomes_faixas(FAIXAS_CONSULTAS)),
+}
+
+
+def _faixa(valor, limites):
+    for limite in limites:
+        if valor <= limite:
+            return str(limite)
+    return f'>{limites[-1]}'
+
+
+def _chaves(view):
+    prefixo = f'gea:instr:{view}'
+    chaves = {campo: f'{prefixo}:{campo}' for campo in CAMPOS_SOMA}
+    for nome, (_, faixas) in HISTOGRAMAS.items():
+        chaves.update({(nome, faixa): f'{prefixo}:{nome}:{faixa}' for faixa in faixas})
+    return chaves
+
+
+def _incrementar(cache, chave, delta=1):
+    try:
+        return cache.incr(chave, delta)
+    except ValueError:
+        cache.add(chave, 0, timeout=None)
+        return cache.incr(chave, delta)
+
+
+def _registrar_view(cache, view):
+    # add() só grava se a chave não existir: de requisições simultâneas, só uma numera a view
+    if cache.add(f'gea:instr:{view}:registrada', True, timeout=None):
+        cache.set(f'{CHAVE_VIEWS}:{_incrementar(cache, CHAVE_VIEWS)}', view, timeout=None)
+
+
+def _views(cache):
+    total = cache.get(CHAVE_VIEWS) or 0
+    return list(cache.get_many([f'{CHAVE_VIEWS}:{numero}' for numero in range(1, total + 1)]).values())
+
+
+def registrar(view, medicao):
+    cache = get_cache()
+    _registrar_view(cache, view)
+
+    chaves = _chaves(view)
+    tempo_ms = medicao.tempo_total * 1000
+    _incrementar(cache, chaves['requisicoes'])
+    _incrementar(cache, chaves['soma_tempo_ms'], round(tempo_ms))
+    _incrementar(cache, chaves['soma_banco_ms'], round(medicao.tempo_banco * 1000))
+    _incrementar(cache, chaves['soma_consultas'], medicao.consultas)
+    _incrementar(cache, chaves[('tempo_ms', _faixa(tempo_ms, FAIXAS_TEMPO_MS))])
+    _incrementar(cache, chaves[('consultas', _faixa(medicao.consultas, FAIXAS_CONSULTAS))])
+
+
+def obter_histogramas():
+    """{view: {requisicoes, médias, tempo_ms: {faixa: n}, consultas: {faixa: n}}}"""
+    cache = get_cache()
+    resultado = {}
+    for view in sorted(_views(cache)):
+        chaves = _chaves(view)
+        valores = cache.get_many(chaves.values())
+        valor = lambda chave: valores.get(chaves[chave], 0)  # noqa: E731
+        requisicoes = valor('requisicoes')
+        resultado[view] = {
+            'requisicoes': requisicoes,
+            'media_ms': round(valor('soma_tempo_ms') / requisicoes, 1) if requisicoes else 0,
+            'media_banco_ms': round(valor('soma_banco_ms') / requisicoes, 1) if requisicoes else 0,
+            'media_consultas': round(valor('soma_consultas') / requisicoes, 1) if requisicoes else 0,
+        }
+        for nome, (_, faixas) in HISTOGRAMAS.items():
+            resultado[view][nome] = {faixa: valor((nome, faixa)) for faixa in faixas}
+    return resultado
+
+
+def zerar_histogramas():
+    cache = get_cache()
+    total = cache.get(CHAVE_VIEWS) or 0
+    for view in _views(cache):
+        cache.delete_many([*_chaves(view).values(), f'gea:instr:{view}:registrada'])
+    cache.delete_many([CHAVE_VIEWS, *(f'{CHAVE_VIEWS}:{numero}' for numero in range(1, total + 1))])
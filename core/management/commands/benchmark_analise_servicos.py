@@ -0,0 +1,48 @@
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from core.cache import NAMESPACE_CATALOGO, invalidar
+from core.instrumentacao import medir
+from core.views import analise_servicos_view
+
+
+class Command(BaseCommand):
+    help = 'Mede analise_servicos_view com cache frio (invalidado a cada chamada) e quente.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteracoes', type=int, default=20, help='Requisições medidas em cada cenário.')
+
+    def handle(self, *args, **options):
+        iteracoes = options['iteracoes']
+        request = RequestFactory().get('/analise-servicos/')
+
+        frio = self.medir(request, iteracoes, invalidar_antes=True)
+        quente = self.medir(request, iteracoes, invalidar_antes=False)
+
+        for nome, (tempos, consultas) in (('Frio', frio), ('Quente', quente)):
+            self.stdout.write(
+                f'{nome:7} mediana {statistics.median(tempos):8.2f} ms | '
+                f'mín {min(tempos):8.2f} ms | máx {max(tempos):8.2f} ms | consultas/req {consultas}'
+            )
+        ganho = statistics.median(frio[0]) / max(statistics.median(quente[0]), 1e-6)
+        self.stdout.write(self.style.SUCCESS(f'Cache quente {ganho:.1f}x mais rápido que o frio.'))
+
+    def medir(self, request, iteracoes, invalidar_antes):
+        # A view é assíncrona: async_to_sync espera a resposta (chamá-la direto só criaria a corrotina)
+        view = async_to_sync(analise_servicos_view)
+        view(request)  # aquecimento (templates, conexões)
+        tempos = []
+        consultas = 0
+        for _ in range(iteracoes):
+            if invalidar_antes:
+                invalidar(NAMESPACE_CATALOGO)
+            # medir() conta também as consultas feitas nos threads de core.paralelo
+            with medir() as medicao:
+                inicio = time.perf_counter()
+                view(request)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = medicao.consultas
+        return tempos, consultas
@@ -0,0 +1,134 @@
+import io
+import json
+import math
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from core import sintetico
+from core.cache import NAMESPACE_CATALOGO, invalidar
+from core.instrumentacao import medir
+from core.models import Processo
+from core.views import dashboard_view, analise_servicos_view
+
+USUARIO_BENCHMARK = f'{sintetico.PREFIXO_SINTETICO}benchmark'
+
+
+def percentil(valores, p):
+    """Percentil por posto mais próximo (nearest-rank)."""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede dashboard_view, analise_servicos_view, import_carta_completa e a changelist de '
+        'Processo em várias escalas de processos sintéticos; emite p50/p95 e consultas em JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escalas', type=str, default='1000,10000,100000',
+                            help='Totais de processos sintéticos a medir, separados por vírgula.')
+        parser.add_argument('--repeticoes', type=int, default=10, help='Requisições medidas por cenário.')
+        parser.add_argument('--csv', type=str, default=str(settings.BASE_DIR / 'carta_completa.csv'),
+                            help='Planilha usada para medir a importação.')
+        parser.add_argument('--saida', type=str, default=None, help='Grava o JSON neste arquivo em vez do stdout.')
+        parser.add_argument('--limpar', action='store_true', help='Remove os processos sintéticos ao final.')
+
+    def handle(self, *args, **options):
+        try:
+            escalas = sorted(int(e) for e in options['escalas'].split(','))
+        except ValueError:
+            raise CommandError('--escalas deve ser uma lista de inteiros separados por vírgula.')
+        self.repeticoes = options['repeticoes']
+        self.csv = options['csv']
+
+        self.factory = RequestFactory()
+        self.usuario, _ = User.objects.get_or_create(
+            username=USUARIO_BENCHMARK, defaults={'is_staff': True, 'is_superuser': True},
+        )
+        self.processo_admin = admin.site._registry[Processo]
+
+        resultado = {
+            'gerado_em': timezone.now().isoformat(),
+            'banco': connection.vendor,
+            'repeticoes': self.repeticoes,
+            'escalas': [],
+        }
+        for escala in escalas:
+            faltam = escala - sintetico.contar_processos_sinteticos()
+            if faltam > 0:
+                self.stderr.write(f'Gerando {faltam} processos sintéticos...')
+                sintetico.gerar_processos(faltam)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Processo._meta.db_table}')
+
+            self.stderr.write(f'Medindo escala {escala}...')
+            resultado['escalas'].append({
+                'processos_sinteticos': escala,
+                'processos_total': Processo.objects.count(),
+                'cenarios': {
+                    'dashboard_view': self.medir(lambda: async_to_sync(dashboard_view)(self.get('/'))),
+                    'analise_servicos_view (frio)': self.medir(
+                        lambda: async_to_sync(analise_servicos_view)(self.get('/analise-servicos/')),
+                        preparar=lambda: invalidar(NAMESPACE_CATALOGO),
+                    ),
+                    'analise_servicos_view (quente)': self.medir(
+                        lambda: async_to_sync(analise_servicos_view)(self.get('/analise-servicos/')),
+                    ),
+                    'admin processo changelist': self.medir(self.changelist_processo),
+                    'import_carta_completa': self.medir(self.importar, repeticoes=max(1, self.repeticoes // 5)),
+                },
+            })
+
+        if options['limpar']:
+            sintetico.remover_processos_sinteticos()
+            User.objects.filter(username=USUARIO_BENCHMARK).delete()
+
+        saida = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(saida)
+            self.stderr.write(f"Resultado gravado em {options['saida']}")
+        else:
+            self.stdout.write(saida)
+
+    def get(self, caminho):
+        request = self.factory.get(caminho)
+        request.user = self.usuario
+        return request
+
+    def changelist_processo(self):
+        response = self.processo_admin.changelist_view(self.get('/admin/core/processo/'))
+        response.render()
+
+    def importar(self):
+        call_command('import_carta_completa', self.csv, stdout=io.StringIO())
+
+    def medir(self, executar, preparar=None, repeticoes=None):
+        executar()  # aquecimento
+        tempos = []
+        consultas = []
+        for _ in range(repeticoes or self.repeticoes):
+            if preparar:
+                preparar()
+            # medir() conta também as consultas feitas nos threads de core.paralelo
+            with medir() as medicao:
+                inicio = time.perf_counter()
+                executar()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(medicao.consultas)
+        return {
+            'p50_ms': round(percentil(tempos, 50), 2),
+            'p95_ms': round(percentil(tempos, 95), 2),
+            'media_ms': round(statistics.fmean(tempos), 2),
+            'consultas': max(consultas),
+        }
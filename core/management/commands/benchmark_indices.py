@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from core.metricas import calcular_kpis_dashboard
+from core.models import Processo
+from core.sintetico import gerar_processos, remover_processos_sinteticos
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Semeia N processos sintéticos e mostra EXPLAIN ANALYZE e tempos das consultas do '
+        'dashboard com e sem os índices de Processo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=0, help='Processos sintéticos a inserir antes de medir.')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Execuções do dashboard por cenário.')
+        parser.add_argument('--sem-planos', action='store_true', help='Mostra só os tempos, sem os planos.')
+        parser.add_argument('--limpar', action='store_true', help='Remove os processos sintéticos ao final.')
+
+    def handle(self, *args, **options):
+        if options['processos']:
+            inicio = time.perf_counter()
+            gerar_processos(options['processos'])
+            self.stdout.write(f"{options['processos']} processos sintéticos gerados em {time.perf_counter() - inicio:.1f}s")
+
+        with connection.cursor() as cursor:
+            # VACUUM atualiza o visibility map: sem ele não há index-only scan logo após a carga
+            cursor.execute(f'VACUUM ANALYZE {Processo._meta.db_table}')
+        self.stdout.write(f'Total de processos na tabela: {Processo.objects.count()}')
+
+        # "Antes": remove os índices numa transação que é desfeita ao final (DDL é transacional no PostgreSQL)
+        try:
+            with transaction.atomic():
+                with connection.schema_editor(atomic=False) as editor:
+                    for index in Processo._meta.indexes:
+                        editor.remove_index(Processo, index)
+                self.medir('SEM ÍNDICES', options)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.medir('COM ÍNDICES', options)
+
+        if options['limpar']:
+            self.stdout.write(f'{remover_processos_sinteticos()} processos sintéticos removidos.')
+
+    def medir(self, titulo, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {titulo} ==='))
+        calcular_kpis_dashboard()  # aquecimento do cache do PostgreSQL
+
+        tempos = []
+        for _ in range(options['repeticoes']):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                calcular_kpis_dashboard()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        self.stdout.write(f'Dashboard completo: mediana {tempos[len(tempos) // 2]:.1f} ms ({len(capturadas)} consultas)')
+
+        for numero, consulta in enumerate(capturadas.captured_queries, start=1):
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + consulta['sql'])
+                plano = [linha[0] for linha in cursor.fetchall()]
+            execucao = next((l for l in reversed(plano) if l.startswith('Execution Time')), '')
+            self.stdout.write(self.style.SQL_TABLE(f'\n[{numero}] {execucao}'))
+            self.stdout.write(f"    {consulta['sql'][:200]}")
+            if not options['sem_planos']:
+                for linha in plano:
+                    self.stdout.write(f'    {linha}')
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core import sintetico
+
+
+class Command(BaseCommand):
+    help = 'Gera volumes sintéticos realistas (secretarias, serviços, usuários e processos georreferenciados).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--secretarias', type=int, default=0, help='Secretarias sintéticas (cada uma com departamento e divisão).')
+        parser.add_argument('--servicos', type=int, default=0, help='Serviços sintéticos, distribuídos entre as secretarias sintéticas.')
+        parser.add_argument('--usuarios', type=int, default=0, help='Usuários (responsáveis) sintéticos.')
+        parser.add_argument('--processos', type=int, default=0, help='Processos sintéticos.')
+        parser.add_argument('--bbox', type=str, default=','.join(map(str, sintetico.BBOX_PADRAO)),
+                            help='Caixa das localizações: lon_min,lat_min,lon_max,lat_max.')
+        parser.add_argument('--dias-historico', type=int, default=365, help='Quantos dias para trás os prazos podem ir.')
+        parser.add_argument('--semente', type=int, default=None, help='Semente aleatória, para execuções reproduzíveis.')
+        parser.add_argument('--lote', type=int, default=5000, help='Tamanho dos lotes de INSERT.')
+        parser.add_argument('--limpar', action='store_true', help='Remove todos os dados sintéticos e sai.')
+
+    def handle(self, *args, **options):
+        if options['limpar']:
+            removidos = sintetico.remover_dados_sinteticos()
+            self.stdout.write(self.style.SUCCESS(
+                'Removidos: ' + ' | '.join(f'{tipo}: {total}' for tipo, total in removidos.items())
+            ))
+            return
+
+        try:
+            bbox = tuple(float(v) for v in options['bbox'].split(','))
+        except ValueError:
+            bbox = ()
+        if len(bbox) != 4:
+            raise CommandError('--bbox deve ter 4 números: lon_min,lat_min,lon_max,lat_max')
+
+        servicos = None
+        if options['secretarias']:
+            divisoes = self.etapa('secretarias', sintetico.gerar_hierarquia, options['secretarias'])
+            if options['servicos']:
+                servicos = self.etapa('serviços', sintetico.gerar_servicos, options['servicos'], divisoes,
+                                      semente=options['semente'])
+        elif options['servicos']:
+            raise CommandError('--servicos precisa de --secretarias (os serviços são criados nas secretarias sintéticas).')
+
+        responsaveis = None
+        if options['usuarios']:
+            responsaveis = self.etapa('usuários', sintetico.gerar_usuarios, options['usuarios'])
+
+        if options['processos']:
+            try:
+                self.etapa(
+                    'processos', sintetico.gerar_processos, options['processos'],
+                    servicos=servicos, responsaveis=responsaveis, bbox=bbox, lote=options['lote'],
+                    semente=options['semente'], dias_historico=options['dias_historico'],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+    def etapa(self, nome, funcao, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        total = resultado if isinstance(resultado, int) else len(resultado)
+        self.stdout.write(self.style.SUCCESS(f'Gerado(s) {total} {nome} em {time.perf_counter() - inicio:.1f}s'))
+        return resultado
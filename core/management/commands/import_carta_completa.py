@@ -1,87 +1,57 @@
-import csv
-from django.core.management.base import BaseCommand
-from core.models import Entidade, Secretaria, Departamento, Divisao, CartaDeServicos
+import os
+from django.core.management.base import BaseCommand, CommandError
+from core.importacao import LEITORES, importar_carta, descrever_diferencas
+
 
 class Command(BaseCommand):
-    help = 'Importa a Carta de Serviços COMPLETA. Cria hierarquia e popula metadados.'
+    help = (
+        'Importa a Carta de Serviços COMPLETA de um ou mais arquivos CSV/XLSX. '
+        'Cria hierarquia e popula metadados; --dry-run mostra as diferenças sem gravar.'
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='O caminho para o arquivo CSV completo.')
+        parser.add_argument('arquivos', nargs='+', type=str, help='Arquivos CSV ou XLSX (o último prevalece em títulos repetidos).')
+        parser.add_argument('--workers', type=int, default=None, help='Processos para leitura/validação (padrão: um por arquivo, até o nº de CPUs).')
+        parser.add_argument('--dry-run', action='store_true', help='Não grava: lista o que seria criado e alterado.')
+        parser.add_argument('--remover-ausentes', action='store_true', help='Marca como removidos os serviços que sumiram dos arquivos importados.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Tamanho dos lotes de INSERT/UPDATE.')
 
     def handle(self, *args, **options):
-        csv_file_path = options['csv_file']
-        self.stdout.write(self.style.SUCCESS(f'Iniciando importação completa: {csv_file_path}'))
-
-        try:
-            with open(csv_file_path, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file) 
-
-                for row in reader:
-                    titulo = row.get('Titulo', '').strip()
-                    secretaria_nome = row.get('Secretaria', '').strip()
-                    entidade_nome = row.get('Entidade', '').strip()
-
-                    if not titulo or not secretaria_nome:
-                        self.stdout.write(self.style.WARNING(f'Linha ignorada: Título ou Secretaria em branco.'))
-                        continue
-
-                    try:
-                        # 1. Garante a Entidade
-                        entidade_obj = None
-                        if entidade_nome:
-                            entidade_obj, _ = Entidade.objects.get_or_create(nome=entidade_nome)
-
-                        # --- LÓGICA DE SIGLA CORRIGIDA ---
-                        words = secretaria_nome.upper().split()
-                        if len(words) == 1:
-                            # Se for palavra única (SEMAE, Segurança), usa o nome todo (até 20 chars)
-                            sigla_auto = words[0][:20] 
-                        else:
-                            # Se for composto (Secretaria de Saúde), usa iniciais
-                            sigla_auto = "".join(word[0] for word in words)[:20]
-                        # --- FIM DA CORREÇÃO ---
-
-                        # 2. Garante a hierarquia (Secretaria)
-                        secretaria, _ = Secretaria.objects.get_or_create(
-                            nome=secretaria_nome,
-                            defaults={'sigla': sigla_auto}
-                        )
-                        departamento, _ = Departamento.objects.get_or_create(
-                            secretaria=secretaria,
-                            nome="Departamento Geral"
-                        )
-                        divisao, _ = Divisao.objects.get_or_create(
-                            departamento=departamento,
-                            nome="Atendimento Geral"
-                        )
-
-                        # 3. Cria ou atualiza a Carta de Serviço
-                        servico, created = CartaDeServicos.objects.update_or_create(
-                            nome_servico=titulo,
-                            defaults={
-                                'divisao_responsavel': divisao,
-                                'orgao_responsavel': row.get('Orgao', '').strip(),
-                                'tipos_atendimento': row.get('Tipos de Atendimento', '').strip(),
-                                'url_solicitacao': row.get('Solicitação pela Internet', '').strip(),
-                                'entidade': entidade_obj,
-                                'tipo_servico': row.get('Tipo', '').strip(),
-                                'forma_solicitacao': row.get('Forma Solicitação', '').strip(),
-                                'tipo_sistema': row.get('Tipo Sistema', '').strip(),
-                                'prazo_maximo_dias': 30
-                            }
-                        )
-
-                        if created:
-                            self.stdout.write(self.style.SUCCESS(f'Serviço "{titulo}" criado.'))
-                        else:
-                            self.stdout.write(self.style.NOTICE(f'Serviço "{titulo}" atualizado.'))
-
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f'ERRO na linha "{titulo}": {e}'))
-                        continue
-
-        except FileNotFoundError:
-            self.stdout.write(self.style.ERROR(f'Arquivo não encontrado: {csv_file_path}'))
-            return
-
-        self.stdout.write(self.style.SUCCESS('Importação completa concluída!'))
\ No newline at end of file
+        arquivos = options['arquivos']
+        verbosity = options['verbosity']
+        for arquivo in arquivos:
+            if not os.path.isfile(arquivo):
+                raise CommandError(f'Arquivo não encontrado: {arquivo}')
+            if os.path.splitext(arquivo)[1].lower() not in LEITORES:
+                raise CommandError(f'Formato não suportado: {arquivo} (use {", ".join(LEITORES)})')
+
+        self.stdout.write(self.style.SUCCESS(f'Iniciando importação completa: {", ".join(arquivos)}'))
+        resultado = importar_carta(
+            arquivos, options['workers'], options['dry_run'], options['batch_size'], options['remover_ausentes'],
+        )
+
+        for arquivo, colunas in resultado.colunas_ignoradas.items():
+            self.stdout.write(self.style.WARNING(f'{arquivo}: colunas ignoradas: {", ".join(colunas)}'))
+        if verbosity >= 2:
+            for arquivo, numero, mensagem in resultado.problemas:
+                local = f'{arquivo}, linha {numero}: ' if numero else (f'{arquivo}: ' if arquivo else '')
+                self.stdout.write(self.style.WARNING(f'{local}{mensagem}'))
+        if options['dry_run']:
+            for linha in descrever_diferencas(resultado.diferencas, resultado.hierarquia):
+                self.stdout.write(linha)
+        elif verbosity >= 2:
+            for servico in resultado.diferencas.ausentes:
+                self.stdout.write(self.style.WARNING(
+                    f'Ausente de {servico.arquivo_origem} (linha {servico.linha_origem}): {servico.nome_servico}'
+                ))
+
+        diferencas = resultado.diferencas
+        ausentes = f'Ausentes: {len(diferencas.ausentes)}'
+        if options['remover_ausentes'] and diferencas.ausentes and not options['dry_run']:
+            ausentes += ' (removidos)'
+        self.stdout.write(self.style.SUCCESS(
+            f'Importação completa {"simulada (nada gravado)" if options["dry_run"] else "concluída"}! '
+            f'Linhas lidas: {resultado.lidas} | Inseridos: {len(diferencas.novos)} | '
+            f'Atualizados: {len(diferencas.alterados)} | Inalterados: {diferencas.inalterados} | '
+            f'{ausentes} | Problemas: {len(resultado.problemas)}'
+        ))
@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand
+from core.cache import cache_compartilhado
+from core.instrumentacao import obter_histogramas, zerar_histogramas
+
+
+class Command(BaseCommand):
+    help = 'Mostra os histogramas de latência e de consultas por view coletados pelo InstrumentacaoMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Saída em JSON.')
+        parser.add_argument('--zerar', action='store_true', help='Apaga os histogramas depois de mostrar.')
+
+    def handle(self, *args, **options):
+        # Este comando roda em outro processo: só enxerga o que o servidor registrou num cache compartilhado
+        if not cache_compartilhado():
+            self.stderr.write(self.style.WARNING(
+                'O cache é local a este processo (core.W001): as requisições registradas pelo servidor '
+                'não aparecem aqui. Configure em CACHES um backend compartilhado (Redis ou Memcached).'
+            ))
+        histogramas = obter_histogramas()
+
+        if options['json']:
+            self.stdout.write(json.dumps(histogramas, indent=2, ensure_ascii=False))
+        elif not histogramas:
+            self.stdout.write('Nenhuma requisição registrada (GEA_INSTRUMENTACAO está ligado?).')
+        else:
+            # Views mais caras primeiro
+            for view, dados in sorted(histogramas.items(), key=lambda item: -item[1]['media_ms'] * item[1]['requisicoes']):
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"{view}: {dados['requisicoes']} req | média {dados['media_ms']} ms "
+                    f"({dados['media_banco_ms']} ms banco) | {dados['media_consultas']} consultas/req"
+                ))
+                self.stdout.write(f"  tempo (ms)  {self.formatar(dados['tempo_ms'])}")
+                self.stdout.write(f"  consultas   {self.formatar(dados['consultas'])}")
+
+        if options['zerar']:
+            zerar_histogramas()
+            self.stdout.write(self.style.SUCCESS('Histogramas zerados.'))
+
+    def formatar(self, histograma):
+        # Faixas vazias são omitidas; "≤100:3" = 3 requisições entre a faixa anterior e 100
+        return '  '.join(
+            f'{faixa if faixa.startswith(">") else "≤" + faixa}:{total}'
+            for faixa, total in histograma.items() if total
+        )
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Calendario
+from core.prazos import recalcular_prazos_abertos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o prazo dos processos em aberto com os calendários atuais (ex: depois de cadastrar feriados).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calendario', type=str, help='Nome do calendário (padrão: todos os processos em aberto).')
+
+    def handle(self, *args, **options):
+        calendario_id = None
+        if options['calendario']:
+            try:
+                calendario_id = Calendario.objects.get(nome=options['calendario']).pk
+            except Calendario.DoesNotExist:
+                raise CommandError(f"Calendário não encontrado: {options['calendario']}")
+
+        inicio = time.perf_counter()
+        alterados = recalcular_prazos_abertos(calendario_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Prazos recalculados em {time.perf_counter() - inicio:.1f}s. Processos alterados: {alterados}'
+        ))
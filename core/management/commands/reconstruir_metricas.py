@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from core import consolidacao
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói as métricas diárias (core.MetricaDiaria) a partir dos processos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apenas-fechamento', action='store_true',
+            help='Só regrava a fotografia de estoque do dia (o que a tarefa agendada faz).',
+        )
+        parser.add_argument('--data', help='Dia do fechamento (AAAA-MM-DD). Padrão: hoje.')
+
+    def handle(self, *args, **options):
+        data = None
+        if options['data']:
+            try:
+                data = datetime.date.fromisoformat(options['data'])
+            except ValueError:
+                raise CommandError(f"Data inválida: {options['data']}")
+
+        if options['apenas_fechamento']:
+            consolidacao.fechar_dia(data)
+            self.stdout.write(self.style.SUCCESS('Fechamento do dia regravado.'))
+            return
+
+        linhas = consolidacao.reconstruir()
+        if data:
+            consolidacao.fechar_dia(data)
+        self.stdout.write(self.style.SUCCESS(f'Métricas reconstruídas. Linhas em MetricaDiaria: {linhas}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.denormalizacao import reparar_hierarquia
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as cópias desnormalizadas de departamento/secretaria em serviços e processos.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            servicos, processos = reparar_hierarquia()
+        self.stdout.write(self.style.SUCCESS(
+            f'Hierarquia reparada. Serviços corrigidos: {servicos} | Processos corrigidos: {processos}'
+        ))
@@ -0,0 +1,128 @@
+# /var/www/gea/core/mapa.py
+
+import math
+import time
+
+from django.conf import settings
+from django.db import connection
+from .cache import NAMESPACE_MAPA, obter_ou_calcular
+from .models import Processo
+
+# Mapa dos processos: agrupamento em grade no servidor e vector tiles (MVT).
+# As duas consultas filtram pela caixa com && (índice GiST de localizacao) e agrupam em
+# Web Mercator, então o custo acompanha a área visível, não o total de processos.
+# Os tiles ficam em cache por janelas de GEA_MAPA_TIMEOUT_TILES segundos, em vez de serem
+# descartados a cada processo gravado (a importação do ColabGov grava o tempo todo): o mapa
+# mostra as alterações com até uma janela de atraso.
+
+# Largura do mundo em Web Mercator (metros) e tamanho de tile de referência (px)
+LARGURA_MUNDO = 2 * math.pi * 6378137
+TAMANHO_TILE = 256
+
+# Lado de cada célula de agrupamento, em pixels de tela
+PIXELS_POR_CELULA = 64
+
+# A partir deste zoom os tiles levam os pontos individuais em vez de grupos
+ZOOM_PONTOS = 14
+ZOOM_MAXIMO = 22
+
+EXTENT_MVT = 4096
+CAMADA_MVT = 'processos'
+
+TABELA_PROCESSOS = Processo._meta.db_table
+
+
+def tamanho_celula(zoom, pixels=PIXELS_POR_CELULA):
+    """Lado da célula da grade, em metros de Web Mercator, para o zoom dado."""
+    return LARGURA_MUNDO / (TAMANHO_TILE * 2 ** zoom) * pixels
+
+
+def _filtros(status=None, secretaria=None):
+    """Condições SQL sobre core_processo (alias p); por padrão só os processos em aberto."""
+    condicoes = ["p.localizacao IS NOT NULL", "p.status = ANY(%s)"]
+    params = [list(status or Processo.STATUS_ABERTOS)]
+    if secretaria:
+        condicoes.append("p.secretaria_id = %s")
+        params.append(secretaria)
+    return ' AND '.join(condicoes), params
+
+
+def agrupar(bbox, zoom, status=None, secretaria=None):
+    """
+    Contagens por célula de grade dentro de bbox (lon_min, lat_min, lon_max, lat_max).
+    Retorna [{'lon', 'lat', 'total', 'id'}]; 'id' só vem preenchido em células de um processo só.
+    """
+    filtros, params = _filtros(status, secretaria)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT COUNT(*), MIN(id),
+                   ST_X(ST_Transform(ST_Centroid(ST_Collect(geom)), 4326)),
+                   ST_Y(ST_Transform(ST_Centroid(ST_Collect(geom)), 4326))
+            FROM (
+                SELECT p.id, ST_Transform(p.localizacao, 3857) AS geom
+                FROM {TABELA_PROCESSOS} p
+                WHERE {filtros} AND p.localizacao && ST_MakeEnvelope(%s, %s, %s, %s, 4326)
+            ) pontos
+            GROUP BY ST_SnapToGrid(geom, %s)
+            ORDER BY 1 DESC
+        """, [*params, *bbox, tamanho_celula(zoom)])
+        return [
+            {'lon': lon, 'lat': lat, 'total': total, 'id': menor_id if total == 1 else None}
+            for total, menor_id, lon, lat in cursor.fetchall()
+        ]
+
+
+def gerar_tile(z, x, y, status=None, secretaria=None):
+    """
+    Tile MVT (bytes) da camada 'processos'. Abaixo de ZOOM_PONTOS cada feição é um grupo
+    com o atributo 'total'; a partir dele, um processo com id, status, secretaria e prazo.
+    """
+    filtros, params = _filtros(status, secretaria)
+    if z >= ZOOM_PONTOS:
+        feicoes = f"""
+            SELECT ST_AsMVTGeom(ST_Transform(p.localizacao, 3857), limites.envelope, {EXTENT_MVT}, 64, true) AS geom,
+                   p.id, p.status, p.secretaria_id, p.data_prazo::text AS data_prazo, 1 AS total
+            FROM {TABELA_PROCESSOS} p, limites
+            WHERE {filtros} AND p.localizacao && limites.envelope_4326
+        """
+    else:
+        feicoes = f"""
+            SELECT ST_AsMVTGeom(ST_Centroid(ST_Collect(pontos.geom)), limites.envelope, {EXTENT_MVT}, 64, true) AS geom,
+                   COUNT(*) AS total
+            FROM (
+                SELECT ST_Transform(p.localizacao, 3857) AS geom
+                FROM {TABELA_PROCESSOS} p, limites
+                WHERE {filtros} AND p.localizacao && limites.envelope_4326
+            ) pontos, limites
+            GROUP BY ST_SnapToGrid(pontos.geom, %s), limites.envelope
+        """
+        params = [*params, tamanho_celula(z)]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH limites AS (
+                SELECT envelope, ST_Transform(envelope, 4326) AS envelope_4326
+                FROM ST_TileEnvelope(%s, %s, %s) AS envelope
+            ),
+            feicoes AS ({feicoes})
+            SELECT ST_AsMVT(feicoes.*, %s, {EXTENT_MVT}, 'geom') FROM feicoes WHERE geom IS NOT NULL
+        """, [z, x, y, *params, CAMADA_MVT])
+        tile = cursor.fetchone()[0]
+    return bytes(tile) if tile else b''
+
+
+def timeout_tiles():
+    return getattr(settings, 'GEA_MAPA_TIMEOUT_TILES', 60)
+
+
+def janela_tiles():
+    """Janela de tempo atual: os tiles em cache (e a ETag deles) valem até ela virar."""
+    return int(time.time() // timeout_tiles())
+
+
+def obter_tile(z, x, y, status=None, secretaria=None):
+    """gerar_tile() em cache durante a janela de tempo atual."""
+    chave = f"tile:{janela_tiles()}:{z}/{x}/{y}:{','.join(sorted(status or ()))}:{secretaria or ''}"
+    return obter_ou_calcular(
+        NAMESPACE_MAPA, chave, lambda: gerar_tile(z, x, y, status, secretaria), timeout_tiles(),
+    )
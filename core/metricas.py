@@ -0,0 +1,256 @@
+# /var/www/gea/core/metricas.py
+
+import datetime
+from dataclasses import dataclass, field
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from . import paralelo
+from .cache import NAMESPACE_CATALOGO, NAMESPACE_PROCESSOS, aobter_ou_calcular, obter_ou_calcular
+from .hierarquia import obter_arvore
+from .models import Processo, CartaDeServicos, CanalAtendimento, MetricaDiaria
+
+# Janela (em dias) para um processo aberto ser considerado "crítico"
+DIAS_CRITICOS = 7
+
+
+@dataclass(frozen=True)
+class SerieGrafico:
+    labels: list = field(default_factory=list)
+    data: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {'labels': list(self.labels), 'data': list(self.data)}
+
+
+@dataclass(frozen=True)
+class KPIsDashboard:
+    """Resultado do dashboard, reaproveitável pela view, pela API JSON e pelos exportadores."""
+    data_referencia: datetime.date
+    total_abertos: int
+    total_atrasados: int
+    total_criticos: int
+    por_status: SerieGrafico
+    carga_secretarias: SerieGrafico
+    processos_criticos: list
+    atividade_recente: list
+
+    def as_dict(self):
+        return {
+            'data_referencia': self.data_referencia.isoformat(),
+            'total_abertos': self.total_abertos,
+            'total_atrasados': self.total_atrasados,
+            'total_criticos': self.total_criticos,
+            'por_status': self.por_status.as_dict(),
+            'carga_secretarias': self.carga_secretarias.as_dict(),
+            'processos_criticos': [serializar_processo(p) for p in self.processos_criticos],
+            'atividade_recente': [serializar_processo(p) for p in self.atividade_recente],
+        }
+
+
+@dataclass(frozen=True)
+class AnaliseServicos:
+    """Indicadores da Carta de Serviços exibidos em analise_servicos_view."""
+    total_servicos: int
+    total_nao_sistematizados: int
+    por_secretaria: SerieGrafico
+    por_tipo_sistema: SerieGrafico
+    por_sistema_operante: SerieGrafico
+
+    def as_dict(self):
+        return {
+            'total_servicos': self.total_servicos,
+            'total_nao_sistematizados': self.total_nao_sistematizados,
+            'por_secretaria': self.por_secretaria.as_dict(),
+            'por_tipo_sistema': self.por_tipo_sistema.as_dict(),
+            'por_sistema_operante': self.por_sistema_operante.as_dict(),
+        }
+
+
+def serializar_processo(processo):
+    return {
+        'id': processo.pk,
+        'numero_protocolo': processo.numero_protocolo,
+        'servico': processo.servico_solicitado.nome_servico,
+        'status': processo.status,
+        'data_protocolo': processo.data_protocolo.isoformat() if processo.data_protocolo else None,
+        'data_prazo': processo.data_prazo.isoformat() if processo.data_prazo else None,
+    }
+
+
+def _estoque_aberto():
+    return MetricaDiaria.objects.filter(status__in=Processo.STATUS_ABERTOS)
+
+
+def _contagens(hoje, limite_critico):
+    def soma(filtro=None):
+        return Coalesce(Sum('vencimentos', filter=filtro), 0)
+
+    return _estoque_aberto().aggregate(
+        total=soma(),
+        atrasados=soma(Q(data__lt=hoje)),
+        criticos=soma(Q(data__gte=hoje, data__lte=limite_critico)),
+        **{status: soma(Q(status=status)) for status in Processo.STATUS_ABERTOS},
+    )
+
+
+def _carga_secretarias(top_secretarias):
+    carga = list(
+        _estoque_aberto().values('secretaria_id').annotate(total=Sum('vencimentos')).filter(total__gt=0).order_by('-total')[:top_secretarias]
+    )
+    arvore = obter_arvore()
+    return SerieGrafico(
+        labels=[arvore.sigla(item['secretaria_id']) for item in carga],
+        data=[item['total'] for item in carga],
+    )
+
+
+def _processos_criticos(hoje, limite_critico, limite_listas):
+    return list(Processo.objects.filter(
+        status__in=Processo.STATUS_ABERTOS,
+        data_prazo__gte=hoje,
+        data_prazo__lte=limite_critico,
+    ).select_related('servico_solicitado').order_by('data_prazo')[:limite_listas])
+
+
+def _atividade_recente(limite_listas):
+    return list(
+        Processo.objects.select_related('servico_solicitado').order_by('-data_protocolo')[:limite_listas]
+    )
+
+
+def _montar_kpis(hoje, contagens, carga_secretarias, processos_criticos, atividade_recente):
+    # Mantém o formato do gráfico antigo: só status presentes, em ordem alfabética
+    status_presentes = sorted(s for s in Processo.STATUS_ABERTOS if contagens[s])
+    return KPIsDashboard(
+        data_referencia=hoje,
+        total_abertos=contagens['total'],
+        total_atrasados=contagens['atrasados'],
+        total_criticos=contagens['criticos'],
+        por_status=SerieGrafico(labels=status_presentes, data=[contagens[s] for s in status_presentes]),
+        carga_secretarias=carga_secretarias,
+        processos_criticos=processos_criticos,
+        atividade_recente=atividade_recente,
+    )
+
+
+def _consultas_dashboard(hoje, top_secretarias, limite_listas):
+    """As quatro consultas independentes do dashboard, na ordem de _montar_kpis()."""
+    limite_critico = hoje + datetime.timedelta(days=DIAS_CRITICOS)
+    return (
+        # 1. Contagens numa única agregação sobre as métricas consolidadas
+        lambda: _contagens(hoje, limite_critico),
+        # 2. Carga por Secretaria (Top N); a sigla vem da árvore em memória, sem JOIN
+        lambda: _carga_secretarias(top_secretarias),
+        # 3. e 4. Tabelas (select_related evita uma consulta por linha no __str__)
+        lambda: _processos_criticos(hoje, limite_critico, limite_listas),
+        lambda: _atividade_recente(limite_listas),
+    )
+
+
+def calcular_kpis_dashboard(hoje=None, top_secretarias=5, limite_listas=5):
+    """
+    Calcula os KPIs do dashboard com um número fixo de consultas (4), independente do
+    volume de processos. Contagens e carga por secretaria vêm de MetricaDiaria: cada
+    processo em aberto conta um "vencimento" no dia do prazo, então somar os vencimentos
+    por faixa de data dá os abertos, atrasados e críticos sem tocar na tabela de processos.
+    """
+    hoje = hoje or timezone.localdate()
+    consultas = _consultas_dashboard(hoje, top_secretarias, limite_listas)
+    return _montar_kpis(hoje, *(consulta() for consulta in consultas))
+
+
+async def acalcular_kpis_dashboard(hoje=None, top_secretarias=5, limite_listas=5):
+    """calcular_kpis_dashboard() para views assíncronas: as quatro consultas rodam ao mesmo tempo."""
+    hoje = hoje or timezone.localdate()
+    resultados = await paralelo.consultar(*_consultas_dashboard(hoje, top_secretarias, limite_listas))
+    return _montar_kpis(hoje, *resultados)
+
+
+def obter_kpis_dashboard(hoje=None):
+    """KPIs do dashboard serializados, em cache até a próxima alteração de processos (ou a virada do dia)."""
+    hoje = hoje or timezone.localdate()
+    return obter_ou_calcular(
+        NAMESPACE_PROCESSOS, f'kpis_dashboard:{hoje.isoformat()}', lambda: calcular_kpis_dashboard(hoje).as_dict()
+    )
+
+
+# "Manual" é qualquer forma de solicitação que não seja um sistema digital; a regra é
+# aplicada na gravação (core.classificacao) e aqui vira uma igualdade indexada
+FILTRO_MANUAL = Q(canal=CanalAtendimento.MANUAL)
+
+
+def _contagens_servicos():
+    return CartaDeServicos.objects.ativos().aggregate(
+        total=Count('id'),
+        manuais=Count('id', filter=FILTRO_MANUAL),
+    )
+
+
+def _servicos_por_secretaria():
+    arvore = obter_arvore()
+    por_secretaria = CartaDeServicos.objects.ativos().values('secretaria_id').annotate(total=Count('id')).order_by('-total')[:10]
+    return SerieGrafico(
+        labels=[arvore.sigla(s['secretaria_id']) for s in por_secretaria],
+        data=[s['total'] for s in por_secretaria],
+    )
+
+
+def _servicos_por_tipo_sistema():
+    por_tipo_sistema = CartaDeServicos.objects.ativos().exclude(
+        tipo_sistema__isnull=True
+    ).exclude(
+        tipo_sistema__exact=''
+    ).values('tipo_sistema').annotate(total=Count('id')).order_by('tipo_sistema')
+    return SerieGrafico(
+        labels=[t['tipo_sistema'] for t in por_tipo_sistema],
+        data=[t['total'] for t in por_tipo_sistema],
+    )
+
+
+def _servicos_por_sistema_operante():
+    por_sistema_operante = CartaDeServicos.objects.ativos().exclude(FILTRO_MANUAL).values(
+        'sistema'
+    ).annotate(total=Count('id')).order_by('-total')[:10]
+    return SerieGrafico(
+        labels=[s['sistema'] for s in por_sistema_operante],
+        data=[s['total'] for s in por_sistema_operante],
+    )
+
+
+# Consultas independentes da análise, na ordem de _montar_analise()
+CONSULTAS_ANALISE = (
+    _contagens_servicos,             # 1. Total de serviços e de "Não Sistematizados" (Manual)
+    _servicos_por_secretaria,        # 2. Gráfico: por Secretaria (Top 10), siglas da árvore em memória
+    _servicos_por_tipo_sistema,      # 3. Gráfico: Próprio vs. Terceirizado
+    _servicos_por_sistema_operante,  # 4. Gráfico: Sistema Operante (Top 10), apenas os sistemas digitais
+)
+
+
+def _montar_analise(contagens, por_secretaria, por_tipo_sistema, por_sistema_operante):
+    return AnaliseServicos(
+        total_servicos=contagens['total'],
+        total_nao_sistematizados=contagens['manuais'],
+        por_secretaria=por_secretaria,
+        por_tipo_sistema=por_tipo_sistema,
+        por_sistema_operante=por_sistema_operante,
+    )
+
+
+def calcular_analise_servicos():
+    return _montar_analise(*(consulta() for consulta in CONSULTAS_ANALISE))
+
+
+async def acalcular_analise_servicos():
+    return _montar_analise(*await paralelo.consultar(*CONSULTAS_ANALISE))
+
+
+def obter_analise_servicos():
+    """Versão em cache de calcular_analise_servicos(); invalidada por core.signals e pela importação."""
+    return obter_ou_calcular(NAMESPACE_CATALOGO, 'analise_servicos', calcular_analise_servicos)
+
+
+async def aobter_analise_servicos():
+    """obter_analise_servicos() para views assíncronas; na falta do cache, as consultas rodam ao mesmo tempo."""
+    return await aobter_ou_calcular(NAMESPACE_CATALOGO, 'analise_servicos', acalcular_analise_servicos)
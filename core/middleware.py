@@ -0,0 +1,40 @@
+# /var/www/gea/core/middleware.py
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from . import instrumentacao
+
+
+class InstrumentacaoMiddleware:
+    """
+    Mede consultas SQL, tempo de banco, de templates e de Python de cada requisição,
+    devolve o cabeçalho Server-Timing e alimenta os histogramas por view
+    (ver `manage.py metricas_requisicoes`). Opt-in: GEA_INSTRUMENTACAO = True.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'GEA_INSTRUMENTACAO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limite_lento_ms = getattr(settings, 'GEA_INSTRUMENTACAO_LENTO_MS', 500)
+        self.limite_consultas = getattr(settings, 'GEA_INSTRUMENTACAO_MAX_CONSULTAS', 50)
+        self.limite_repeticoes = getattr(settings, 'GEA_INSTRUMENTACAO_MAX_REPETICOES', 10)
+
+    def __call__(self, request):
+        with instrumentacao.medir() as medicao:
+            response = self.get_response(request)
+
+        response['Server-Timing'] = medicao.server_timing()
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'sem_rota'
+        instrumentacao.registrar(view, medicao)
+
+        tempo_ms = medicao.tempo_total * 1000
+        if (tempo_ms > self.limite_lento_ms or medicao.consultas > self.limite_consultas
+                or medicao.maior_repeticao > self.limite_repeticoes):
+            instrumentacao.logger.warning(
+                'Requisição lenta/N+1 em %s (%s): %.0f ms, %d consultas (%.0f ms de banco), SQL mais repetido %d vezes',
+                view, request.path, tempo_ms, medicao.consultas, medicao.tempo_banco * 1000, medicao.maior_repeticao,
+            )
+        return response
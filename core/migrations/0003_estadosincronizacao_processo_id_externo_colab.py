@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_entidade_cartadeservicos_forma_solicitacao_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoSincronizacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fonte', models.CharField(max_length=50, unique=True, verbose_name='Fonte')),
+                ('marca_dagua', models.DateTimeField(blank=True, null=True, verbose_name='Atualizado Até')),
+                ('ultima_execucao', models.DateTimeField(blank=True, null=True, verbose_name='Última Execução')),
+                ('registros_processados', models.PositiveIntegerField(default=0, verbose_name='Registros na Última Execução')),
+            ],
+            options={
+                'verbose_name': 'Estado de Sincronização',
+                'verbose_name_plural': 'Estados de Sincronização',
+            },
+        ),
+        migrations.AddField(
+            model_name='processo',
+            name='id_externo_colab',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='ID Externo (ColabGov)'),
+        ),
+    ]
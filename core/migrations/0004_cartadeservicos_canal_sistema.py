@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+import re
+
+from django.db import migrations, models
+
+# Regras de core.classificacao como eram nesta migração: copiadas para que mudanças futuras
+# nas regras (ou no módulo) não alterem o que uma migração já aplicada faz
+TERMOS_MANUAIS = ('presencial', 'telefone', 'whatsapp', 'e-mail')
+TIPOS_PROPRIOS = {'próprio', 'proprio'}
+ALIASES_SISTEMA = {
+    '1 doc': '1Doc',
+    '1doc': '1Doc',
+    'colab': 'Colab',
+    'colab gov': 'Colab',
+    'colabgov': 'Colab',
+}
+
+
+def classificar_servico(forma_solicitacao, tipo_sistema):
+    forma = (forma_solicitacao or '').strip().casefold()
+    if not forma or any(termo in forma for termo in TERMOS_MANUAIS):
+        return 'MANUAL', ''
+    nome = re.sub(r'\s+', ' ', (forma_solicitacao or '').strip())
+    sistema = ALIASES_SISTEMA.get(nome.casefold(), nome)
+    if (tipo_sistema or '').strip().casefold() in TIPOS_PROPRIOS:
+        return 'DIGITAL_PROPRIO', sistema
+    return 'DIGITAL_TERCEIRO', sistema
+
+
+def classificar_servicos(apps, schema_editor):
+    CartaDeServicos = apps.get_model('core', 'CartaDeServicos')
+    servicos = list(CartaDeServicos.objects.only('id', 'forma_solicitacao', 'tipo_sistema'))
+    for servico in servicos:
+        servico.canal, servico.sistema = classificar_servico(servico.forma_solicitacao, servico.tipo_sistema)
+    CartaDeServicos.objects.bulk_update(servicos, ['canal', 'sistema'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_estadosincronizacao_processo_id_externo_colab'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='canal',
+            field=models.CharField(choices=[('MANUAL', 'Manual (não sistematizado)'), ('DIGITAL_PROPRIO', 'Digital - Sistema Próprio'), ('DIGITAL_TERCEIRO', 'Digital - Sistema de Terceiros')], db_index=True, default='MANUAL', max_length=20, verbose_name='Canal'),
+        ),
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='sistema',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=100, verbose_name='Sistema (nome canônico)'),
+        ),
+        migrations.RunPython(classificar_servicos, migrations.RunPython.noop),
+    ]
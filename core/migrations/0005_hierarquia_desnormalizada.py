@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_hierarquia(apps, schema_editor):
+    Divisao = apps.get_model('core', 'Divisao')
+    CartaDeServicos = apps.get_model('core', 'CartaDeServicos')
+    Processo = apps.get_model('core', 'Processo')
+
+    divisao = Divisao.objects.filter(pk=OuterRef('divisao_responsavel_id'))
+    CartaDeServicos.objects.update(
+        departamento_id=Subquery(divisao.values('departamento_id')[:1]),
+        secretaria_id=Subquery(divisao.values('departamento__secretaria_id')[:1]),
+    )
+    Processo.objects.update(
+        secretaria_id=Subquery(
+            CartaDeServicos.objects.filter(pk=OuterRef('servico_solicitado_id')).values('secretaria_id')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_cartadeservicos_canal_sistema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='departamento',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.departamento', verbose_name='Departamento'),
+        ),
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='secretaria',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.secretaria', verbose_name='Secretaria'),
+        ),
+        migrations.AddField(
+            model_name='processo',
+            name='secretaria',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.secretaria', verbose_name='Secretaria'),
+        ),
+        migrations.RunPython(preencher_hierarquia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:44
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não trava escritas em processo, mas não roda dentro de transação
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_hierarquia_desnormalizada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='processo',
+            index=models.Index(condition=models.Q(('status__in', ('ABERTO', 'EM_ANALISE', 'PENDENTE'))), fields=['data_prazo'], include=('status',), name='processo_aberto_prazo_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='processo',
+            index=models.Index(condition=models.Q(('status__in', ('ABERTO', 'EM_ANALISE', 'PENDENTE'))), fields=['secretaria', 'data_prazo'], name='processo_aberto_sec_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='processo',
+            index=models.Index(fields=['status', 'data_prazo'], name='processo_status_prazo_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='processo',
+            index=models.Index(fields=['-data_protocolo'], name='processo_data_protocolo_idx'),
+        ),
+    ]
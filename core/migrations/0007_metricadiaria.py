@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Status em aberto quando esta migração foi escrita (congelados aqui, como o SQL abaixo)
+STATUS_ABERTOS = ['ABERTO', 'EM_ANALISE', 'PENDENTE']
+
+
+def consolidar_processos(apps, schema_editor):
+    # Uma passada pela tabela de processos: fluxos (protocolo, conclusão, vencimento) e a
+    # fotografia do estoque de hoje. SQL próprio da migração, independente de core.consolidacao.
+    from django.conf import settings
+    from django.utils import timezone
+
+    metricas = apps.get_model('core', 'MetricaDiaria')._meta.db_table
+    processos = apps.get_model('core', 'Processo')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {metricas} (data, servico_id, secretaria_id, status, abertos, concluidos,
+                                    soma_dias_resolucao, vencimentos, em_aberto_fim_dia, atrasados_fim_dia)
+            SELECT data, servico_id, MAX(secretaria_id), status,
+                   SUM(abertos), SUM(concluidos), SUM(soma_dias_resolucao), SUM(vencimentos), 0, 0
+            FROM (
+                SELECT (data_protocolo AT TIME ZONE %(fuso)s)::date AS data, servico_solicitado_id AS servico_id,
+                       secretaria_id, status, 1 AS abertos, 0 AS concluidos, 0 AS soma_dias_resolucao, 0 AS vencimentos
+                FROM {processos}
+                UNION ALL
+                SELECT (data_conclusao AT TIME ZONE %(fuso)s)::date, servico_solicitado_id, secretaria_id, status,
+                       0, 1, EXTRACT(DAY FROM data_conclusao - data_protocolo)::int, 0
+                FROM {processos} WHERE status = 'CONCLUIDO' AND data_conclusao IS NOT NULL
+                UNION ALL
+                SELECT data_prazo, servico_solicitado_id, secretaria_id, status, 0, 0, 0, 1
+                FROM {processos} WHERE status = ANY(%(abertos)s)
+            ) contribuicoes
+            GROUP BY data, servico_id, status
+        """, {'fuso': settings.TIME_ZONE, 'abertos': STATUS_ABERTOS})
+        cursor.execute(f"""
+            INSERT INTO {metricas} (data, servico_id, secretaria_id, status, abertos, concluidos,
+                                    soma_dias_resolucao, vencimentos, em_aberto_fim_dia, atrasados_fim_dia)
+            SELECT %(data)s, servico_solicitado_id, MAX(secretaria_id), status, 0, 0, 0, 0,
+                   COUNT(*), COUNT(*) FILTER (WHERE data_prazo < %(data)s)
+            FROM {processos}
+            WHERE status = ANY(%(abertos)s)
+            GROUP BY servico_solicitado_id, status
+            ON CONFLICT (data, servico_id, status) DO UPDATE SET
+                em_aberto_fim_dia = EXCLUDED.em_aberto_fim_dia,
+                atrasados_fim_dia = EXCLUDED.atrasados_fim_dia
+        """, {'data': timezone.localdate(), 'abertos': STATUS_ABERTOS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_indices_processo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('status', models.CharField(choices=[('ABERTO', 'Aberto'), ('EM_ANALISE', 'Em Análise'), ('PENDENTE', 'Pendente de Informação'), ('CONCLUIDO', 'Concluído'), ('CANCELADO', 'Cancelado')], max_length=20, verbose_name='Status')),
+                ('abertos', models.IntegerField(default=0, verbose_name='Protocolados no Dia')),
+                ('concluidos', models.IntegerField(default=0, verbose_name='Concluídos no Dia')),
+                ('soma_dias_resolucao', models.BigIntegerField(default=0, verbose_name='Soma dos Dias até a Conclusão')),
+                ('vencimentos', models.IntegerField(default=0, verbose_name='Em Aberto com Prazo no Dia')),
+                ('em_aberto_fim_dia', models.IntegerField(default=0, verbose_name='Em Aberto no Fim do Dia')),
+                ('atrasados_fim_dia', models.IntegerField(default=0, verbose_name='Atrasados no Fim do Dia')),
+                ('secretaria', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='core.secretaria', verbose_name='Secretaria')),
+                ('servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.cartadeservicos', verbose_name='Serviço')),
+            ],
+            options={
+                'verbose_name': 'Métrica Diária',
+                'verbose_name_plural': 'Métricas Diárias',
+                'indexes': [models.Index(fields=['secretaria', 'data'], name='metrica_secretaria_data_idx')],
+                'constraints': [models.UniqueConstraint(fields=('data', 'servico', 'status'), name='metrica_diaria_unica')],
+            },
+        ),
+        migrations.RunPython(consolidar_processos, migrations.RunPython.noop),
+    ]
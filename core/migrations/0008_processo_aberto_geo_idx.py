@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:10
+
+from django.contrib.postgres.indexes import GistIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não trava escritas em processo, mas não roda dentro de transação
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_metricadiaria'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='processo',
+            index=GistIndex(condition=models.Q(('status__in', ('ABERTO', 'EM_ANALISE', 'PENDENTE'))), fields=['localizacao'], name='processo_aberto_geo_idx'),
+        ),
+    ]
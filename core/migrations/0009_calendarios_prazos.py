@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_processo_aberto_geo_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Calendario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, unique=True, verbose_name='Nome do Calendário')),
+                ('contagem', models.CharField(choices=[('UTEIS', 'Dias úteis'), ('CORRIDOS', 'Dias corridos (vencimento em dia não útil vai para o próximo dia útil)')], default='UTEIS', max_length=10, verbose_name='Contagem de Prazos')),
+            ],
+            options={
+                'verbose_name': 'Calendário',
+                'verbose_name_plural': 'Calendários',
+            },
+        ),
+        migrations.AlterField(
+            model_name='cartadeservicos',
+            name='prazo_maximo_dias',
+            field=models.PositiveIntegerField(default=30, help_text='Prazo máximo em dias (úteis ou corridos, conforme o calendário da secretaria ou entidade).'),
+        ),
+        migrations.AddField(
+            model_name='entidade',
+            name='calendario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.calendario', verbose_name='Calendário de Prazos'),
+        ),
+        migrations.AddField(
+            model_name='secretaria',
+            name='calendario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.calendario', verbose_name='Calendário de Prazos'),
+        ),
+        migrations.CreateModel(
+            name='Feriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('descricao', models.CharField(blank=True, max_length=100, verbose_name='Descrição')),
+                ('calendario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feriados', to='core.calendario', verbose_name='Calendário')),
+            ],
+            options={
+                'verbose_name': 'Feriado',
+                'verbose_name_plural': 'Feriados',
+                'ordering': ['data'],
+                'constraints': [models.UniqueConstraint(fields=('calendario', 'data'), name='feriado_unico_por_calendario')],
+            },
+        ),
+    ]
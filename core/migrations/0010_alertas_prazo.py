@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def situacao_inicial(apps, schema_editor):
+    # Situação atual sem registrar transições: o primeiro verificar_prazos não dispara
+    # avisos de tudo o que já estava atrasado antes da implantação
+    import datetime
+    from django.utils import timezone
+
+    Processo = apps.get_model('core', 'Processo')
+    hoje = timezone.localdate()
+    limite = hoje + datetime.timedelta(days=getattr(settings, 'GEA_ALERTA_ANTECEDENCIA_DIAS', 3))
+    abertos = Processo.objects.filter(status__in=('ABERTO', 'EM_ANALISE', 'PENDENTE'))
+    abertos.filter(data_prazo__lt=hoje).update(situacao_prazo='ATRASADO')
+    abertos.filter(data_prazo__gte=hoje, data_prazo__lte=limite).update(situacao_prazo='PROXIMO')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_calendarios_prazos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicaoPrazo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('situacao_anterior', models.CharField(choices=[('NO_PRAZO', 'No prazo'), ('PROXIMO', 'Próximo do vencimento'), ('ATRASADO', 'Atrasado')], max_length=10, verbose_name='De')),
+                ('situacao_nova', models.CharField(choices=[('NO_PRAZO', 'No prazo'), ('PROXIMO', 'Próximo do vencimento'), ('ATRASADO', 'Atrasado')], max_length=10, verbose_name='Para')),
+                ('data', models.DateField(verbose_name='Data de Referência')),
+                ('registrada_em', models.DateTimeField(auto_now_add=True, verbose_name='Registrada em')),
+                ('notificada_em', models.DateTimeField(blank=True, null=True, verbose_name='Aviso Enviado em')),
+            ],
+            options={
+                'verbose_name': 'Transição de Prazo',
+                'verbose_name_plural': 'Transições de Prazo',
+            },
+        ),
+        migrations.AddField(
+            model_name='processo',
+            name='situacao_prazo',
+            field=models.CharField(choices=[('NO_PRAZO', 'No prazo'), ('PROXIMO', 'Próximo do vencimento'), ('ATRASADO', 'Atrasado')], default='NO_PRAZO', editable=False, max_length=10, verbose_name='Situação do Prazo'),
+        ),
+        migrations.RunPython(situacao_inicial, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='transicaoprazo',
+            name='processo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transicoes_prazo', to='core.processo', verbose_name='Processo'),
+        ),
+        migrations.AddField(
+            model_name='transicaoprazo',
+            name='responsavel',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Responsável a Avisar'),
+        ),
+        migrations.AddIndex(
+            model_name='transicaoprazo',
+            index=models.Index(condition=models.Q(('notificada_em__isnull', True)), fields=['responsavel'], name='transicao_aviso_pendente_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transicaoprazo',
+            constraint=models.UniqueConstraint(fields=('processo', 'situacao_nova', 'data'), name='transicao_prazo_unica_no_dia'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não trava escritas em processo, mas não roda dentro de transação
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_alertas_prazo'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='processo',
+            index=models.Index(condition=models.Q(('status__in', ('ABERTO', 'EM_ANALISE', 'PENDENTE'))), fields=['situacao_prazo', 'data_prazo'], name='processo_situacao_prazo_idx'),
+        ),
+    ]
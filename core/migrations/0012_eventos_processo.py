@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:13
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# ProcessoEvento particionada por mês (RANGE em registrado_em). A chave primária de uma tabela
+# particionada precisa conter a coluna de partição: (id, registrado_em) no banco, id no Django.
+CRIAR_TABELA_EVENTOS = """
+CREATE TABLE core_processoevento (
+    id bigserial NOT NULL,
+    registrado_em timestamp with time zone NOT NULL,
+    processo_id bigint NOT NULL,
+    secretaria_id bigint NULL,
+    origem varchar(10) NOT NULL,
+    status_anterior varchar(20) NULL,
+    status varchar(20) NOT NULL,
+    status_desde timestamp with time zone NULL,
+    responsavel_anterior_id integer NULL,
+    responsavel_id integer NULL,
+    data_conclusao timestamp with time zone NULL,
+    PRIMARY KEY (id, registrado_em)
+) PARTITION BY RANGE (registrado_em);
+CREATE TABLE core_processoevento_padrao PARTITION OF core_processoevento DEFAULT;
+CREATE INDEX evento_processo_idx ON core_processoevento (processo_id, registrado_em);
+CREATE INDEX evento_saida_status_idx ON core_processoevento (status_anterior, registrado_em);
+"""
+
+
+def status_desde_inicial(apps, schema_editor):
+    # Sem histórico: concluídos desde a conclusão, os demais desde o protocolo (limite inferior)
+    from django.db.models import Case, F, When
+
+    Processo = apps.get_model('core', 'Processo')
+    Processo.objects.update(status_desde=Case(
+        When(status='CONCLUIDO', data_conclusao__isnull=False, then=F('data_conclusao')),
+        default=F('data_protocolo'),
+    ))
+
+
+def particoes_iniciais(apps, schema_editor):
+    # Mês atual e os três seguintes (a tabela acabou de ser criada: a padrão está vazia)
+    from django.utils import timezone
+
+    mes = timezone.localdate().replace(day=1)
+    with schema_editor.connection.cursor() as cursor:
+        for _ in range(4):
+            seguinte = (mes.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS core_processoevento_{mes:%Y%m} PARTITION OF core_processoevento "
+                f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{seguinte.isoformat()}')"
+            )
+            mes = seguinte
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_processo_situacao_prazo_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processo',
+            name='status_desde',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='No Status Atual desde'),
+        ),
+        migrations.RunPython(status_desde_inicial, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CRIAR_TABELA_EVENTOS, "DROP TABLE core_processoevento"),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='ProcessoEvento',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('registrado_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Registrado em')),
+                        ('origem', models.CharField(choices=[('EDICAO', 'Edição (save)'), ('LOTE', 'Alteração em lote'), ('IMPORTACAO', 'Importação')], max_length=10, verbose_name='Origem')),
+                        ('status_anterior', models.CharField(blank=True, choices=[('ABERTO', 'Aberto'), ('EM_ANALISE', 'Em Análise'), ('PENDENTE', 'Pendente de Informação'), ('CONCLUIDO', 'Concluído'), ('CANCELADO', 'Cancelado')], max_length=20, null=True, verbose_name='Status Anterior')),
+                        ('status', models.CharField(choices=[('ABERTO', 'Aberto'), ('EM_ANALISE', 'Em Análise'), ('PENDENTE', 'Pendente de Informação'), ('CONCLUIDO', 'Concluído'), ('CANCELADO', 'Cancelado')], max_length=20, verbose_name='Status')),
+                        ('status_desde', models.DateTimeField(blank=True, null=True, verbose_name='Status Anterior desde')),
+                        ('data_conclusao', models.DateTimeField(blank=True, null=True, verbose_name='Data de Conclusão')),
+                        ('processo', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='eventos', to='core.processo', verbose_name='Processo')),
+                        ('responsavel', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Responsável')),
+                        ('responsavel_anterior', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Responsável Anterior')),
+                        ('secretaria', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.secretaria', verbose_name='Secretaria')),
+                    ],
+                    options={
+                        'verbose_name': 'Evento de Processo',
+                        'verbose_name_plural': 'Eventos de Processos',
+                        'indexes': [models.Index(fields=['processo', 'registrado_em'], name='evento_processo_idx'), models.Index(fields=['status_anterior', 'registrado_em'], name='evento_saida_status_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(particoes_iniciais, migrations.RunPython.noop),
+    ]
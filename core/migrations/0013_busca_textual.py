@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations, models
+
+# Português com radicais e sem acentos: "Árvore", "arvores" e "árvore" viram o mesmo lexema
+CRIAR_CONFIGURACAO = """
+CREATE TEXT SEARCH CONFIGURATION portugues_sem_acento (COPY = portuguese);
+ALTER TEXT SEARCH CONFIGURATION portugues_sem_acento
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_eventos_processo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        TrigramExtension(),
+        migrations.RunSQL(CRIAR_CONFIGURACAO, "DROP TEXT SEARCH CONFIGURATION portugues_sem_acento"),
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='busca',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nome_servico', config='portugues_sem_acento', weight='A'), '||', django.contrib.postgres.search.SearchVector('orgao_responsavel', config='portugues_sem_acento', weight='B'), django.contrib.postgres.search.SearchConfig('portugues_sem_acento')), '||', django.contrib.postgres.search.SearchVector('descricao', config='portugues_sem_acento', weight='C'), django.contrib.postgres.search.SearchConfig('portugues_sem_acento')), output_field=django.contrib.postgres.search.SearchVectorField(), verbose_name='Vetor de Busca'),
+        ),
+        # Coluna gerada (STORED): o ADD COLUMN reescreve a tabela de processos
+        migrations.AddField(
+            model_name='processo',
+            name='busca',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('numero_protocolo', config='portugues_sem_acento', weight='A'), '||', django.contrib.postgres.search.SearchVector('solicitante', config='portugues_sem_acento', weight='B'), django.contrib.postgres.search.SearchConfig('portugues_sem_acento')), '||', django.contrib.postgres.search.SearchVector('detalhes_solicitacao', config='portugues_sem_acento', weight='C'), django.contrib.postgres.search.SearchConfig('portugues_sem_acento')), output_field=django.contrib.postgres.search.SearchVectorField(), verbose_name='Vetor de Busca'),
+        ),
+        migrations.AddIndex(
+            model_name='cartadeservicos',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busca'], name='servico_busca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cartadeservicos',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nome_servico'], name='servico_nome_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
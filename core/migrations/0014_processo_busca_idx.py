@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:18
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não trava escritas em processo, mas não roda dentro de transação
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_busca_textual'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='processo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busca'], name='processo_busca_idx'),
+        ),
+    ]
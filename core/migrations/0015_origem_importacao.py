@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_processo_busca_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='arquivo_origem',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Arquivo de Origem'),
+        ),
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='hash_importacao',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Hash da Importação'),
+        ),
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='linha_origem',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Linha de Origem'),
+        ),
+        migrations.AddField(
+            model_name='cartadeservicos',
+            name='removido_em',
+            field=models.DateTimeField(blank=True, help_text='Preenchido quando o serviço some do arquivo de origem.', null=True, verbose_name='Removido da Carta em'),
+        ),
+    ]
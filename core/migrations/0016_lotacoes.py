@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_origem_importacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lotacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recebe_distribuicao', models.BooleanField(default=True, verbose_name='Recebe Distribuição Automática')),
+            ],
+            options={
+                'verbose_name': 'Lotação',
+                'verbose_name_plural': 'Lotações',
+            },
+        ),
+        migrations.AddField(
+            model_name='lotacao',
+            name='divisao',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotacoes', to='core.divisao', verbose_name='Divisão'),
+        ),
+        migrations.AddField(
+            model_name='lotacao',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotacoes', to=settings.AUTH_USER_MODEL, verbose_name='Servidor'),
+        ),
+        migrations.AddConstraint(
+            model_name='lotacao',
+            constraint=models.UniqueConstraint(fields=('usuario', 'divisao'), name='lotacao_unica'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:25
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não trava escritas em processo, mas não roda dentro de transação
+    atomic = False
+
+    dependencies = [
+        ('core', '0016_lotacoes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='processo',
+            index=models.Index(condition=models.Q(('status__in', ('ABERTO', 'EM_ANALISE', 'PENDENTE'))), fields=['responsavel_atual', 'situacao_prazo'], name='processo_aberto_resp_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_processo_aberto_resp_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadosincronizacao',
+            name='ultimo_erro',
+            field=models.TextField(blank=True, default='', verbose_name='Erro da Última Execução'),
+        ),
+    ]
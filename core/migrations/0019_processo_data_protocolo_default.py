@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # auto_now_add -> default: a importação do ColabGov passa a gravar a data de criação na origem
+
+    dependencies = [
+        ('core', '0018_estadosincronizacao_ultimo_erro'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processo',
+            name='data_protocolo',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Data do Protocolo'),
+        ),
+    ]
@@ -1,13 +1,60 @@
 # /var/www/gea/core/models.py
 
-import datetime
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.contrib.gis.db import models as gis_models
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.utils import timezone
+
+# Configuração de busca textual (core.busca): português com unaccent, criada na migração 0013
+CONFIGURACAO_BUSCA = 'portugues_sem_acento'
+
+
+def vetor_busca(*campos_e_pesos):
+    """SearchVector ponderado dos campos, para as colunas `busca` mantidas pelo banco."""
+    vetores = [SearchVector(campo, weight=peso, config=CONFIGURACAO_BUSCA) for campo, peso in campos_e_pesos]
+    vetor = vetores[0]
+    for outro in vetores[1:]:
+        vetor = vetor + outro
+    return vetor
+
+
+# --- Calendários de Prazos (usados por core.prazos) ---
+class Calendario(models.Model):
+    class Contagem(models.TextChoices):
+        UTEIS = 'UTEIS', 'Dias úteis'
+        CORRIDOS = 'CORRIDOS', 'Dias corridos (vencimento em dia não útil vai para o próximo dia útil)'
+
+    nome = models.CharField(max_length=100, unique=True, verbose_name="Nome do Calendário")
+    contagem = models.CharField(max_length=10, choices=Contagem.choices, default=Contagem.UTEIS, verbose_name="Contagem de Prazos")
+
+    def __str__(self):
+        return self.nome
+    class Meta:
+        verbose_name = "Calendário"
+        verbose_name_plural = "Calendários"
+
+class Feriado(models.Model):
+    calendario = models.ForeignKey(Calendario, on_delete=models.CASCADE, related_name='feriados', verbose_name="Calendário")
+    data = models.DateField(verbose_name="Data")
+    descricao = models.CharField(max_length=100, blank=True, verbose_name="Descrição")
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} {self.descricao}".strip()
+    class Meta:
+        verbose_name = "Feriado"
+        verbose_name_plural = "Feriados"
+        ordering = ['data']
+        constraints = [
+            models.UniqueConstraint(fields=['calendario', 'data'], name='feriado_unico_por_calendario'),
+        ]
 
 # --- NOVA TABELA (Conforme sua sugestão) ---
 class Entidade(models.Model):
     nome = models.CharField(max_length=100, unique=True, verbose_name="Nome da Entidade")
+    # Sem calendário (aqui e na secretaria), prazos contam em dias corridos
+    calendario = models.ForeignKey(Calendario, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Calendário de Prazos")
 
     def __str__(self):
         return self.nome
@@ -19,6 +66,8 @@ class Entidade(models.Model):
 class Secretaria(models.Model):
     nome = models.CharField(max_length=200, unique=True, verbose_name="Nome da Secretaria")
     sigla = models.CharField(max_length=20, unique=True, verbose_name="Sigla")
+    # Tem precedência sobre o calendário da entidade do serviço
+    calendario = models.ForeignKey(Calendario, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Calendário de Prazos")
     def __str__(self): return f"{self.nome} ({self.sigla})"
     class Meta:
         verbose_name = "Secretaria"
@@ -40,12 +89,37 @@ class Divisao(models.Model):
         verbose_name = "Divisão"
         verbose_name_plural = "Divisões"
 
+class Lotacao(models.Model):
+    """Servidor lotado numa divisão: candidato a responsável pelos processos dos serviços dela (core.distribuicao)."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lotacoes', verbose_name="Servidor")
+    divisao = models.ForeignKey(Divisao, on_delete=models.CASCADE, related_name='lotacoes', verbose_name="Divisão")
+    recebe_distribuicao = models.BooleanField(default=True, verbose_name="Recebe Distribuição Automática")
+    def __str__(self): return f"{self.usuario} - {self.divisao}"
+    class Meta:
+        verbose_name = "Lotação"
+        verbose_name_plural = "Lotações"
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'divisao'], name='lotacao_unica'),
+        ]
+
 # --- Catálogo de Serviços (MODELO REVISADO) ---
+class CanalAtendimento(models.TextChoices):
+    MANUAL = 'MANUAL', 'Manual (não sistematizado)'
+    DIGITAL_PROPRIO = 'DIGITAL_PROPRIO', 'Digital - Sistema Próprio'
+    DIGITAL_TERCEIRO = 'DIGITAL_TERCEIRO', 'Digital - Sistema de Terceiros'
+
+
+class CartaDeServicosQuerySet(models.QuerySet):
+    def ativos(self):
+        """Serviços ainda presentes na Carta (sem os removidos por import_carta_completa --remover-ausentes)."""
+        return self.filter(removido_em__isnull=True)
+
+
 class CartaDeServicos(models.Model):
     divisao_responsavel = models.ForeignKey(Divisao, on_delete=models.PROTECT, verbose_name="Divisão Responsável")
     nome_servico = models.CharField(max_length=255, verbose_name="Nome do Serviço")
     descricao = models.TextField(verbose_name="Descrição", blank=True, null=True)
-    prazo_maximo_dias = models.PositiveIntegerField(help_text="Prazo máximo em dias corridos.", default=30)
+    prazo_maximo_dias = models.PositiveIntegerField(help_text="Prazo máximo em dias (úteis ou corridos, conforme o calendário da secretaria ou entidade).", default=30)
     
     # --- NOVOS CAMPOS (DA SUA PLANILHA) ---
     orgao_responsavel = models.CharField(max_length=200, blank=True, null=True, verbose_name="Órgão (ex: Procon)")
@@ -59,14 +133,107 @@ class CartaDeServicos(models.Model):
     forma_solicitacao = models.CharField(max_length=100, blank=True, null=True, verbose_name="Sistema de Origem")
     tipo_sistema = models.CharField(max_length=100, blank=True, null=True, verbose_name="Tipo do Sistema (Próprio, Terceirizado)")
 
+    # --- CLASSIFICAÇÃO MATERIALIZADA (calculada a partir de forma_solicitacao/tipo_sistema) ---
+    canal = models.CharField(max_length=20, choices=CanalAtendimento.choices, default=CanalAtendimento.MANUAL, db_index=True, verbose_name="Canal")
+    sistema = models.CharField(max_length=100, blank=True, default='', db_index=True, verbose_name="Sistema (nome canônico)")
+
+    # --- HIERARQUIA DESNORMALIZADA (cópia de divisao_responsavel -> departamento -> secretaria) ---
+    departamento = models.ForeignKey(Departamento, on_delete=models.PROTECT, null=True, editable=False, verbose_name="Departamento")
+    secretaria = models.ForeignKey(Secretaria, on_delete=models.PROTECT, null=True, editable=False, verbose_name="Secretaria")
+
+    # Vetor de busca textual (core.busca), recalculado pelo próprio banco a cada INSERT/UPDATE
+    busca = models.GeneratedField(
+        expression=vetor_busca(('nome_servico', 'A'), ('orgao_responsavel', 'B'), ('descricao', 'C')),
+        output_field=SearchVectorField(), db_persist=True, verbose_name="Vetor de Busca",
+    )
+
+    # --- ORIGEM NA IMPORTAÇÃO (core.importacao) ---
+    # Hash dos campos importados: a reimportação só compara campo a campo quando ele muda
+    hash_importacao = models.CharField(max_length=64, blank=True, default='', editable=False, verbose_name="Hash da Importação")
+    arquivo_origem = models.CharField(max_length=255, blank=True, default='', editable=False, verbose_name="Arquivo de Origem")
+    linha_origem = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Linha de Origem")
+    removido_em = models.DateTimeField(null=True, blank=True, verbose_name="Removido da Carta em", help_text="Preenchido quando o serviço some do arquivo de origem.")
+
+    objects = CartaDeServicosQuerySet.as_manager()
+
+    def classificar(self):
+        from .classificacao import classificar_servico
+        self.canal, self.sistema = classificar_servico(self.forma_solicitacao, self.tipo_sistema)
+
+    def sincronizar_hierarquia(self):
+        if self.divisao_responsavel_id is None:
+            self.departamento_id = self.secretaria_id = None
+            return
+        self.departamento_id, self.secretaria_id = Divisao.objects.filter(
+            pk=self.divisao_responsavel_id
+        ).values_list('departamento_id', 'departamento__secretaria_id').get()
+
+    def save(self, *args, **kwargs):
+        self.classificar()
+        self.sincronizar_hierarquia()
+        # Editado fora da importação: o hash não vale mais, a próxima compara campo a campo
+        self.hash_importacao = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'hash_importacao'}
+            if {'forma_solicitacao', 'tipo_sistema'} & update_fields:
+                update_fields |= {'canal', 'sistema'}
+            if 'divisao_responsavel' in update_fields:
+                update_fields |= {'departamento', 'secretaria'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.nome_servico
     class Meta:
         verbose_name = "Serviço da Carta"
         verbose_name_plural = "Carta de Serviços"
+        indexes = [
+            GinIndex(fields=['busca'], name='servico_busca_idx'),
+            # Fallback para erros de digitação (similaridade de trigramas, pg_trgm)
+            GinIndex(fields=['nome_servico'], opclasses=['gin_trgm_ops'], name='servico_nome_trgm_idx'),
+        ]
 
 
 # --- Processos (Permanece Igual) ---
+# Status considerados "em aberto" por dashboards e relatórios (e pelos índices parciais)
+STATUS_ABERTOS = ('ABERTO', 'EM_ANALISE', 'PENDENTE')
+
+
+class SituacaoPrazo(models.TextChoices):
+    NO_PRAZO = 'NO_PRAZO', 'No prazo'
+    PROXIMO = 'PROXIMO', 'Próximo do vencimento'
+    ATRASADO = 'ATRASADO', 'Atrasado'
+
+
+class ProcessoQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Mudanças de status/datas/serviço em lote também ajustam as métricas diárias (MetricaDiaria)
+        from .consolidacao import CAMPOS_METRICAS, atualizando_metricas, metricas_em_atualizacao
+        if CAMPOS_METRICAS.isdisjoint(kwargs) or metricas_em_atualizacao():
+            return self._atualizar(kwargs)
+        # Por chave, como em atualizar_registrando: o filtro original pode depender do campo alterado
+        pks = list(self.values_list('pk', flat=True))
+        if not pks:
+            return 0
+        processos = Processo.objects.filter(pk__in=pks)
+        with atualizando_metricas(processos):
+            return processos._atualizar(kwargs)
+
+    def _atualizar(self, valores):
+        # Mudanças de status/responsável em lote também entram no histórico (ProcessoEvento)
+        from .eventos import CAMPOS_RASTREADOS, atualizar_registrando
+        if CAMPOS_RASTREADOS.isdisjoint(valores):
+            return super().update(**valores)
+        return atualizar_registrando(self, valores)
+
+
+class ProcessoManager(models.Manager.from_queryset(ProcessoQuerySet)):
+    def get_queryset(self):
+        # O vetor de busca só serve ao WHERE: não trafega nas leituras comuns
+        return super().get_queryset().defer('busca')
+
+
 class Processo(models.Model):
     STATUS_CHOICES = [
         ('ABERTO', 'Aberto'),
@@ -75,11 +242,13 @@ class Processo(models.Model):
         ('CONCLUIDO', 'Concluído'),
         ('CANCELADO', 'Cancelado'),
     ]
+    STATUS_ABERTOS = STATUS_ABERTOS
     
     servico_solicitado = models.ForeignKey(CartaDeServicos, on_delete=models.PROTECT, verbose_name="Serviço Solicitado")
     numero_protocolo = models.CharField(max_length=50, unique=True, blank=True, null=True, verbose_name="Número do Protocolo")
     solicitante = models.CharField(max_length=255, verbose_name="Solicitante")
-    data_protocolo = models.DateTimeField(auto_now_add=True, verbose_name="Data do Protocolo")
+    # Base do prazo (core.prazos); a importação do ColabGov grava a data de criação na origem
+    data_protocolo = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Data do Protocolo")
     data_prazo = models.DateField(verbose_name="Prazo Final")
     data_conclusao = models.DateTimeField(verbose_name="Data de Conclusão", null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ABERTO', verbose_name="Status")
@@ -88,14 +257,192 @@ class Processo(models.Model):
     
     localizacao = gis_models.PointField(null=True, blank=True, verbose_name="Localização Geográfica")
 
+    # Chave do registro na origem (ColabGov), usada no upsert em lote da importação
+    id_externo_colab = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="ID Externo (ColabGov)")
+
+    # Cópia de servico_solicitado.secretaria: agrupamentos por secretaria sem a cadeia de 4 joins
+    secretaria = models.ForeignKey(Secretaria, on_delete=models.PROTECT, null=True, editable=False, verbose_name="Secretaria")
+
+    # Última situação do prazo registrada por core.alertas (só muda junto com uma TransicaoPrazo)
+    situacao_prazo = models.CharField(max_length=10, choices=SituacaoPrazo.choices, default=SituacaoPrazo.NO_PRAZO, editable=False, verbose_name="Situação do Prazo")
+
+    # Início do status atual (core.eventos): cada ProcessoEvento guarda quanto tempo o status anterior durou
+    status_desde = models.DateTimeField(default=timezone.now, editable=False, verbose_name="No Status Atual desde")
+
+    # Vetor de busca textual (core.busca), recalculado pelo próprio banco a cada INSERT/UPDATE
+    busca = models.GeneratedField(
+        expression=vetor_busca(('numero_protocolo', 'A'), ('solicitante', 'B'), ('detalhes_solicitacao', 'C')),
+        output_field=SearchVectorField(), db_persist=True, verbose_name="Vetor de Busca",
+    )
+
+    objects = ProcessoManager()
+
     def save(self, *args, **kwargs):
+        # As métricas são retiradas no pre_save e somadas no post_save: tudo ou nada com a linha
+        with transaction.atomic():
+            self._gravar(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+    def _gravar(self, *args, **kwargs):
+        from .eventos import CAMPOS_RASTREADOS, estado_gravado, registrar_edicao
         if not self.pk and self.servico_solicitado:
-            self.data_prazo = datetime.date.today() + datetime.timedelta(days=self.servico_solicitado.prazo_maximo_dias)
+            from .prazos import obter_motor
+            self.data_prazo = obter_motor().prazo_do_servico(self.servico_solicitado, timezone.localdate(self.data_protocolo))
+        if self.servico_solicitado_id:
+            self.secretaria_id = self.servico_solicitado.secretaria_id
+        update_fields = kwargs.get('update_fields')
+        rastrear = update_fields is None or not CAMPOS_RASTREADOS.isdisjoint(update_fields)
+        anterior = estado_gravado(self.pk) if rastrear and not self._state.adding else None
+        if anterior is not None and anterior.status != self.status:
+            self.status_desde = timezone.now()
+        if update_fields is not None:
+            if 'servico_solicitado' in update_fields:
+                update_fields = set(update_fields) | {'secretaria'}
+            if 'status' in update_fields:
+                update_fields = set(update_fields) | {'status_desde'}
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
+        if rastrear:
+            registrar_edicao(self, anterior)
 
     def __str__(self):
         return f"{self.numero_protocolo or 'Novo Processo'} - {self.servico_solicitado.nome_servico}"
 
     class Meta:
         verbose_name = "Processo"
-        verbose_name_plural = "Processos"
\ No newline at end of file
+        verbose_name_plural = "Processos"
+        indexes = [
+            # Parciais (só abertos): atrasados, críticos e carga por secretaria do dashboard
+            models.Index(fields=['data_prazo'], include=['status'], condition=models.Q(status__in=STATUS_ABERTOS), name='processo_aberto_prazo_idx'),
+            models.Index(fields=['secretaria', 'data_prazo'], condition=models.Q(status__in=STATUS_ABERTOS), name='processo_aberto_sec_idx'),
+            # Changelist do admin: filtro por status ordenado/filtrado por prazo
+            models.Index(fields=['status', 'data_prazo'], name='processo_status_prazo_idx'),
+            # Atividade recente e date_hierarchy do admin
+            models.Index(fields=['-data_protocolo'], name='processo_data_protocolo_idx'),
+            # Verificação de prazos (core.alertas): só os abertos cuja situação registrada pode ter mudado
+            models.Index(fields=['situacao_prazo', 'data_prazo'], condition=models.Q(status__in=STATUS_ABERTOS), name='processo_situacao_prazo_idx'),
+            # Carga aberta por responsável (core.distribuicao e admin de lotações)
+            models.Index(fields=['responsavel_atual', 'situacao_prazo'], condition=models.Q(status__in=STATUS_ABERTOS), name='processo_aberto_resp_idx'),
+            # Mapa dos abertos (core.mapa): GiST só com os pontos que o mapa mostra por padrão
+            GistIndex(fields=['localizacao'], condition=models.Q(status__in=STATUS_ABERTOS), name='processo_aberto_geo_idx'),
+            # Busca textual do admin (core.busca)
+            GinIndex(fields=['busca'], name='processo_busca_idx'),
+        ]
+
+
+class TransicaoPrazo(models.Model):
+    """Mudança de situação do prazo de um processo, com o controle do aviso ao responsável."""
+    processo = models.ForeignKey(Processo, on_delete=models.CASCADE, related_name='transicoes_prazo', verbose_name="Processo")
+    situacao_anterior = models.CharField(max_length=10, choices=SituacaoPrazo.choices, verbose_name="De")
+    situacao_nova = models.CharField(max_length=10, choices=SituacaoPrazo.choices, verbose_name="Para")
+    data = models.DateField(verbose_name="Data de Referência")
+    registrada_em = models.DateTimeField(auto_now_add=True, verbose_name="Registrada em")
+    responsavel = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Responsável a Avisar")
+    notificada_em = models.DateTimeField(null=True, blank=True, verbose_name="Aviso Enviado em")
+
+    def __str__(self):
+        return f"{self.processo_id}: {self.situacao_anterior} -> {self.situacao_nova} ({self.data})"
+
+    class Meta:
+        verbose_name = "Transição de Prazo"
+        verbose_name_plural = "Transições de Prazo"
+        constraints = [
+            models.UniqueConstraint(fields=['processo', 'situacao_nova', 'data'], name='transicao_prazo_unica_no_dia'),
+        ]
+        indexes = [
+            # Fila de avisos pendentes
+            models.Index(fields=['responsavel'], condition=models.Q(notificada_em__isnull=True), name='transicao_aviso_pendente_idx'),
+        ]
+
+
+class ProcessoEvento(models.Model):
+    """
+    Histórico somente de inclusão das mudanças de status, responsável e conclusão (core.eventos).
+    No PostgreSQL a tabela é particionada por mês de registrado_em (migração 0012).
+    """
+    class Origem(models.TextChoices):
+        EDICAO = 'EDICAO', 'Edição (save)'
+        LOTE = 'LOTE', 'Alteração em lote'
+        IMPORTACAO = 'IMPORTACAO', 'Importação'
+
+    registrado_em = models.DateTimeField(default=timezone.now, verbose_name="Registrado em")
+    # Sem FK no banco (tabela particionada, histórico sobrevive ao processo): só o id
+    processo = models.ForeignKey(Processo, on_delete=models.DO_NOTHING, db_constraint=False, related_name='eventos', verbose_name="Processo")
+    secretaria = models.ForeignKey(Secretaria, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+', verbose_name="Secretaria")
+    origem = models.CharField(max_length=10, choices=Origem.choices, verbose_name="Origem")
+    status_anterior = models.CharField(max_length=20, choices=Processo.STATUS_CHOICES, null=True, blank=True, verbose_name="Status Anterior")
+    status = models.CharField(max_length=20, choices=Processo.STATUS_CHOICES, verbose_name="Status")
+    # Quando o status anterior começou: registrado_em - status_desde = tempo no status anterior
+    status_desde = models.DateTimeField(null=True, blank=True, verbose_name="Status Anterior desde")
+    responsavel_anterior = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+', verbose_name="Responsável Anterior")
+    responsavel = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+', verbose_name="Responsável")
+    data_conclusao = models.DateTimeField(null=True, blank=True, verbose_name="Data de Conclusão")
+
+    def __str__(self):
+        return f"{self.processo_id}: {self.status_anterior or '-'} -> {self.status} ({self.registrado_em:%d/%m/%Y %H:%M})"
+
+    class Meta:
+        verbose_name = "Evento de Processo"
+        verbose_name_plural = "Eventos de Processos"
+        indexes = [
+            # Histórico de um processo
+            models.Index(fields=['processo', 'registrado_em'], name='evento_processo_idx'),
+            # Tempo em status: saídas de um status num período
+            models.Index(fields=['status_anterior', 'registrado_em'], name='evento_saida_status_idx'),
+        ]
+
+
+# --- Integrações Externas ---
+class EstadoSincronizacao(models.Model):
+    """Marca d'água (high-water mark) de cada importação incremental."""
+    fonte = models.CharField(max_length=50, unique=True, verbose_name="Fonte")
+    marca_dagua = models.DateTimeField(null=True, blank=True, verbose_name="Atualizado Até")
+    ultima_execucao = models.DateTimeField(null=True, blank=True, verbose_name="Última Execução")
+    registros_processados = models.PositiveIntegerField(default=0, verbose_name="Registros na Última Execução")
+    ultimo_erro = models.TextField(blank=True, default='', verbose_name="Erro da Última Execução")
+
+    def __str__(self):
+        return f"{self.fonte} ({self.marca_dagua or 'nunca sincronizado'})"
+
+    class Meta:
+        verbose_name = "Estado de Sincronização"
+        verbose_name_plural = "Estados de Sincronização"
+
+
+# --- Métricas consolidadas ---
+class MetricaDiaria(models.Model):
+    """
+    Contadores diários por serviço e status, mantidos incrementalmente por core.consolidacao.
+    Dashboards e o Metabase leem esta tabela em vez de varrer os processos.
+    """
+    data = models.DateField(verbose_name="Data")
+    servico = models.ForeignKey(CartaDeServicos, on_delete=models.CASCADE, verbose_name="Serviço")
+    # Cópia de servico.secretaria (mantida por core.denormalizacao)
+    secretaria = models.ForeignKey(Secretaria, on_delete=models.PROTECT, null=True, verbose_name="Secretaria")
+    status = models.CharField(max_length=20, choices=Processo.STATUS_CHOICES, verbose_name="Status")
+
+    # Fluxos: atualizados a cada mudança de processo
+    abertos = models.IntegerField(default=0, verbose_name="Protocolados no Dia")
+    concluidos = models.IntegerField(default=0, verbose_name="Concluídos no Dia")
+    soma_dias_resolucao = models.BigIntegerField(default=0, verbose_name="Soma dos Dias até a Conclusão")
+    vencimentos = models.IntegerField(default=0, verbose_name="Em Aberto com Prazo no Dia")
+
+    # Estoque: fotografia gravada no fechamento do dia
+    em_aberto_fim_dia = models.IntegerField(default=0, verbose_name="Em Aberto no Fim do Dia")
+    atrasados_fim_dia = models.IntegerField(default=0, verbose_name="Atrasados no Fim do Dia")
+
+    def __str__(self):
+        return f"{self.data} - {self.servico_id} - {self.status}"
+
+    class Meta:
+        verbose_name = "Métrica Diária"
+        verbose_name_plural = "Métricas Diárias"
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'servico', 'status'], name='metrica_diaria_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['secretaria', 'data'], name='metrica_secretaria_data_idx'),
+        ]
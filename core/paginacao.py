@@ -0,0 +1,164 @@
+# /var/www/gea/core/paginacao.py
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.admin.views.main import ALL_VAR, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, TO_FIELD_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import DateTimeField, Max, Min
+from django.utils.functional import cached_property
+from .cache import TIMEOUT_PADRAO, get_cache, obter_ou_calcular
+from .models import Processo
+
+NAMESPACE_ADMIN = 'admin'
+
+# date_hierarchy do admin sem filtros: os dias com registros são recalculados pela tarefa
+# periódica core.tasks.atualizar_resumos_datas e a changelist só os lê do cache
+HIERARQUIAS_DATAS = ((Processo, 'data_protocolo'),)
+
+# Parâmetros da changelist que não filtram as linhas
+PARAMETROS_SEM_FILTRO = {ALL_VAR, IS_FACETS_VAR, IS_POPUP_VAR, ORDER_VAR, PAGE_VAR, TO_FIELD_VAR}
+
+
+def limiar_contagem():
+    # Abaixo disso o COUNT(*) exato é barato o suficiente
+    return getattr(settings, 'GEA_ADMIN_LIMIAR_CONTAGEM', 50000)
+
+
+def timeout_resumos():
+    return getattr(settings, 'GEA_ADMIN_TIMEOUT_RESUMOS', 300)
+
+
+def estimar_contagem(queryset):
+    """
+    Número aproximado de linhas segundo o planejador do PostgreSQL, sem varrer a tabela:
+    pg_class.reltuples quando não há filtros, senão as linhas estimadas pelo EXPLAIN.
+    Retorna None quando não há estimativa (outro banco ou tabela nunca analisada).
+    """
+    conexao = connections[queryset.db]
+    if conexao.vendor != 'postgresql':
+        return None
+
+    with conexao.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            linha = cursor.fetchone()
+            estimativa = linha[0] if linha else -1
+        else:
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plano = cursor.fetchone()[0]
+            if isinstance(plano, str):
+                plano = json.loads(plano)
+            estimativa = plano[0]['Plan']['Plan Rows']
+    # reltuples = -1 (PostgreSQL 14+) ou 0: tabela ainda sem VACUUM/ANALYZE
+    return int(estimativa) if estimativa > 0 else None
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator que usa a estimativa do planejador quando ela passa do limiar.
+    Em tabelas grandes a contagem exata não é exibida: as últimas páginas podem vir vazias.
+    """
+
+    @cached_property
+    def count(self):
+        estimativa = estimar_contagem(self.object_list)
+        if estimativa is None or estimativa < limiar_contagem():
+            return super().count
+        return estimativa
+
+
+def chave_consulta(queryset, *extras):
+    """Chave de cache estável para o SQL (com filtros e busca) de um queryset."""
+    texto = '|'.join([str(queryset.query), *map(str, extras)])
+    return hashlib.md5(texto.encode()).hexdigest()
+
+
+class ResumoDatas:
+    """
+    Substituto de queryset usado pela date_hierarchy do admin com filtros ou busca: as agregações
+    de datas (mínimo/máximo e anos/meses/dias distintos) ficam em cache por GEA_ADMIN_TIMEOUT_RESUMOS.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def _cacheado(self, chave, calcular):
+        return obter_ou_calcular(NAMESPACE_ADMIN, chave_consulta(self.queryset, *chave), calcular, timeout_resumos())
+
+    def aggregate(self, **agregacoes):
+        return self._cacheado(('aggregate', sorted(agregacoes.items(), key=str)), lambda: self.queryset.aggregate(**agregacoes))
+
+    def dates(self, campo, tipo, order='ASC'):
+        return self._cacheado(('dates', campo, tipo, order), lambda: list(self.queryset.dates(campo, tipo, order)))
+
+    def datetimes(self, campo, tipo, order='ASC'):
+        return self._cacheado(('datetimes', campo, tipo, order), lambda: list(self.queryset.datetimes(campo, tipo, order)))
+
+
+# --- Dias com registros (date_hierarchy sem filtros) ---
+
+def _chave_dias(modelo, campo):
+    return f'gea:{NAMESPACE_ADMIN}:dias:{modelo._meta.label_lower}.{campo}'
+
+
+def atualizar_resumos_datas():
+    """Recalcula os dias com registros de cada HIERARQUIAS_DATAS (um SELECT DISTINCT por campo)."""
+    cache = get_cache()
+    for modelo, campo in HIERARQUIAS_DATAS:
+        tipo = 'datetimes' if isinstance(modelo._meta.get_field(campo), DateTimeField) else 'dates'
+        dias = list(getattr(modelo._default_manager.order_by(), tipo)(campo, 'day'))
+        cache.set(_chave_dias(modelo, campo), dias, TIMEOUT_PADRAO)
+    return len(HIERARQUIAS_DATAS)
+
+
+def sem_filtros(cl):
+    """Se a changelist lista todas as linhas, a não ser pela navegação da própria date_hierarchy."""
+    navegacao = {f'{cl.date_hierarchy}__{parte}' for parte in ('year', 'month', 'day')}
+    return all(
+        nome in PARAMETROS_SEM_FILTRO or nome in navegacao or (nome == 'q' and not valor)
+        for nome, valor in cl.params.items()
+    )
+
+
+class DiasComRegistros:
+    """
+    Substituto de queryset para a date_hierarchy sem filtros: responde a partir dos dias gravados
+    por atualizar_resumos_datas(), restritos ao ano/mês/dia escolhidos na navegação.
+    None se a tarefa ainda não gravou os dias.
+    """
+
+    TRUNCAR = {
+        'year': lambda dia: dia.replace(month=1, day=1),
+        'month': lambda dia: dia.replace(day=1),
+        'day': lambda dia: dia,
+    }
+
+    def __init__(self, dias):
+        self.dias = dias
+
+    @classmethod
+    def da_changelist(cls, cl):
+        dias = get_cache().get(_chave_dias(cl.model, cl.date_hierarchy))
+        if dias is None:
+            return None
+        for parte in ('year', 'month', 'day'):
+            valor = cl.params.get(f'{cl.date_hierarchy}__{parte}')
+            if valor:
+                dias = [dia for dia in dias if getattr(dia, parte) == int(valor)]
+        return cls(dias)
+
+    def aggregate(self, **agregacoes):
+        funcoes = {Min: min, Max: max}
+        return {nome: funcoes[type(expressao)](self.dias, default=None) for nome, expressao in agregacoes.items()}
+
+    def dates(self, campo, tipo, order='ASC'):
+        return sorted({self.TRUNCAR[tipo](dia) for dia in self.dias}, reverse=order == 'DESC')
+
+    datetimes = dates
@@ -0,0 +1,58 @@
+# /var/www/gea/core/paralelo.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from . import instrumentacao
+
+# Consultas independentes de uma view assíncrona executadas ao mesmo tempo. O ORM assíncrono
+# do Django (acount, aaggregate, async for) ainda passa cada consulta por sync_to_async num
+# único thread, uma depois da outra; aqui cada função roda num thread de um pool limitado
+# (GEA_CONSULTAS_PARALELAS por processo) com a conexão própria daquele thread. Essas conexões
+# seguem CONN_MAX_AGE como as de uma requisição: verificadas antes e fechadas (ou mantidas) depois,
+# e recebem a medição da requisição (core.instrumentacao), que só envolve as conexões do thread dela.
+# Dentro de uma transação (ATOMIC_REQUESTS, testes) as funções ficam na conexão dela, em
+# sequência: outra conexão não enxergaria o que ainda não foi commitado.
+
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'GEA_CONSULTAS_PARALELAS', 4), thread_name_prefix='gea-consultas',
+        )
+    return _executor
+
+
+def _com_conexao_do_thread(funcao, medicao=None):
+    def executar():
+        close_old_connections()
+        try:
+            if medicao is None:
+                return funcao()
+            with connection.execute_wrapper(medicao):
+                return funcao()
+        finally:
+            close_old_connections()
+    return executar
+
+
+def _em_transacao():
+    return connection.in_atomic_block
+
+
+async def consultar(*funcoes):
+    """Executa as funções (síncronas, sem argumentos) ao mesmo tempo; resultados na ordem recebida."""
+    if (getattr(settings, 'GEA_CONSULTAS_PARALELAS', 4) <= 1 or len(funcoes) <= 1
+            or await sync_to_async(_em_transacao)()):
+        return [await sync_to_async(funcao)() for funcao in funcoes]
+    medicao = instrumentacao.medicao_atual()
+    return await asyncio.gather(*(
+        sync_to_async(_com_conexao_do_thread(funcao, medicao), thread_sensitive=False, executor=_pool())()
+        for funcao in funcoes
+    ))
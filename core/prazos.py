@@ -0,0 +1,172 @@
+# /var/www/gea/core/prazos.py
+
+import datetime
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .cache import NAMESPACE_CALENDARIOS, versao
+from .consolidacao import atualizando_metricas
+from .models import Calendario, Feriado, CartaDeServicos, Processo
+
+# Motor de prazos: cada calendário vira uma tabela ordenada de dias úteis (ordinais).
+# Somar N dias úteis é uma busca binária + um deslocamento no vetor, então um lote
+# inteiro custa as duas consultas de carga, não uma consulta (ou um laço de dias) por processo.
+
+# Calendário do serviço: o da secretaria tem precedência sobre o da entidade
+CALENDARIO_DO_SERVICO = Coalesce('secretaria__calendario_id', 'entidade__calendario_id')
+
+# Janela inicial das tabelas (anos antes/depois de hoje); é estendida se um prazo passar dela
+ANOS_TABELA = 10
+
+
+class TabelaDiasUteis:
+    """Dias úteis (segunda a sexta, menos feriados) de um calendário, como ordinais ordenados."""
+
+    def __init__(self, contagem, feriados, hoje=None):
+        self.contagem = contagem
+        self.feriados = {d.toordinal() for d in feriados}
+        ano = (hoje or timezone.localdate()).year
+        self.inicio = self.fim = datetime.date(ano - ANOS_TABELA, 1, 1).toordinal()
+        self.uteis = []
+        self._estender(datetime.date(ano + ANOS_TABELA, 12, 31).toordinal())
+
+    def _uteis_entre(self, inicio, fim):
+        return [
+            dia for dia in range(inicio, fim)
+            if dia not in self.feriados and datetime.date.fromordinal(dia).weekday() < 5
+        ]
+
+    def _estender(self, ate):
+        self.uteis.extend(self._uteis_entre(self.fim, ate + 1))
+        self.fim = max(self.fim, ate + 1)
+
+    def _cobrir(self, ordinal):
+        # Datas fora da janela são raras (reimportações antigas, prazos longos): estende sob demanda
+        if ordinal < self.inicio:
+            novo_inicio = ordinal - 366
+            self.uteis[:0] = self._uteis_entre(novo_inicio, self.inicio)
+            self.inicio = novo_inicio
+        elif ordinal >= self.fim:
+            self._estender(ordinal + 366)
+
+    def _util_em_ou_depois(self, ordinal):
+        while True:
+            i = bisect_left(self.uteis, ordinal)
+            if i < len(self.uteis):
+                return i
+            self._estender(self.fim + 366)
+
+    def prazo(self, data_base, dias):
+        self._cobrir(data_base.toordinal())
+        if self.contagem == Calendario.Contagem.CORRIDOS:
+            # Vence N dias depois; se cair em dia não útil, prorroga para o próximo útil
+            alvo = (data_base + datetime.timedelta(days=dias)).toordinal()
+            return datetime.date.fromordinal(self.uteis[self._util_em_ou_depois(alvo)])
+        if dias <= 0:
+            return data_base
+        # A contagem começa no primeiro dia útil depois da data base
+        i = bisect_right(self.uteis, data_base.toordinal()) + dias - 1
+        while i >= len(self.uteis):
+            self._estender(self.fim + 366)
+        return datetime.date.fromordinal(self.uteis[i])
+
+    def dias_uteis_entre(self, inicio, fim):
+        """Dias úteis em (inicio, fim]: o tempo de atendimento medido como o prazo é contado."""
+        self._cobrir(inicio.toordinal())
+        self._util_em_ou_depois(fim.toordinal() + 1)
+        return bisect_right(self.uteis, fim.toordinal()) - bisect_right(self.uteis, inicio.toordinal())
+
+
+class MotorPrazos:
+    """Tabelas de todos os calendários, carregadas com duas consultas."""
+
+    def __init__(self, hoje=None):
+        feriados = defaultdict(list)
+        for calendario_id, data in Feriado.objects.values_list('calendario_id', 'data'):
+            feriados[calendario_id].append(data)
+        self.tabelas = {
+            pk: TabelaDiasUteis(contagem, feriados[pk], hoje)
+            for pk, contagem in Calendario.objects.values_list('id', 'contagem')
+        }
+
+    def prazo(self, data_base, dias, calendario_id=None):
+        tabela = self.tabelas.get(calendario_id)
+        if tabela is None:
+            return data_base + datetime.timedelta(days=dias)
+        return tabela.prazo(data_base, dias)
+
+    def prazos(self, linhas):
+        """[(data_base, dias, calendario_id), ...] -> [prazo, ...]"""
+        return [self.prazo(data_base, dias, calendario_id) for data_base, dias, calendario_id in linhas]
+
+    def dias_uteis_entre(self, inicio, fim, calendario_id=None):
+        tabela = self.tabelas.get(calendario_id)
+        if tabela is None:
+            return (fim - inicio).days
+        return tabela.dias_uteis_entre(inicio, fim)
+
+    def prazo_do_servico(self, servico, data_base=None):
+        calendario_id = CartaDeServicos.objects.filter(pk=servico.pk).values_list(
+            CALENDARIO_DO_SERVICO, flat=True
+        ).first()
+        return self.prazo(data_base or timezone.localdate(), servico.prazo_maximo_dias, calendario_id)
+
+
+_motor = None
+_versao_motor = None
+
+
+def obter_motor():
+    """Motor compartilhado pelo processo; recarregado quando calendários ou feriados mudam."""
+    global _motor, _versao_motor
+    atual = versao(NAMESPACE_CALENDARIOS)
+    if _motor is None or _versao_motor != atual:
+        _motor, _versao_motor = MotorPrazos(), atual
+    return _motor
+
+
+# --- Recálculo em lote (depois de mudar um calendário) ---
+
+TAMANHO_LOTE_UPDATE = 5000
+
+
+def recalcular_prazos_abertos(calendario_id=None):
+    """
+    Recalcula data_prazo dos processos em aberto (de um calendário ou de todos) a partir da
+    data do protocolo, a mesma base do cálculo original (Processo.save e importação do ColabGov).
+    O prazo só depende de (serviço, dia do protocolo): calcula uma vez por combinação e aplica
+    com UPDATE ... FROM (VALUES ...). Retorna quantos processos mudaram.
+    """
+    motor = obter_motor()
+    servicos = CartaDeServicos.objects.annotate(calendario=CALENDARIO_DO_SERVICO)
+    if calendario_id is not None:
+        servicos = servicos.filter(calendario=calendario_id)
+    servicos = {pk: (dias, calendario) for pk, dias, calendario in servicos.values_list('id', 'prazo_maximo_dias', 'calendario')}
+    if not servicos:
+        return 0
+
+    abertos = Processo.objects.filter(status__in=Processo.STATUS_ABERTOS, servico_solicitado_id__in=servicos)
+    combinacoes = abertos.annotate(dia=TruncDate('data_protocolo')).values_list('servico_solicitado_id', 'dia').distinct()
+    valores = [
+        (servico_id, dia, motor.prazo(dia, *servicos[servico_id]))
+        for servico_id, dia in combinacoes.order_by()
+    ]
+
+    alterados = 0
+    with atualizando_metricas(abertos), connection.cursor() as cursor:
+        for inicio in range(0, len(valores), TAMANHO_LOTE_UPDATE):
+            lote = valores[inicio:inicio + TAMANHO_LOTE_UPDATE]
+            cursor.execute(f"""
+                UPDATE {Processo._meta.db_table} p SET data_prazo = v.prazo
+                FROM (VALUES {', '.join(['(%s, %s::date, %s::date)'] * len(lote))}) AS v (servico_id, dia, prazo)
+                WHERE p.servico_solicitado_id = v.servico_id
+                  AND (p.data_protocolo AT TIME ZONE %s)::date = v.dia
+                  AND p.status = ANY(%s)
+                  AND p.data_prazo IS DISTINCT FROM v.prazo
+            """, [*(valor for linha in lote for valor in linha), settings.TIME_ZONE, list(Processo.STATUS_ABERTOS)])
+            alterados += cursor.rowcount
+    return alterados
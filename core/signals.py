@@ -0,0 +1,89 @@
+# /var/www/gea/core/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+from .cache import NAMESPACE_CALENDARIOS, NAMESPACE_CATALOGO, invalidar
+from . import consolidacao, hierarquia
+from .denormalizacao import propagar_servico, propagar_divisao, propagar_departamento
+from .models import Secretaria, Departamento, Divisao, CartaDeServicos, Processo, Calendario, Feriado
+
+
+# --- Invalidação do cache da Carta de Serviços ---
+# Operações em lote (bulk_create/update) não disparam sinais: a importação invalida por conta própria.
+
+@receiver(post_save, sender=CartaDeServicos)
+@receiver(post_delete, sender=CartaDeServicos)
+@receiver(post_save, sender=Divisao)
+@receiver(post_delete, sender=Divisao)
+@receiver(post_save, sender=Departamento)
+@receiver(post_delete, sender=Departamento)
+@receiver(post_save, sender=Secretaria)
+@receiver(post_delete, sender=Secretaria)
+def invalidar_cache_catalogo(sender, **kwargs):
+    # Só depois do commit, para ninguém recalcular o cache com dados ainda não gravados
+    transaction.on_commit(lambda: invalidar(NAMESPACE_CATALOGO))
+
+
+# --- Árvore da hierarquia em memória (core.hierarquia) ---
+
+@receiver(post_save, sender=Divisao)
+@receiver(post_delete, sender=Divisao)
+@receiver(post_save, sender=Departamento)
+@receiver(post_delete, sender=Departamento)
+@receiver(post_save, sender=Secretaria)
+@receiver(post_delete, sender=Secretaria)
+def invalidar_arvore_hierarquia(sender, **kwargs):
+    hierarquia.alterada()
+
+
+# --- Calendários de prazos (core.prazos) ---
+
+@receiver(post_save, sender=Calendario)
+@receiver(post_delete, sender=Calendario)
+@receiver(post_save, sender=Feriado)
+@receiver(post_delete, sender=Feriado)
+def invalidar_calendarios(sender, **kwargs):
+    transaction.on_commit(lambda: invalidar(NAMESPACE_CALENDARIOS))
+
+
+# --- Hierarquia desnormalizada (secretaria em Processo / CartaDeServicos) ---
+# Só há o que propagar quando um registro existente muda de lugar na hierarquia.
+
+@receiver(post_save, sender=CartaDeServicos)
+def propagar_hierarquia_servico(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        propagar_servico(instance)
+
+
+@receiver(post_save, sender=Divisao)
+def propagar_hierarquia_divisao(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        propagar_divisao(instance)
+
+
+@receiver(post_save, sender=Departamento)
+def propagar_hierarquia_departamento(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        propagar_departamento(instance)
+
+
+# --- Métricas diárias (core.consolidacao) ---
+# update() em lote ajusta as métricas no ProcessoQuerySet; o que não passa nem pelo save() nem
+# pelo update() (bulk_create/bulk_update, SQL direto) usa consolidacao.atualizando_metricas().
+
+@receiver(pre_save, sender=Processo)
+def retirar_metricas_processo(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        consolidacao.retirar(Processo.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Processo)
+def somar_metricas_processo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        consolidacao.somar(Processo.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_delete, sender=Processo)
+def retirar_metricas_processo_apagado(sender, instance, **kwargs):
+    consolidacao.retirar(Processo.objects.filter(pk=instance.pk))
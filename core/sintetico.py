@@ -0,0 +1,173 @@
+# /var/www/gea/core/sintetico.py
+
+import datetime
+import random
+import uuid
+
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.utils import timezone
+from .alertas import antecedencia_padrao, situacao_para
+from .classificacao import classificar_servico
+from . import hierarquia
+from .consolidacao import retirar, somar
+from .models import Secretaria, Departamento, Divisao, CartaDeServicos, Processo
+
+# Registros sintéticos usam este prefixo (protocolo, nomes, siglas, usernames) para poderem ser removidos depois
+PREFIXO_SINTETICO = 'SINT-'
+
+# Distribuição de status aproximada da produção: o histórico é quase todo concluído
+DISTRIBUICAO_STATUS = {
+    'ABERTO': 0.06,
+    'EM_ANALISE': 0.04,
+    'PENDENTE': 0.02,
+    'CONCLUIDO': 0.83,
+    'CANCELADO': 0.05,
+}
+
+# Formas de solicitação e tipos de sistema com o peso aproximado da Carta real
+FORMAS_SOLICITACAO = [
+    (('Presencial', 'Não tem (Presencial)'), 0.53),
+    (('1Doc', 'Terceirizado'), 0.12),
+    (('Aprova Digital', 'Terceirizado'), 0.07),
+    (('Colab', 'Terceirizado'), 0.07),
+    (('Portal Prefeitura', 'Próprio'), 0.08),
+    (('SIL Tecnologia', 'Terceirizado'), 0.05),
+    (('Telefone ou e-mail', 'Não tem (Presencial)'), 0.03),
+    (('Portal Governo Federal', 'Federal'), 0.05),
+]
+
+# Caixa envolvente de Mogi das Cruzes (lon/lat mínimos e máximos)
+BBOX_PADRAO = (-46.35, -23.70, -46.00, -23.40)
+
+
+def gerar_hierarquia(quantidade):
+    """Cria `quantidade` secretarias sintéticas, cada uma com um departamento e uma divisão."""
+    secretarias = Secretaria.objects.bulk_create([
+        Secretaria(nome=f'{PREFIXO_SINTETICO}Secretaria {n}', sigla=f'{PREFIXO_SINTETICO}{n}')
+        for n in range(1, quantidade + 1)
+    ])
+    departamentos = Departamento.objects.bulk_create([
+        Departamento(secretaria=secretaria, nome='Departamento Geral') for secretaria in secretarias
+    ])
+    divisoes = Divisao.objects.bulk_create([
+        Divisao(departamento=departamento, nome='Atendimento Geral') for departamento in departamentos
+    ])
+    hierarquia.alterada()
+    return divisoes
+
+
+def gerar_servicos(quantidade, divisoes, semente=None):
+    rnd = random.Random(semente)
+    formas, pesos = zip(*FORMAS_SOLICITACAO)
+    servicos = []
+    for n in range(1, quantidade + 1):
+        divisao = rnd.choice(divisoes)
+        forma, tipo_sistema = rnd.choices(formas, pesos)[0]
+        canal, sistema = classificar_servico(forma, tipo_sistema)
+        servicos.append(CartaDeServicos(
+            nome_servico=f'{PREFIXO_SINTETICO}Serviço {n}',
+            divisao_responsavel=divisao,
+            departamento_id=divisao.departamento_id,
+            secretaria_id=divisao.departamento.secretaria_id,
+            prazo_maximo_dias=rnd.choice((5, 10, 15, 30, 60)),
+            tipo_servico=rnd.choices(('Serviço', 'Informação'), (0.93, 0.07))[0],
+            tipos_atendimento='Presencial' if canal == 'MANUAL' else 'Online',
+            forma_solicitacao=forma,
+            tipo_sistema=tipo_sistema,
+            canal=canal,
+            sistema=sistema,
+        ))
+    return CartaDeServicos.objects.bulk_create(servicos, batch_size=1000)
+
+
+def gerar_usuarios(quantidade):
+    usuarios = []
+    for n in range(1, quantidade + 1):
+        usuario = User(username=f'{PREFIXO_SINTETICO}usuario{n}', is_staff=True)
+        usuario.set_unusable_password()
+        usuarios.append(usuario)
+    return User.objects.bulk_create(usuarios, batch_size=1000)
+
+
+def gerar_processos(quantidade, hoje=None, lote=5000, semente=None, dias_historico=365,
+                    servicos=None, responsaveis=None, bbox=BBOX_PADRAO):
+    """
+    Insere `quantidade` processos sintéticos em lotes (bulk_create), espalhando prazos entre
+    `dias_historico` dias atrás e 30 dias à frente e localizações dentro de `bbox`.
+    Sem `servicos`, usa todos os serviços ativos da Carta.
+    bulk_create não passa pelo save(): protocolo, situação do prazo e início do status são
+    calculados aqui, como o save() e core.alertas os deixariam.
+    """
+    if servicos is None:
+        servicos = CartaDeServicos.objects.ativos().only('id', 'secretaria_id')
+    servicos = [(s.pk, s.secretaria_id) for s in servicos]
+    if not servicos:
+        raise ValueError("Nenhum serviço cadastrado: rode import_carta_completa antes.")
+    responsaveis = [u.pk for u in responsaveis or []]
+
+    rnd = random.Random(semente)
+    hoje = hoje or timezone.localdate()
+    status, pesos = zip(*DISTRIBUICAO_STATUS.items())
+    agora = timezone.now()
+    antecedencia = antecedencia_padrao()
+    lon_min, lat_min, lon_max, lat_max = bbox
+
+    criados = 0
+    while criados < quantidade:
+        objetos = []
+        for _ in range(min(lote, quantidade - criados)):
+            servico_id, secretaria_id = rnd.choice(servicos)
+            situacao = rnd.choices(status, pesos)[0]
+            prazo = hoje + datetime.timedelta(days=rnd.randint(-dias_historico, 30))
+            # Protocolado 30 dias antes do prazo
+            protocolo = timezone.make_aware(datetime.datetime.combine(prazo - datetime.timedelta(days=30), datetime.time.min))
+            conclusao = agora if situacao == 'CONCLUIDO' else None
+            objetos.append(Processo(
+                numero_protocolo=f'{PREFIXO_SINTETICO}{uuid.UUID(int=rnd.getrandbits(128)).hex[:20]}',
+                servico_solicitado_id=servico_id,
+                secretaria_id=secretaria_id,
+                solicitante=f'Munícipe {rnd.randint(1, 10 ** 6)}',
+                detalhes_solicitacao='Processo sintético para testes de carga.',
+                status=situacao,
+                data_protocolo=protocolo,
+                data_prazo=prazo,
+                data_conclusao=conclusao,
+                situacao_prazo=situacao_para(prazo, hoje, antecedencia),
+                status_desde=conclusao or protocolo,
+                responsavel_atual_id=rnd.choice(responsaveis) if responsaveis else None,
+                localizacao=Point(rnd.uniform(lon_min, lon_max), rnd.uniform(lat_min, lat_max), srid=4326),
+            ))
+        with transaction.atomic():
+            Processo.objects.bulk_create(objetos, batch_size=lote)
+            somar(Processo.objects.filter(pk__gte=objetos[0].pk, pk__lte=objetos[-1].pk))
+        criados += len(objetos)
+    return criados
+
+
+def contar_processos_sinteticos():
+    return Processo.objects.filter(numero_protocolo__startswith=PREFIXO_SINTETICO).count()
+
+
+@transaction.atomic
+def remover_processos_sinteticos():
+    processos = Processo.objects.filter(numero_protocolo__startswith=PREFIXO_SINTETICO)
+    retirar(processos)
+    # DELETE direto: delete() carregaria cada processo para disparar o pre_delete das métricas
+    return processos._raw_delete(processos.db)
+
+
+@transaction.atomic
+def remover_dados_sinteticos():
+    """Remove tudo o que foi gerado por este módulo. Retorna {tipo: quantidade}."""
+    removidos = {'processos': remover_processos_sinteticos()}
+    removidos['servicos'], _ = CartaDeServicos.objects.filter(nome_servico__startswith=PREFIXO_SINTETICO).delete()
+    arvore = hierarquia.obter_arvore()
+    secretarias = [no for no in arvore.secretarias() if no.sigla.startswith(PREFIXO_SINTETICO)]
+    abaixo = [no for secretaria in secretarias for no in arvore.descendentes(secretaria.tipo, secretaria.id)]
+    removidos['divisoes'], _ = Divisao.objects.filter(pk__in=[no.id for no in abaixo if no.tipo == hierarquia.DIVISAO]).delete()
+    Departamento.objects.filter(pk__in=[no.id for no in abaixo if no.tipo == hierarquia.DEPARTAMENTO]).delete()
+    removidos['secretarias'], _ = Secretaria.objects.filter(pk__in=[no.id for no in secretarias]).delete()
+    removidos['usuarios'], _ = User.objects.filter(username__startswith=PREFIXO_SINTETICO).delete()
+    return removidos
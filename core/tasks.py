@@ -1,41 +1,320 @@
 # /var/www/gea/core/tasks.py
 
+import codecs
+import json
+import logging
+
 from celery import shared_task
 import requests
-from .models import Processo, Secretaria, Departamento, Divisao # etc.
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import alertas, distribuicao, paginacao
+from .consolidacao import atualizando_metricas, fechar_dia
+from .eventos import criar_particoes, registrando_eventos
+from .models import Processo, ProcessoEvento, CartaDeServicos, EstadoSincronizacao
+from .prazos import CALENDARIO_DO_SERVICO, obter_motor
+
+logger = logging.getLogger('core.tasks')
+
+FONTE_COLAB = 'colabgov'
+
+# Tradução dos status do ColabGov para os nossos
+STATUS_COLAB = {
+    'aberto': 'ABERTO',
+    'novo': 'ABERTO',
+    'em_andamento': 'EM_ANALISE',
+    'em_analise': 'EM_ANALISE',
+    'pendente': 'PENDENTE',
+    'resolvido': 'CONCLUIDO',
+    'concluido': 'CONCLUIDO',
+    'fechado': 'CONCLUIDO',
+    'cancelado': 'CANCELADO',
+}
+
+# Campos sobrescritos quando o processo já existe (data_prazo é preservado)
+CAMPOS_UPSERT_COLAB = [
+    'numero_protocolo', 'servico_solicitado', 'solicitante', 'detalhes_solicitacao',
+    'status', 'data_conclusao', 'localizacao', 'secretaria',
+]
+# data_protocolo é a base do prazo (e do recálculo em core.prazos): vem do criado_em do item e só
+# é regravada quando o item o traz; sem ele, um processo novo fica com a hora da importação
+CAMPOS_UPSERT_COLAB_COM_CRIACAO = [*CAMPOS_UPSERT_COLAB, 'data_protocolo']
+
+_sessao_colab = None
+
+
+def get_sessao_colab():
+    """Sessão HTTP reaproveitada entre execuções do worker (pool de conexões keep-alive)."""
+    global _sessao_colab
+    if _sessao_colab is None:
+        sessao = requests.Session()
+        retry = Retry(total=3, backoff_factor=1, status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry)
+        sessao.mount('http://', adapter)
+        sessao.mount('https://', adapter)
+        _sessao_colab = sessao
+    return _sessao_colab
+
+
+def iterar_itens_json(response, chunk_size=64 * 1024):
+    """
+    Lê um array JSON do corpo da resposta item a item, sem carregar a página inteira
+    na memória (equivalente incremental de response.json()).
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    iniciou = False
+    fim_stream = False
+    chunks = response.iter_content(chunk_size=chunk_size)
+
+    while True:
+        # Pula espaços e separadores entre itens
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos < len(buffer):
+            if not iniciou:
+                if buffer[pos] != '[':
+                    raise ValueError("Resposta do ColabGov não é um array JSON.")
+                iniciou = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, fim = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                fim = None
+            # Um valor que termina exatamente no fim do buffer pode estar incompleto
+            if fim is not None and (fim < len(buffer) or fim_stream):
+                yield item
+                pos = fim
+                continue
+
+        if fim_stream:
+            raise ValueError("Array JSON do ColabGov terminou de forma inesperada.")
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            fim_stream = True
+            buffer = buffer[pos:] + utf8.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+
+
+def converter_item_colab(item, servicos, hoje, motor):
+    """Monta um Processo (não salvo) a partir de um item do ColabGov; None se faltar id ou serviço correspondente."""
+    servico = servicos.get((item.get('servico') or '').strip())
+    if servico is None or item.get('id') is None:
+        return None
+    servico_id, prazo_dias, secretaria_id, calendario_id = servico
+
+    status = STATUS_COLAB.get((item.get('status') or '').lower(), 'ABERTO')
+    criado_em = parse_datetime(item.get('criado_em') or '')
+    if criado_em is not None and timezone.is_naive(criado_em):
+        criado_em = timezone.make_aware(criado_em)
+    data_base = timezone.localdate(criado_em) if criado_em else hoje
+
+    localizacao = None
+    if item.get('latitude') is not None and item.get('longitude') is not None:
+        localizacao = Point(float(item['longitude']), float(item['latitude']), srid=4326)
+
+    data_conclusao = None
+    if status == 'CONCLUIDO':
+        data_conclusao = parse_datetime(item.get('concluido_em') or '') or timezone.now()
+
+    # bulk_create não passa pelo Processo.save(): o prazo sai do motor (tabelas já carregadas)
+    processo = Processo(
+        id_externo_colab=str(item['id']),
+        numero_protocolo=item.get('protocolo') or None,
+        servico_solicitado_id=servico_id,
+        secretaria_id=secretaria_id,
+        solicitante=(item.get('solicitante') or '')[:255],
+        detalhes_solicitacao=item.get('descricao') or '',
+        status=status,
+        data_prazo=motor.prazo(data_base, prazo_dias, calendario_id),
+        data_conclusao=data_conclusao,
+        localizacao=localizacao,
+    )
+    processo.criado_na_origem = criado_em is not None
+    if criado_em is not None:
+        processo.data_protocolo = criado_em
+    return processo
+
+
+def gravar_lote_colab(lote, estado, marca):
+    """Upsert de um lote keyed em id_externo_colab + avanço da marca d'água, na mesma transação."""
+    # bulk_create não dispara sinais: métricas diárias e histórico de status do lote são ajustados em conjunto
+    afetados = Processo.objects.filter(id_externo_colab__in=[p.id_externo_colab for p in lote])
+    with transaction.atomic(), atualizando_metricas(afetados), registrando_eventos(afetados, ProcessoEvento.Origem.IMPORTACAO):
+        for com_criacao, campos in ((True, CAMPOS_UPSERT_COLAB_COM_CRIACAO), (False, CAMPOS_UPSERT_COLAB)):
+            parte = [processo for processo in lote if getattr(processo, 'criado_na_origem', False) is com_criacao]
+            if parte:
+                Processo.objects.bulk_create(
+                    parte,
+                    update_conflicts=True,
+                    unique_fields=['id_externo_colab'],
+                    update_fields=campos,
+                )
+        if marca and (estado.marca_dagua is None or marca > estado.marca_dagua):
+            estado.marca_dagua = marca
+            estado.save(update_fields=['marca_dagua'])
+
 
 @shared_task
 def importar_dados_colab():
-    print("Iniciando importação de dados do ColabGov...")
-    
-    # 1. Autenticar e chamar a API do ColabGov
-    # (Exemplo, os detalhes reais da API precisam ser verificados)
+    logger.info("Iniciando importação de dados do ColabGov...")
+
+    url = getattr(settings, 'COLAB_API_URL', 'URL_DA_API_COLABGOV')
+    auth = (getattr(settings, 'COLAB_API_USUARIO', 'usuario'), getattr(settings, 'COLAB_API_SENHA', 'senha'))
+    tamanho_pagina = getattr(settings, 'COLAB_TAMANHO_PAGINA', 500)
+    tamanho_lote = getattr(settings, 'COLAB_TAMANHO_LOTE', 500)
+
+    estado, _ = EstadoSincronizacao.objects.get_or_create(fonte=FONTE_COLAB)
+    # Comparação inclusiva (>=): itens na fronteira são relidos, o upsert é idempotente
+    desde = estado.marca_dagua
+
+    # Catálogo carregado uma vez por execução: {nome do serviço: (id, prazo, secretaria, calendário)}
+    servicos = {}
+    for pk, nome, prazo, secretaria_id, calendario_id in CartaDeServicos.objects.values_list(
+        'id', 'nome_servico', 'prazo_maximo_dias', 'secretaria_id', CALENDARIO_DO_SERVICO,
+    ).order_by('pk'):
+        servicos.setdefault(nome, (pk, prazo, secretaria_id, calendario_id))
+    motor = obter_motor()
+
+    hoje = timezone.localdate()
+    sessao = get_sessao_colab()
+    processados = ignorados = 0
+    importados = []  # id_externo_colab do que foi gravado, para a distribuição no fim
+    lote = {}
+    marca_lote = None
+    # Itens de um serviço ainda não cadastrado não podem ficar para trás da marca d'água: ela
+    # para no primeiro deles (a leitura é inclusiva), e eles são relidos até o serviço existir
+    limite_marca = None
+
+    def marca_gravavel():
+        if marca_lote is None or limite_marca is None:
+            return marca_lote
+        return min(marca_lote, limite_marca)
+
+    # Paginação por atualizado_em (keyset): cada página recomeça do maior atualizado_em da anterior.
+    # Com número de página e filtro fixo, um item alterado durante a execução vai para o fim da
+    # ordenação e empurra os seguintes para páginas já lidas, que seriam pulados. A leitura é
+    # inclusiva: os itens da fronteira já lidos (mesmo id e atualizado_em) não são processados de novo.
+    cursor = desde
+    pagina = 1  # só passa de 1 quando uma página inteira tem o mesmo atualizado_em
+    fronteira = set()
+
     try:
-        response = requests.get('URL_DA_API_COLABGOV', auth=('usuario', 'senha'))
-        response.raise_for_status() # Lança um erro se a resposta for 4xx ou 5xx
-        dados_externos = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao acessar a API do ColabGov: {e}")
-        return
-
-    # 2. Iterar sobre os dados recebidos
-    for item in dados_externos:
-        # 3. Lógica para "traduzir" os dados do ColabGov para os nossos modelos
-        # Ex: Encontrar a Secretaria correta, definir o status, etc.
-        # Aqui usaremos a mesma lógica de `get_or_create` que já discutimos.
-        
-        secretaria_nome = item.get('secretaria_responsavel')
-        secretaria, created = Secretaria.objects.get_or_create(...)
-        # ... e assim por diante ...
-
-        Processo.objects.update_or_create(
-            # Usar um ID externo para evitar duplicatas
-            id_externo_colab=item.get('id'), 
-            defaults={
-                'numero_protocolo': item.get('protocolo'),
-                'servico_solicitado': ...,
-                # etc.
-            }
-        )
-    
-    return f"{len(dados_externos)} registros do ColabGov processados."
\ No newline at end of file
+        while True:
+            params = {'pagina': pagina, 'tamanho_pagina': tamanho_pagina, 'ordenacao': 'atualizado_em'}
+            if cursor:
+                params['atualizado_desde'] = cursor.isoformat()
+
+            with sessao.get(url, params=params, auth=auth, stream=True, timeout=(5, 60)) as response:
+                response.raise_for_status()  # Lança um erro se a resposta for 4xx ou 5xx
+                itens_pagina = 0
+                maior_pagina = None
+                lidos_pagina = []  # (id, atualizado_em) de cada item da página
+                for item in iterar_itens_json(response):
+                    itens_pagina += 1
+                    try:
+                        atualizado_em = parse_datetime(item.get('atualizado_em') or '')
+                        if atualizado_em:
+                            lidos_pagina.append((item.get('id'), atualizado_em))
+                            if maior_pagina is None or atualizado_em > maior_pagina:
+                                maior_pagina = atualizado_em
+                            if atualizado_em == cursor and item.get('id') in fronteira:
+                                continue
+                        processo = converter_item_colab(item, servicos, hoje, motor)
+                    except (TypeError, ValueError) as erro:
+                        # Item malformado (coordenadas, datas): os demais seguem
+                        logger.warning("Item %s do ColabGov ignorado: %s", item.get('id'), erro)
+                        ignorados += 1
+                        continue
+                    if processo is None:
+                        ignorados += 1
+                        if item.get('id') is not None and atualizado_em and (limite_marca is None or atualizado_em < limite_marca):
+                            limite_marca = atualizado_em
+                        continue
+                    # Duplicatas no mesmo lote quebrariam o ON CONFLICT; a última versão prevalece
+                    lote[processo.id_externo_colab] = processo
+                    if atualizado_em and (marca_lote is None or atualizado_em > marca_lote):
+                        marca_lote = atualizado_em
+
+                    if len(lote) >= tamanho_lote:
+                        gravar_lote_colab(list(lote.values()), estado, marca_gravavel())
+                        processados += len(lote)
+                        importados.extend(lote)
+                        lote = {}
+
+            if itens_pagina < tamanho_pagina:
+                break
+            if maior_pagina is not None and (cursor is None or maior_pagina > cursor):
+                cursor, pagina = maior_pagina, 1
+                fronteira = set()
+            else:
+                pagina += 1
+            fronteira |= {pk for pk, atualizado_em in lidos_pagina if atualizado_em == cursor}
+
+        if lote:
+            gravar_lote_colab(list(lote.values()), estado, marca_gravavel())
+            processados += len(lote)
+            importados.extend(lote)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # Os lotes já gravados mantêm a marca d'água: a próxima execução retoma daqui
+        logger.exception("Erro ao acessar a API do ColabGov")
+        estado.ultima_execucao = timezone.now()
+        estado.registros_processados = processados
+        estado.ultimo_erro = str(e)
+        estado.save(update_fields=['ultima_execucao', 'registros_processados', 'ultimo_erro'])
+        return f"Importação do ColabGov interrompida após {processados} registros: {e}"
+
+    estado.ultima_execucao = timezone.now()
+    estado.registros_processados = processados
+    estado.ultimo_erro = ''
+    estado.save(update_fields=['ultima_execucao', 'registros_processados', 'ultimo_erro'])
+
+    distribuidos = 0
+    if importados and getattr(settings, 'GEA_DISTRIBUICAO_AUTOMATICA', True):
+        distribuidos = len(distribuicao.distribuir(Processo.objects.filter(id_externo_colab__in=importados)))
+
+    return f"{processados} registros do ColabGov processados ({ignorados} ignorados, {distribuidos} distribuídos)."
+
+
+@shared_task
+def fechar_dia_metricas():
+    """Fotografia diária do estoque de processos (em aberto/atrasados) em MetricaDiaria."""
+    data = timezone.localdate()
+    fechar_dia(data)
+    return f"Métricas de {data.isoformat()} fechadas."
+
+
+@shared_task
+def verificar_prazos():
+    """Registra as transições de prazo desde a última execução e avisa os responsáveis."""
+    transicoes = alertas.detectar_transicoes()
+    emails, avisadas = alertas.enviar_avisos()
+    return f"{transicoes} transições de prazo; {emails} e-mails com {avisadas} avisos enviados."
+
+
+@shared_task
+def criar_particoes_eventos():
+    """Mantém criadas as partições mensais de ProcessoEvento dos próximos meses."""
+    criadas = criar_particoes()
+    return f"{len(criadas)} partições de eventos criadas."
+
+
+@shared_task
+def atualizar_resumos_datas():
+    """Dias com registros das date_hierarchy do admin (lidos do cache pela changelist)."""
+    paginacao.atualizar_resumos_datas()
+    return "Resumos de datas do admin atualizados."
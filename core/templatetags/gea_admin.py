@@ -0,0 +1,37 @@
+# /var/www/gea/core/templatetags/gea_admin.py
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from ..paginacao import DiasComRegistros, ResumoDatas, sem_filtros
+
+register = template.Library()
+
+
+class ChangeListResumida:
+    """ChangeList cujo queryset responde às agregações de datas a partir do cache."""
+
+    def __init__(self, cl, queryset):
+        self._cl = cl
+        self.queryset = queryset
+
+    def __getattr__(self, nome):
+        return getattr(self._cl, nome)
+
+
+def date_hierarchy_resumida(cl):
+    # Mesma navegação do admin, sem o SELECT DISTINCT na tabela inteira a cada página
+    if not sem_filtros(cl):
+        return date_hierarchy(ChangeListResumida(cl, ResumoDatas(cl.queryset)))
+    dias = DiasComRegistros.da_changelist(cl)
+    if dias is None:
+        # Sem filtros a tabela inteira não é lida aqui: a navegação aparece após a tarefa periódica
+        return {'show': False}
+    return date_hierarchy(ChangeListResumida(cl, dias))
+
+
+@register.tag(name='date_hierarchy_resumida')
+def date_hierarchy_resumida_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token, func=date_hierarchy_resumida, template_name='date_hierarchy.html', takes_context=False,
+    )
@@ -1,3 +1,1470 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Secretaria, Departamento, Divisao, CartaDeServicos, CanalAtendimento, Processo, EstadoSincronizacao, MetricaDiaria,
+    Calendario, Feriado, SituacaoPrazo, TransicaoPrazo, ProcessoEvento, Lotacao,
+)
+from . import alertas, busca, checks, distribuicao, eventos, exportacao, hierarquia, importacao, instrumentacao, tasks
+from .cache import NAMESPACE_HIERARQUIA, get_cache, versao
+from .classificacao import classificar_servico
+from . import consolidacao
+from .consolidacao import atualizando_metricas
+from .denormalizacao import reparar_hierarquia
+from . import mapa, paralelo, sintetico
+from .instrumentacao import Medicao, medir, obter_histogramas
+from .paginacao import PaginadorEstimado, estimar_contagem
+from .prazos import MotorPrazos, TabelaDiasUteis, obter_motor, recalcular_prazos_abertos
+from .metricas import acalcular_kpis_dashboard, calcular_kpis_dashboard, obter_analise_servicos
+
+
+def criar_servico(nome="Poda de Árvore", sigla="SSUZ", prazo=30):
+    secretaria, _ = Secretaria.objects.get_or_create(nome=f"Secretaria {sigla}", sigla=sigla)
+    departamento, _ = Departamento.objects.get_or_create(secretaria=secretaria, nome="Departamento Geral")
+    divisao, _ = Divisao.objects.get_or_create(departamento=departamento, nome="Atendimento Geral")
+    return CartaDeServicos.objects.create(divisao_responsavel=divisao, nome_servico=nome, prazo_maximo_dias=prazo)
+
+
+class FakeColabHandler(BaseHTTPRequestHandler):
+    """API do ColabGov simulada: filtra por atualizado_desde e pagina por número."""
+    itens = []
+    requisicoes = []
+    status_erro = None
+    depois_da_requisicao = None  # chamado com o número da requisição, depois de responder
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        self.requisicoes.append(params)
+        if self.status_erro:
+            self.send_error(self.status_erro)
+            return
+        itens = sorted(self.itens, key=lambda i: i['atualizado_em'])
+        if 'atualizado_desde' in params:
+            itens = [i for i in itens if i['atualizado_em'] >= params['atualizado_desde']]
+        tamanho = int(params['tamanho_pagina'])
+        inicio = (int(params['pagina']) - 1) * tamanho
+        corpo = json.dumps(itens[inicio:inicio + tamanho]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+        if FakeColabHandler.depois_da_requisicao:
+            FakeColabHandler.depois_da_requisicao(len(self.requisicoes))
+
+    def log_message(self, *args):
+        pass
+
+
+class ImportacaoColabTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), FakeColabHandler)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.servidor.server_port}/processos'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        criar_servico()
+        FakeColabHandler.requisicoes = []
+        FakeColabHandler.status_erro = None
+        FakeColabHandler.depois_da_requisicao = None
+        FakeColabHandler.itens = [
+            {
+                'id': n, 'protocolo': f'COLAB-{n}', 'servico': 'Poda de Árvore', 'solicitante': 'Munícipe',
+                'descricao': 'Árvore caída', 'status': 'aberto',
+                'atualizado_em': f'2025-01-01T10:{n:02d}:00+00:00',
+            }
+            for n in range(1, 8)
+        ]
+
+    def importar(self):
+        with override_settings(COLAB_API_URL=self.url, COLAB_TAMANHO_PAGINA=3, COLAB_TAMANHO_LOTE=2):
+            return tasks.importar_dados_colab()
+
+    def test_importacao_inicial_pagina_e_grava_marca_dagua(self):
+        resultado = self.importar()
+        self.assertEqual(Processo.objects.count(), 7)
+        self.assertIn('7 registros', resultado)
+        # Cada página recomeça do maior atualizado_em da anterior
+        self.assertEqual(
+            [r.get('atualizado_desde', '')[11:16] for r in FakeColabHandler.requisicoes], ['', '10:03', '10:05', '10:07'],
+        )
+        estado = EstadoSincronizacao.objects.get(fonte=tasks.FONTE_COLAB)
+        self.assertEqual(estado.marca_dagua.isoformat(), '2025-01-01T10:07:00+00:00')
+        self.assertEqual(estado.ultimo_erro, '')
+
+    def test_item_alterado_durante_a_execucao_nao_desloca_os_seguintes(self):
+        def alterar_item_lido(requisicao):
+            if requisicao == 1:
+                FakeColabHandler.itens[0]['atualizado_em'] = '2025-01-01T10:30:00+00:00'
+        FakeColabHandler.depois_da_requisicao = alterar_item_lido
+        self.importar()
+        self.assertEqual(Processo.objects.count(), 7)
+        estado = EstadoSincronizacao.objects.get(fonte=tasks.FONTE_COLAB)
+        self.assertEqual(estado.marca_dagua.isoformat(), '2025-01-01T10:30:00+00:00')
+
+    def test_pagina_inteira_com_o_mesmo_atualizado_em(self):
+        for item in FakeColabHandler.itens[:5]:
+            item['atualizado_em'] = '2025-01-01T10:00:00+00:00'
+        resultado = self.importar()
+        self.assertEqual(Processo.objects.count(), 7)
+        self.assertIn('7 registros', resultado)
+        # Sem avanço do atualizado_em, a página seguinte é a de número 2 dentro dele
+        self.assertEqual([r['pagina'] for r in FakeColabHandler.requisicoes], ['1', '1', '2', '1'])
+
+    def test_prazo_e_recalculo_partem_da_criacao_na_origem(self):
+        FakeColabHandler.itens[0]['criado_em'] = '2025-01-01T09:00:00+00:00'
+        self.importar()
+        processo = Processo.objects.get(id_externo_colab='1')
+        self.assertEqual(processo.data_protocolo.isoformat(), '2025-01-01T09:00:00+00:00')
+        self.assertEqual(processo.data_prazo, datetime.date(2025, 1, 31))
+        # Sem mudança de calendário o recálculo não mexe no prazo dos importados
+        self.assertEqual(recalcular_prazos_abertos(), 0)
+
+        # Item relido sem criado_em mantém a data gravada
+        del FakeColabHandler.itens[0]['criado_em']
+        FakeColabHandler.itens[0]['atualizado_em'] = '2025-01-02T08:00:00+00:00'
+        self.importar()
+        processo.refresh_from_db()
+        self.assertEqual(processo.data_protocolo.isoformat(), '2025-01-01T09:00:00+00:00')
+
+    def test_erro_na_api_fica_registrado(self):
+        FakeColabHandler.status_erro = 500
+        with self.assertLogs('core.tasks', 'ERROR'):
+            resultado = self.importar()
+        self.assertIn('interrompida', resultado)
+        estado = EstadoSincronizacao.objects.get(fonte=tasks.FONTE_COLAB)
+        self.assertIsNotNone(estado.ultima_execucao)
+        self.assertIn('500', estado.ultimo_erro)
+
+    def test_reexecucao_busca_apenas_alterados(self):
+        self.importar()
+        FakeColabHandler.requisicoes = []
+        FakeColabHandler.itens[2].update(status='resolvido', atualizado_em='2025-01-02T08:00:00+00:00')
+
+        self.importar()
+
+        self.assertEqual(FakeColabHandler.requisicoes[0]['atualizado_desde'], '2025-01-01T10:07:00+00:00')
+        self.assertEqual(len(FakeColabHandler.requisicoes), 1)
+        self.assertEqual(Processo.objects.count(), 7)
+        processo = Processo.objects.get(id_externo_colab='3')
+        self.assertEqual(processo.status, 'CONCLUIDO')
+        self.assertIsNotNone(processo.data_conclusao)
+        metricas = MetricaDiaria.objects.filter(servico=processo.servico_solicitado)
+        self.assertEqual(sum(m.abertos for m in metricas), 7)
+        self.assertEqual(sum(m.concluidos for m in metricas), 1)
+        self.assertEqual(sum(m.vencimentos for m in metricas), 6)
+        # Histórico: criação de cada um na primeira carga e a conclusão do item 3
+        self.assertEqual(ProcessoEvento.objects.filter(origem='IMPORTACAO', status_anterior__isnull=True).count(), 7)
+        self.assertEqual(list(processo.eventos.filter(status_anterior='ABERTO').values_list('status', flat=True)), ['CONCLUIDO'])
+
+    def test_itens_sem_servico_sao_ignorados(self):
+        FakeColabHandler.itens[0]['servico'] = 'Serviço Inexistente'
+        resultado = self.importar()
+        self.assertEqual(Processo.objects.count(), 6)
+        self.assertIn('1 ignorados', resultado)
+
+    def test_marca_dagua_nao_passa_de_item_com_servico_desconhecido(self):
+        FakeColabHandler.itens[3]['servico'] = 'Serviço Novo'
+        self.importar()
+        self.assertEqual(Processo.objects.count(), 6)
+        estado = EstadoSincronizacao.objects.get(fonte=tasks.FONTE_COLAB)
+        self.assertEqual(estado.marca_dagua.isoformat(), '2025-01-01T10:04:00+00:00')
+
+        # Cadastrado o serviço, a próxima execução relê o item a partir da marca
+        criar_servico("Serviço Novo")
+        self.importar()
+        self.assertTrue(Processo.objects.filter(id_externo_colab='4', servico_solicitado__nome_servico="Serviço Novo").exists())
+        estado.refresh_from_db()
+        self.assertEqual(estado.marca_dagua.isoformat(), '2025-01-01T10:07:00+00:00')
+
+    def test_coordenadas_invalidas_ignoram_so_o_item(self):
+        FakeColabHandler.itens[1].update(latitude='abc', longitude='-46.6')
+        with self.assertLogs('core.tasks', 'WARNING'):
+            resultado = self.importar()
+        self.assertEqual(Processo.objects.count(), 6)
+        self.assertIn('1 ignorados', resultado)
+        self.assertFalse(Processo.objects.filter(id_externo_colab='2').exists())
+
+    def test_parser_incremental_com_chunks_pequenos(self):
+        class RespostaFalsa:
+            corpo = json.dumps([{'id': 1, 'nome': 'ção'}, {'id': 2, 'itens': [1, 2]}]).encode('utf-8')
+
+            def iter_content(self, chunk_size):
+                for i in range(0, len(self.corpo), chunk_size):
+                    yield self.corpo[i:i + chunk_size]
+
+        itens = list(tasks.iterar_itens_json(RespostaFalsa(), chunk_size=3))
+        self.assertEqual(itens, [{'id': 1, 'nome': 'ção'}, {'id': 2, 'itens': [1, 2]}])
+
+
+class DashboardKPIsTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):  # hierarquia confirmada (on_commit), como fora dos testes
+            self.servico = criar_servico(prazo=5)
+        self.hoje = datetime.date.today()
+        hierarquia.obter_arvore()  # carregada uma vez por processo, fora das contagens abaixo
+
+    def criar_processos(self, quantidade, status='ABERTO'):
+        for n in range(quantidade):
+            Processo.objects.create(servico_solicitado=self.servico, solicitante=f"Munícipe {n}", status=status)
+
+    def test_contagens_condicionais(self):
+        self.criar_processos(3)
+        self.criar_processos(2, status='EM_ANALISE')
+        self.criar_processos(1, status='CONCLUIDO')
+        atrasado = Processo.objects.filter(pk=Processo.objects.first().pk)
+        with atualizando_metricas(atrasado):
+            atrasado.update(data_prazo=self.hoje - datetime.timedelta(days=1))
+
+        kpis = calcular_kpis_dashboard(hoje=self.hoje)
+
+        self.assertEqual(kpis.total_abertos, 5)
+        self.assertEqual(kpis.total_atrasados, 1)
+        self.assertEqual(kpis.total_criticos, 4)
+        self.assertEqual(kpis.por_status.as_dict(), {'labels': ['ABERTO', 'EM_ANALISE'], 'data': [3, 2]})
+        self.assertEqual(kpis.carga_secretarias.as_dict(), {'labels': ['SSUZ'], 'data': [5]})
+        json.dumps(kpis.as_dict())
+
+    def test_numero_de_consultas_nao_cresce_com_o_volume(self):
+        self.criar_processos(3)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('dashboard'))
+
+        self.criar_processos(40)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+
+class DashboardAssincronoTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):  # hierarquia confirmada (on_commit), como fora dos testes
+            self.servico = criar_servico(prazo=5)
+        for n in range(3):
+            Processo.objects.create(servico_solicitado=self.servico, solicitante=f"Munícipe {n}")
+        hierarquia.obter_arvore()  # carregada uma vez por processo, fora das contagens abaixo
+
+    async def test_views_assincronas_pelo_async_client(self):
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_processos_abertos'], 3)
+        self.assertEqual(len(response.context['processos_criticos']), 3)
+
+        response = await self.async_client.get(reverse('analise_servicos'))
+        self.assertEqual(response.context['total_servicos'], 1)
+
+    def test_dentro_de_transacao_consulta_em_sequencia_na_mesma_conexao(self):
+        with CaptureQueriesContext(connection) as consultas:
+            kpis = async_to_sync(acalcular_kpis_dashboard)()
+        self.assertEqual(len(consultas), 4)
+        self.assertEqual(kpis, calcular_kpis_dashboard())
+
+
+class ConsultasParalelasTests(TransactionTestCase):
+    def test_consultas_em_threads_com_conexoes_proprias(self):
+        servico = criar_servico(prazo=5)
+        for n in range(3):
+            Processo.objects.create(servico_solicitado=servico, solicitante=f"Munícipe {n}")
+
+        def consulta():
+            return threading.current_thread().name, Processo.objects.count()
+
+        resultados = async_to_sync(paralelo.consultar)(consulta, consulta)
+        self.assertEqual([total for _, total in resultados], [3, 3])
+        self.assertTrue(all(nome.startswith('gea-consultas') for nome, _ in resultados))
+        self.assertEqual(async_to_sync(acalcular_kpis_dashboard)(), calcular_kpis_dashboard())
+
+    @override_settings(GEA_CONSULTAS_PARALELAS=4, GEA_INSTRUMENTACAO=True)
+    def test_instrumentacao_conta_as_consultas_dos_threads(self):
+        criar_servico(prazo=5)
+        hierarquia.obter_arvore()
+        with medir() as medicao:
+            async_to_sync(acalcular_kpis_dashboard)()
+        self.assertEqual(medicao.consultas, 4)
+        self.assertGreater(medicao.tempo_banco, 0)
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertIn('desc="4 consultas"', response['Server-Timing'])
+
+
+class AnaliseServicosCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.servico = criar_servico()
+
+    def test_segunda_requisicao_nao_consulta_o_banco(self):
+        self.client.get(reverse('analise_servicos'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('analise_servicos'))
+        self.assertEqual(response.context['total_servicos'], 1)
+
+    def test_edicao_no_catalogo_invalida_o_cache(self):
+        self.assertEqual(obter_analise_servicos().total_nao_sistematizados, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servico.forma_solicitacao = '1Doc'
+            self.servico.save()
+
+        self.assertEqual(obter_analise_servicos().total_nao_sistematizados, 0)
+
+    def test_aviso_de_cache_local_ao_processo(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([aviso.id for aviso in checks.verificar_cache_compartilhado(None)], ['core.W001'])
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'gea_cache',
+        }}):
+            self.assertEqual(checks.verificar_cache_compartilhado(None), [])
+
+
+class ClassificacaoServicoTests(TestCase):
+    def test_regras_de_canal(self):
+        self.assertEqual(classificar_servico('Presencial', 'Não tem (Presencial)'), (CanalAtendimento.MANUAL, ''))
+        self.assertEqual(classificar_servico('WhatsApp ou e-mail', ''), (CanalAtendimento.MANUAL, ''))
+        self.assertEqual(classificar_servico(None, None), (CanalAtendimento.MANUAL, ''))
+        self.assertEqual(classificar_servico(' 1doc ', 'Terceirizado'), (CanalAtendimento.DIGITAL_TERCEIRO, '1Doc'))
+        self.assertEqual(
+            classificar_servico('Portal Prefeitura', 'Próprio'),
+            (CanalAtendimento.DIGITAL_PROPRIO, 'Portal Prefeitura'),
+        )
+
+    def test_save_atualiza_classificacao(self):
+        servico = criar_servico()
+        self.assertEqual(servico.canal, CanalAtendimento.MANUAL)
+        servico.forma_solicitacao = 'Colab'
+        servico.save(update_fields=['forma_solicitacao'])
+        servico.refresh_from_db()
+        self.assertEqual((servico.canal, servico.sistema), (CanalAtendimento.DIGITAL_TERCEIRO, 'Colab'))
+
+
+class HierarquiaDesnormalizadaTests(TestCase):
+    def setUp(self):
+        self.servico = criar_servico()
+        self.processo = Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        self.outra = Secretaria.objects.create(nome="Secretaria de Obras", sigla="SO")
+
+    def test_save_copia_a_hierarquia(self):
+        secretaria = self.servico.divisao_responsavel.departamento.secretaria
+        self.assertEqual(self.servico.secretaria, secretaria)
+        self.assertEqual(self.servico.departamento, self.servico.divisao_responsavel.departamento)
+        self.assertEqual(self.processo.secretaria, secretaria)
+
+    def test_mover_departamento_propaga_para_servicos_e_processos(self):
+        departamento = self.servico.departamento
+        departamento.secretaria = self.outra
+        departamento.save()
+
+        self.servico.refresh_from_db()
+        self.processo.refresh_from_db()
+        self.assertEqual(self.servico.secretaria, self.outra)
+        self.assertEqual(self.processo.secretaria, self.outra)
+
+    def test_mover_servico_de_divisao_propaga_para_processos(self):
+        departamento = Departamento.objects.create(secretaria=self.outra, nome="Departamento Geral")
+        self.servico.divisao_responsavel = Divisao.objects.create(departamento=departamento, nome="Atendimento Geral")
+        self.servico.save()
+
+        self.processo.refresh_from_db()
+        self.assertEqual(self.processo.secretaria, self.outra)
+
+    def test_reparo_corrige_divergencias(self):
+        Processo.objects.update(secretaria=self.outra)
+        CartaDeServicos.objects.update(secretaria=None, departamento=None)
+
+        self.assertEqual(reparar_hierarquia(), (1, 1))
+        self.assertEqual(reparar_hierarquia(), (0, 0))
+        self.processo.refresh_from_db()
+        self.assertEqual(self.processo.secretaria, self.servico.divisao_responsavel.departamento.secretaria)
+
+
+class DadosSinteticosTests(TestCase):
+    def test_gera_e_remove_volume_completo(self):
+        divisoes = sintetico.gerar_hierarquia(2)
+        servicos = sintetico.gerar_servicos(10, divisoes, semente=1)
+        usuarios = sintetico.gerar_usuarios(3)
+        sintetico.gerar_processos(50, servicos=servicos, responsaveis=usuarios, lote=20, semente=1)
+
+        self.assertEqual(sintetico.contar_processos_sinteticos(), 50)
+        # Situação do prazo como core.alertas a deixaria: nada a registrar numa varredura
+        self.assertTrue(Processo.objects.exclude(situacao_prazo=SituacaoPrazo.NO_PRAZO).exists())
+        self.assertEqual(alertas.detectar_transicoes(), 0)
+        self.assertFalse(Processo.objects.filter(status_desde__lt=F('data_protocolo')).exists())
+        fluxos = lambda: set(MetricaDiaria.objects.exclude(abertos=0, concluidos=0, vencimentos=0).values_list(
+            'data', 'servico_id', 'status', 'abertos', 'concluidos', 'vencimentos'))
+        consolidado = fluxos()
+        consolidacao.reconstruir()
+        self.assertEqual(fluxos(), consolidado)
+        self.assertFalse(Processo.objects.filter(secretaria__isnull=True).exists())
+        self.assertFalse(Processo.objects.filter(responsavel_atual__isnull=True).exists())
+        self.assertEqual(reparar_hierarquia(), (0, 0))
+
+        removidos = sintetico.remover_dados_sinteticos()
+        self.assertEqual(removidos['processos'], 50)
+        self.assertEqual(removidos['secretarias'], 2)
+        self.assertFalse(Secretaria.objects.exists())
+
+
+@override_settings(GEA_INSTRUMENTACAO=True)
+class InstrumentacaoTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):  # hierarquia confirmada (on_commit), como fora dos testes
+            criar_servico()
+        hierarquia.obter_arvore()  # carregada uma vez por processo, fora das contagens abaixo
+
+    def test_context_manager_conta_consultas(self):
+        with medir() as medicao:
+            list(CartaDeServicos.objects.all())
+            list(Secretaria.objects.all())
+        self.assertEqual(medicao.consultas, 2)
+        self.assertGreater(medicao.tempo_total, 0)
+
+    def test_middleware_emite_server_timing_e_histograma(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="4 consultas"', response['Server-Timing'])
+
+        self.client.get(reverse('dashboard'))
+        histograma = obter_histogramas()['dashboard']
+        self.assertEqual(histograma['requisicoes'], 2)
+        self.assertEqual(histograma['consultas']['5'], 2)
+
+    def test_views_registradas_ao_mesmo_tempo_nao_se_perdem(self):
+        views = [f'view{n}' for n in range(8)]
+        barreira = threading.Barrier(len(views))
+
+        def registrar(view):
+            barreira.wait()
+            for _ in range(5):
+                instrumentacao.registrar(view, Medicao())
+
+        threads = [threading.Thread(target=registrar, args=(view,)) for view in views]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        histogramas = obter_histogramas()
+        self.assertEqual(sorted(histogramas), views)
+        self.assertTrue(all(dados['requisicoes'] == 5 for dados in histogramas.values()))
+
+        instrumentacao.zerar_histogramas()
+        self.assertEqual(obter_histogramas(), {})
+
+    def test_comando_avisa_quando_o_cache_e_local(self):
+        saida, erros = io.StringIO(), io.StringIO()
+        call_command('metricas_requisicoes', stdout=saida, stderr=erros)
+        self.assertIn('core.W001', erros.getvalue())
+
+
+class AdminConsultasTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(self.admin)
+
+    def criar_processos(self, quantidade):
+        inicio = Processo.objects.count()
+        for n in range(inicio, inicio + quantidade):
+            with self.captureOnCommitCallbacks(execute=True):
+                servico = criar_servico(nome=f"Serviço {n}", sigla=f"S{n % 3}")
+            responsavel = User.objects.create(username=f"servidor{n}")
+            Processo.objects.create(servico_solicitado=servico, solicitante="Munícipe", responsavel_atual=responsavel)
+
+    def contar_consultas(self, url):
+        self.client.get(url)  # aquece os resumos em cache da changelist
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(capturadas)
+
+    def test_changelists_com_numero_constante_de_consultas(self):
+        urls = [
+            reverse('admin:core_processo_changelist'),
+            reverse('admin:core_cartadeservicos_changelist'),
+            reverse('admin:core_divisao_changelist'),
+            reverse('admin:core_departamento_changelist'),
+        ]
+        self.criar_processos(2)
+        poucos = [self.contar_consultas(url) for url in urls]
+        self.criar_processos(20)
+        muitos = [self.contar_consultas(url) for url in urls]
+        self.assertEqual(poucos, muitos)
+
+    def test_date_hierarchy_sem_filtros_le_os_dias_da_tarefa(self):
+        self.criar_processos(2)
+        antigo = timezone.make_aware(datetime.datetime(2024, 3, 15, 10))
+        Processo.objects.filter(pk=Processo.objects.first().pk).update(data_protocolo=antigo)
+        url = reverse('admin:core_processo_changelist')
+        distintos = lambda consultas: [c['sql'] for c in consultas if 'DISTINCT' in c['sql'] or 'MIN(' in c['sql']]
+
+        # Antes da tarefa: a changelist não varre a tabela e não mostra a navegação
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(distintos(consultas), [])
+        self.assertNotContains(response, 'data_protocolo__year=')
+
+        tasks.atualizar_resumos_datas()
+        ano = timezone.localdate().year
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+            self.assertContains(response, '?data_protocolo__year=2024')
+            self.assertContains(response, f'?data_protocolo__year={ano}')
+            response = self.client.get(url, {'data_protocolo__year': 2024})
+            self.assertContains(response, '?data_protocolo__month=3&amp;data_protocolo__year=2024')
+            self.assertNotContains(response, f'data_protocolo__year={ano}')
+        self.assertEqual(distintos(consultas), [])
+
+        # Com filtro: resumo do queryset filtrado, calculado e guardado em cache
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'status__exact': 'ABERTO'})
+        self.assertTrue(distintos(consultas))
+        self.assertContains(response, f'data_protocolo__year={ano}')
+
+    def test_dias_em_aberto_e_acao_em_lote(self):
+        self.criar_processos(3)
+        Processo.objects.filter(pk=Processo.objects.first().pk).update(status='CONCLUIDO')
+        response = self.client.post(reverse('admin:core_processo_changelist'), {
+            'action': 'marcar_como_concluido',
+            '_selected_action': list(Processo.objects.values_list('pk', flat=True)),
+        }, follow=True)
+        self.assertContains(response, "2 processos foram marcados como concluídos.")
+        self.assertFalse(Processo.objects.exclude(status='CONCLUIDO').exists())
+
+
+class ChangelistEscalavelTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        with self.captureOnCommitCallbacks(execute=True):  # hierarquia confirmada (on_commit), como fora dos testes
+            servico = criar_servico()
+        for _ in range(30):
+            Processo.objects.create(servico_solicitado=servico, solicitante="Munícipe")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_processo")
+
+    def test_paginador_usa_estimativa_acima_do_limiar(self):
+        queryset = Processo.objects.order_by('pk')
+        self.assertEqual(estimar_contagem(queryset), 30)
+        with override_settings(GEA_ADMIN_LIMIAR_CONTAGEM=10):
+            with self.assertNumQueries(1):  # só a consulta a pg_class, nenhum COUNT(*)
+                self.assertEqual(PaginadorEstimado(queryset, 10).count, 30)
+        with override_settings(GEA_ADMIN_LIMIAR_CONTAGEM=1000):
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assertEqual(PaginadorEstimado(queryset, 10).count, 30)
+            self.assertIn('COUNT(', capturadas[-1]['sql'])
+
+    def test_estimativa_com_filtro_vem_do_explain(self):
+        self.assertIsNotNone(estimar_contagem(Processo.objects.filter(status='ABERTO')))
+
+    def test_date_hierarchy_e_filtros_servidos_do_cache(self):
+        url = reverse('admin:core_processo_changelist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Secretaria SSUZ')
+        sqls = [consulta['sql'] for consulta in capturadas]
+        self.assertFalse([sql for sql in sqls if 'DATE_TRUNC' in sql.upper() or 'MIN(' in sql.upper()])
+        self.assertFalse([sql for sql in sqls if 'FROM "core_secretaria"' in sql])
+
+
+class MetricasDiariasTests(TestCase):
+    def setUp(self):
+        self.servico = criar_servico(prazo=5)
+        self.hoje = datetime.date.today()
+
+    def retrato(self):
+        campos = ('data', 'servico_id', 'secretaria_id', 'status', *consolidacao.CONTADORES_FLUXO)
+        return {
+            tuple(linha) for linha in MetricaDiaria.objects.values_list(*campos)
+            if any(linha[4:])
+        }
+
+    def assertConsistente(self):
+        incremental = self.retrato()
+        consolidacao.reconstruir()
+        self.assertEqual(incremental, self.retrato())
+
+    def test_save_admin_e_exclusao_mantem_as_metricas(self):
+        processos = [
+            Processo.objects.create(servico_solicitado=self.servico, solicitante=f"Munícipe {n}") for n in range(4)
+        ]
+        self.assertEqual(MetricaDiaria.objects.get(data=self.hoje, status='ABERTO').abertos, 4)
+
+        processos[0].status = 'EM_ANALISE'
+        processos[0].save()
+        processos[1].delete()
+        self.assertConsistente()
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:core_processo_changelist'), {
+            'action': 'marcar_como_concluido',
+            '_selected_action': [processos[0].pk, processos[2].pk],
+        })
+        concluidos = MetricaDiaria.objects.get(data=self.hoje, status='CONCLUIDO')
+        self.assertEqual((concluidos.abertos, concluidos.concluidos, concluidos.vencimentos), (2, 2, 0))
+        self.assertConsistente()
+
+    def test_update_em_lote_mantem_as_metricas_sem_o_chamador_pedir(self):
+        pks = [
+            Processo.objects.create(servico_solicitado=self.servico, solicitante=f"Munícipe {n}").pk for n in range(4)
+        ]
+        Processo.objects.filter(pk__in=pks[:2]).update(status='CONCLUIDO', data_conclusao=timezone.now())
+        Processo.objects.filter(status='ABERTO').update(data_prazo=self.hoje - datetime.timedelta(days=3))
+        # Dentro de atualizando_metricas() o update() não ajusta de novo
+        pendente = Processo.objects.filter(pk=pks[2])
+        with atualizando_metricas(pendente):
+            pendente.update(status='EM_ANALISE')
+        self.assertEqual(Processo.objects.filter(status='ABERTO').update(status='ABERTO'), 1)
+        self.assertEqual(Processo.objects.filter(status='CANCELADO').update(status='ABERTO'), 0)
+        self.assertConsistente()
+
+    def test_save_que_falha_nao_retira_as_metricas(self):
+        Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe", numero_protocolo="P-1")
+        processo = Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        antes = self.retrato()
+        processo.status = 'EM_ANALISE'
+        processo.numero_protocolo = "P-1"
+        with self.assertRaises(IntegrityError):
+            processo.save()
+        self.assertEqual(self.retrato(), antes)
+        self.assertConsistente()
+
+    def test_fechamento_do_dia_fotografa_o_estoque(self):
+        for _ in range(3):
+            Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        vencido = Processo.objects.filter(pk=Processo.objects.first().pk)
+        with atualizando_metricas(vencido):
+            vencido.update(data_prazo=self.hoje - datetime.timedelta(days=2))
+
+        consolidacao.fechar_dia(self.hoje)
+
+        linha = MetricaDiaria.objects.get(data=self.hoje, status='ABERTO')
+        self.assertEqual((linha.em_aberto_fim_dia, linha.atrasados_fim_dia), (3, 1))
+        self.assertEqual(calcular_kpis_dashboard(hoje=self.hoje).total_atrasados, 1)
+
+
+class MetricasAPITests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.servico = criar_servico()
+
+    def test_dashboard_responde_304_sem_consultar_o_banco(self):
+        Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        url = reverse('api_dashboard')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['dados']['total_abertos'], 1)
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            condicional = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Processo.objects.create(servico_solicitado=self.servico, solicitante="Outro Munícipe")
+        atualizado = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(atualizado.status_code, 200)
+        self.assertEqual(atualizado.json()['dados']['total_abertos'], 2)
+
+    def test_analise_servicos_com_gzip(self):
+        # Resposta grande o bastante para o gzip compensar mesmo com o preenchimento aleatório (BREACH)
+        for i in range(9):
+            criar_servico(nome=f"Serviço {i}", sigla=f"SEC{i}")
+        url = reverse('api_analise_servicos')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['dados']['total_servicos'], 10)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+
+class MapaAPITests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.servico = criar_servico()
+
+    def test_parametros_invalidos(self):
+        url = reverse('api_mapa_grupos')
+        self.assertEqual(self.client.get(url, {'bbox': '1,2,3', 'zoom': 10}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'bbox': '-46.4,-23.7,-46.0,-23.4', 'zoom': 40}).status_code, 400)
+        resposta = self.client.get(url, {'bbox': '-46.4,-23.7,-46.0,-23.4', 'zoom': 10, 'status': 'ABERTO,XYZ'})
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('status', resposta.json()['erro'])
+        self.assertEqual(self.client.get(reverse('api_mapa_tile', args=(2, 4, 0))).status_code, 400)
+        # '²'.isdigit() é verdadeiro, mas int('²') não: precisa ser 400, não 500
+        for secretaria in ('²', '-1', ' 1', '1.0'):
+            resposta = self.client.get(url, {'bbox': '-46.4,-23.7,-46.0,-23.4', 'zoom': 10, 'secretaria': secretaria})
+            self.assertEqual(resposta.status_code, 400, secretaria)
+            self.assertIn('secretaria', resposta.json()['erro'])
+
+    def test_celula_da_grade_diminui_com_o_zoom(self):
+        self.assertAlmostEqual(mapa.tamanho_celula(0) / mapa.tamanho_celula(1), 2)
+        self.assertAlmostEqual(mapa.tamanho_celula(0, pixels=mapa.TAMANHO_TILE), mapa.LARGURA_MUNDO)
+
+    @unittest.skipUnless(getattr(connection.ops, 'postgis', False), "requer PostGIS")
+    def test_grupos_e_tiles(self):
+        from django.contrib.gis.geos import Point
+        for lon, lat in [(-46.188, -23.522), (-46.1881, -23.5221), (-46.30, -23.60)]:
+            Processo.objects.create(
+                servico_solicitado=self.servico, solicitante="Munícipe", localizacao=Point(lon, lat, srid=4326),
+            )
+        Processo.objects.create(
+            servico_solicitado=self.servico, solicitante="Munícipe", status='CONCLUIDO',
+            localizacao=Point(-46.188, -23.522, srid=4326),
+        )
+        bbox = (-46.4, -23.7, -46.0, -23.4)
+
+        self.assertEqual([g['total'] for g in mapa.agrupar(bbox, zoom=11)], [2, 1])
+        self.assertEqual(sum(g['total'] for g in mapa.agrupar(bbox, zoom=11, status=['CONCLUIDO'])), 1)
+        self.assertEqual(len(mapa.agrupar(bbox, zoom=20)), 3)
+
+        url = reverse('api_mapa_tile', args=(11, 761, 1161))
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertTrue(response.content)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_tiles_expiram_por_tempo_e_nao_por_gravacao(self):
+        url = reverse('api_mapa_tile', args=(11, 761, 1161))
+        with unittest.mock.patch.object(mapa, 'gerar_tile', side_effect=[b'tile 1', b'tile 2']) as gerar, \
+                unittest.mock.patch.object(mapa, 'janela_tiles', return_value=1000):
+            primeira = self.client.get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+            # Processo gravado: o tile e a ETag continuam os da janela
+            self.assertEqual(self.client.get(url).content, b'tile 1')
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primeira['ETag']).status_code, 304)
+
+            mapa.janela_tiles.return_value = 1001
+            segunda = self.client.get(url)
+        self.assertEqual((primeira.content, segunda.content), (b'tile 1', b'tile 2'))
+        self.assertNotEqual(primeira['ETag'], segunda['ETag'])
+        self.assertEqual(gerar.call_count, 2)
+
+
+class MotorPrazosTests(TestCase):
+    SEXTA = datetime.date(2026, 10, 16)
+
+    def test_dias_uteis_pulam_fim_de_semana_e_feriados(self):
+        tabela = TabelaDiasUteis(Calendario.Contagem.UTEIS, [datetime.date(2026, 10, 19)], hoje=self.SEXTA)
+        self.assertEqual(tabela.prazo(self.SEXTA, 1), datetime.date(2026, 10, 20))
+        self.assertEqual(tabela.prazo(self.SEXTA, 5), datetime.date(2026, 10, 26))
+        self.assertEqual(tabela.prazo(self.SEXTA, 0), self.SEXTA)
+        self.assertEqual(tabela.dias_uteis_entre(self.SEXTA, datetime.date(2026, 10, 26)), 5)
+        # Fora da janela inicial, nos dois sentidos
+        self.assertEqual(tabela.prazo(datetime.date(1990, 1, 5), 1), datetime.date(1990, 1, 8))
+        self.assertEqual(tabela.prazo(datetime.date(2080, 1, 5), 1), datetime.date(2080, 1, 8))
+
+    def test_dias_corridos_prorrogam_para_dia_util(self):
+        tabela = TabelaDiasUteis(Calendario.Contagem.CORRIDOS, [], hoje=self.SEXTA)
+        self.assertEqual(tabela.prazo(self.SEXTA, 1), datetime.date(2026, 10, 19))
+        self.assertEqual(tabela.prazo(self.SEXTA, 4), datetime.date(2026, 10, 20))
+
+    def test_sem_calendario_conta_dias_corridos(self):
+        self.assertEqual(MotorPrazos().prazo(self.SEXTA, 1), datetime.date(2026, 10, 17))
+
+    def test_save_usa_calendario_da_secretaria(self):
+        servico = criar_servico(prazo=10)
+        calendario = Calendario.objects.create(nome="Prefeitura")
+        Secretaria.objects.filter(pk=servico.secretaria_id).update(calendario=calendario)
+        processo = Processo.objects.create(servico_solicitado=servico, solicitante="Munícipe")
+        hoje = timezone.localdate()
+        self.assertEqual(processo.data_prazo, obter_motor().prazo(hoje, 10, calendario.pk))
+        self.assertEqual(processo.data_prazo.weekday() < 5, True)
+
+    def test_recalculo_em_lote_depois_de_novo_feriado(self):
+        servico = criar_servico(prazo=3)
+        calendario = Calendario.objects.create(nome="Prefeitura")
+        Secretaria.objects.filter(pk=servico.secretaria_id).update(calendario=calendario)
+        for _ in range(5):
+            Processo.objects.create(servico_solicitado=servico, solicitante="Munícipe")
+        prazo_antigo = Processo.objects.first().data_prazo
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Feriado.objects.create(calendario=calendario, data=prazo_antigo)
+        # Serviços, combinações (serviço, dia) e o UPDATE, mais o ajuste das métricas: não cresce com os processos
+        with self.assertNumQueries(9):
+            self.assertEqual(recalcular_prazos_abertos(calendario.pk), 5)
+
+        novo = obter_motor().prazo(prazo_antigo, 1, calendario.pk)
+        self.assertEqual(set(Processo.objects.values_list('data_prazo', flat=True)), {novo})
+        self.assertEqual(MetricaDiaria.objects.get(data=novo, status='ABERTO').vencimentos, 5)
+        self.assertEqual(MetricaDiaria.objects.get(data=prazo_antigo, status='ABERTO').vencimentos, 0)
+
+
+class AlertasPrazoTests(TestCase):
+    def setUp(self):
+        self.hoje = timezone.localdate()
+        self.servico = criar_servico()
+        self.ana = User.objects.create(username="ana", email="ana@example.com")
+        self.bruno = User.objects.create(username="bruno", email="bruno@example.com")
+
+    def criar(self, dias, responsavel=None, status='ABERTO'):
+        processo = Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe", status=status, responsavel_atual=responsavel)
+        Processo.objects.filter(pk=processo.pk).update(data_prazo=self.hoje + datetime.timedelta(days=dias))
+        return processo
+
+    def test_registra_transicoes_uma_vez(self):
+        atrasado = self.criar(-2, self.ana)
+        proximo = self.criar(1, self.ana)
+        self.criar(30, self.bruno)
+        self.criar(-5, self.bruno, status='CONCLUIDO')
+
+        self.assertEqual(alertas.detectar_transicoes(self.hoje, antecedencia=3), 2)
+        self.assertEqual(
+            dict(Processo.objects.filter(pk__in=[atrasado.pk, proximo.pk]).values_list('pk', 'situacao_prazo')),
+            {atrasado.pk: SituacaoPrazo.ATRASADO, proximo.pk: SituacaoPrazo.PROXIMO},
+        )
+        # Nada mudou: a segunda execução não encontra candidatos
+        with self.assertNumQueries(3):
+            self.assertEqual(alertas.detectar_transicoes(self.hoje, antecedencia=3), 0)
+        # Dias depois o "próximo" vence
+        self.assertEqual(alertas.detectar_transicoes(self.hoje + datetime.timedelta(days=2), antecedencia=3), 1)
+        self.assertEqual(TransicaoPrazo.objects.filter(processo=proximo).count(), 2)
+
+    def test_lotes_por_chave(self):
+        for _ in range(5):
+            self.criar(-1)
+        self.assertEqual(alertas.detectar_transicoes(self.hoje, antecedencia=3, tamanho_lote=2), 5)
+        self.assertFalse(Processo.objects.filter(situacao_prazo=SituacaoPrazo.NO_PRAZO).exists())
+
+    def test_prorrogacao_volta_ao_prazo_sem_aviso(self):
+        processo = self.criar(-1, self.ana)
+        alertas.detectar_transicoes(self.hoje, antecedencia=3)
+        alertas.enviar_avisos()
+        Processo.objects.filter(pk=processo.pk).update(data_prazo=self.hoje + datetime.timedelta(days=20))
+
+        self.assertEqual(alertas.detectar_transicoes(self.hoje, antecedencia=3), 1)
+        processo.refresh_from_db()
+        self.assertEqual(processo.situacao_prazo, SituacaoPrazo.NO_PRAZO)
+        self.assertEqual(alertas.enviar_avisos(), (0, 0))
+
+    def test_um_email_por_responsavel(self):
+        self.criar(-2, self.ana)
+        self.criar(1, self.ana)
+        self.criar(-1, self.bruno)
+        self.criar(-1)
+        alertas.detectar_transicoes(self.hoje, antecedencia=3)
+
+        self.assertEqual(alertas.enviar_avisos(), (2, 3))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["ana@example.com", "bruno@example.com"])
+        aviso_ana = next(m for m in mail.outbox if m.to == ["ana@example.com"])
+        self.assertIn("2 processo(s)", aviso_ana.subject)
+        self.assertIn(self.servico.nome_servico, aviso_ana.body)
+        self.assertFalse(TransicaoPrazo.objects.filter(notificada_em__isnull=True).exists())
+        # Já avisados
+        self.assertEqual(alertas.enviar_avisos(), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class EventosProcessoTests(TestCase):
+    def setUp(self):
+        self.servico = criar_servico()
+        self.ana = User.objects.create(username="ana")
+
+    def test_save_registra_so_mudancas_rastreadas(self):
+        processo = Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        processo.solicitante = "Outro nome"
+        processo.save()
+        processo.status = 'EM_ANALISE'
+        processo.responsavel_atual = self.ana
+        processo.save()
+
+        criacao, analise = processo.eventos.order_by('registrado_em', 'pk')
+        self.assertEqual((criacao.status_anterior, criacao.status, criacao.origem), (None, 'ABERTO', ProcessoEvento.Origem.EDICAO))
+        self.assertEqual((analise.status_anterior, analise.status, analise.responsavel_id), ('ABERTO', 'EM_ANALISE', self.ana.pk))
+        self.assertEqual(analise.secretaria_id, self.servico.secretaria_id)
+        # O evento guarda o início do status anterior; o processo passa a contar do novo
+        processo.refresh_from_db()
+        self.assertLessEqual(analise.status_desde, criacao.registrado_em)
+        self.assertTrue(analise.status_desde < processo.status_desde <= analise.registrado_em)
+
+    def test_update_em_lote_grava_eventos_num_insert(self):
+        for _ in range(5):
+            Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        ProcessoEvento.objects.all().delete()
+
+        # Chaves; métricas retiradas (savepoint + INSERT ... ON CONFLICT); savepoint, estado antes, UPDATE,
+        # estado depois, status_desde, um INSERT com todos os eventos; métricas somadas
+        with self.assertNumQueries(12):
+            self.assertEqual(Processo.objects.filter(status='ABERTO').update(status='CONCLUIDO', data_conclusao=timezone.now()), 5)
+        self.assertEqual(ProcessoEvento.objects.filter(status_anterior='ABERTO', status='CONCLUIDO', origem='LOTE').count(), 5)
+
+        # Campos não rastreados não passam pelo histórico
+        with self.assertNumQueries(1):
+            Processo.objects.update(solicitante="Anônimo")
+        self.assertEqual(ProcessoEvento.objects.count(), 5)
+
+    def test_eventos_ficam_na_particao_do_mes(self):
+        self.assertEqual(eventos.criar_particoes(), [])
+        processo = Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {eventos.TABELA} WHERE processo_id = %s", [processo.pk])
+            self.assertEqual(cursor.fetchone()[0], eventos.nome_particao(timezone.now().date()))
+
+    def test_particao_nova_recebe_eventos_ja_gravados_na_padrao(self):
+        processo = Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe")
+        futuro = eventos.mes_seguinte(eventos.mes_seguinte(timezone.localdate().replace(day=1)))
+        for _ in range(eventos.MESES_A_FRENTE):
+            futuro = eventos.mes_seguinte(futuro)
+        registrado_em = timezone.make_aware(datetime.datetime.combine(futuro, datetime.time(12)))
+        ProcessoEvento.objects.create(processo=processo, registrado_em=registrado_em, origem='EDICAO', status='ABERTO')
+
+        self.assertEqual(eventos.criar_particoes(0, a_partir_de=futuro), [eventos.nome_particao(futuro)])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {eventos.TABELA} WHERE registrado_em = %s", [registrado_em])
+            self.assertEqual(cursor.fetchall(), [(eventos.nome_particao(futuro),)])
+            # A padrão voltou a ser a partição DEFAULT
+            cursor.execute("SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE relname = %s", [eventos.PARTICAO_PADRAO])
+            self.assertEqual(cursor.fetchone()[0], 'DEFAULT')
+
+    def test_tempo_medio_em_status_por_secretaria(self):
+        agora = timezone.now()
+        processos = [Processo.objects.create(servico_solicitado=self.servico, solicitante="Munícipe") for _ in range(2)]
+        Processo.objects.filter(pk__in=[p.pk for p in processos]).update(status='EM_ANALISE')
+        Processo.objects.filter(pk=processos[0].pk).update(status_desde=agora - datetime.timedelta(days=2))
+        Processo.objects.filter(pk=processos[1].pk).update(status_desde=agora - datetime.timedelta(days=4))
+        Processo.objects.filter(pk__in=[p.pk for p in processos]).update(status='CONCLUIDO')
+
+        linha, = eventos.tempo_medio_em_status('EM_ANALISE', agora - datetime.timedelta(days=1), agora + datetime.timedelta(days=1))
+        self.assertEqual(linha['secretaria__sigla'], 'SSUZ')
+        self.assertEqual(linha['saidas'], 2)
+        self.assertAlmostEqual(linha['media'].total_seconds() / 86400, 3, places=2)
+
+
+def extensao_instalada(nome):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = %s", [nome])
+        return cursor.fetchone() is not None
+
+
+class BuscaTextualTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.poda = criar_servico(nome="Poda de Árvore")
+        self.tapa = criar_servico(nome="Tapa-buraco", sigla="SMOB")
+        CartaDeServicos.objects.filter(pk=self.tapa.pk).update(descricao="Reparo de buracos na via; não inclui poda.")
+
+    def test_radicais_e_relevancia(self):
+        modo, servicos = busca.buscar_servicos("podas")
+        self.assertEqual(modo, 'textual')
+        # Nome pesa mais que descrição
+        self.assertEqual([s.pk for s in servicos], [self.poda.pk, self.tapa.pk])
+        self.assertEqual(busca.buscar_servicos("")[1], [])
+
+    def test_ignora_acentos(self):
+        if not extensao_instalada('unaccent'):
+            self.skipTest("extensão unaccent indisponível")
+        self.assertEqual([s.pk for s in busca.buscar_servicos("arvore")[1]], [self.poda.pk])
+
+    def test_similaridade_para_erros_de_digitacao(self):
+        if not extensao_instalada('pg_trgm'):
+            self.skipTest("extensão pg_trgm indisponível")
+        modo, servicos = busca.buscar_servicos("Tapaburaco")
+        self.assertEqual((modo, [s.pk for s in servicos]), ('similaridade', [self.tapa.pk]))
+
+    def test_vetor_acompanha_alteracoes_em_lote(self):
+        CartaDeServicos.objects.filter(pk=self.tapa.pk).update(nome_servico="Recapeamento asfáltico")
+        self.assertEqual([s.pk for s in busca.buscar_servicos("recapeamento")[1]], [self.tapa.pk])
+
+    def test_api_busca(self):
+        url = reverse('api_busca_servicos')
+        response = self.client.get(url, {'q': 'poda', 'limite': 1})
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()['dados']
+        self.assertEqual(dados['modo'], 'textual')
+        self.assertEqual([(r['id'], r['secretaria']) for r in dados['resultados']], [(self.poda.pk, 'SSUZ')])
+        self.assertEqual(self.client.get(url, {'q': 'poda', 'limite': 1}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'poda', 'limite': 500}).status_code, 400)
+
+    def test_busca_do_admin(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(admin)
+        processo = Processo.objects.create(
+            servico_solicitado=self.poda, solicitante="Maria Aparecida", numero_protocolo="2025/0001",
+            detalhes_solicitacao="Galhos encostando na fiação",
+        )
+        Processo.objects.create(servico_solicitado=self.tapa, solicitante="João", responsavel_atual=admin)
+        url = reverse('admin:core_processo_changelist')
+        # Prefixo das palavras, protocolo exato e login do responsável
+        for termo, esperado in (("apare", [processo.pk]), ("galho encost", [processo.pk]), ("2025/0001", [processo.pk]), ("admin", None)):
+            pks = [p.pk for p in self.client.get(url, {'q': termo}).context['cl'].result_list]
+            if esperado is None:
+                esperado = list(Processo.objects.filter(responsavel_atual=admin).values_list('pk', flat=True))
+            self.assertEqual(pks, esperado, termo)
+        servicos = self.client.get(reverse('admin:core_cartadeservicos_changelist'), {'q': 'tapa'}).context['cl'].result_list
+        self.assertEqual([s.pk for s in servicos], [self.tapa.pk])
+        # O vetor não é lido nas consultas comuns de processo
+        self.assertIn('busca', Processo.objects.get(pk=processo.pk).get_deferred_fields())
+
+
+class ImportacaoCartaTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+
+    def arquivo(self, nome, conteudo):
+        caminho = os.path.join(self.diretorio.name, nome)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        return caminho
+
+    def importar(self, *arquivos, **opcoes):
+        saida = io.StringIO()
+        call_command('import_carta_completa', *arquivos, stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_secretaria_e_entidade_acima_do_tamanho_do_modelo(self):
+        longa = self.arquivo('longa.csv', (
+            "Titulo,Entidade,Secretaria\n"
+            f"Poda de Árvore,Prefeitura,{'S' * 201}\n"
+            f"Tapa-buraco,{'E' * 101},Obras\n"
+            "Limpeza de Bueiro,Prefeitura,Obras\n"
+        ))
+        saida = self.importar(longa, verbosity=2)
+        self.assertIn("longa.csv, linha 2: secretaria com mais de 200 caracteres.", saida)
+        self.assertIn("longa.csv, linha 3: entidade com mais de 100 caracteres.", saida)
+        self.assertEqual(list(CartaDeServicos.objects.values_list('nome_servico', flat=True)), ["Limpeza de Bueiro"])
+
+    def test_varios_arquivos_com_layouts_diferentes(self):
+        completa = self.arquivo('completa.csv', (
+            "Titulo,Orgao,Entidade,Secretaria,Forma Solicitação,Tipo Sistema,Solicitação pela Internet\n"
+            "Poda de Árvore,Secretaria de Serviços Urbanos,Prefeitura,Serviços Urbanos,Sistema 1Doc,Terceirizado,https://exemplo.gov.br/poda\n"
+            "Tapa-buraco,Secretaria de Obras,Prefeitura,Obras,Presencial,,\n"
+        ))
+        # Layout antigo, separado por ';': só título e órgão (secretaria sai do órgão do outro arquivo)
+        antiga = self.arquivo('antiga.csv', "TITULO;ORGAO\nLimpeza de Bueiro;Secretaria de Obras\nSem Dono;Órgão Desconhecido\n;Secretaria de Obras\n")
+        saida = self.importar(completa, antiga, verbosity=2)
+
+        self.assertIn("Inseridos: 3", saida)
+        self.assertIn("Órgão Desconhecido", saida)
+        self.assertIn("linha 4: Título em branco.", saida)
+        bueiro = CartaDeServicos.objects.select_related('secretaria').get(nome_servico="Limpeza de Bueiro")
+        self.assertEqual((bueiro.secretaria.nome, bueiro.prazo_maximo_dias), ("Obras", 30))
+        poda = CartaDeServicos.objects.get(nome_servico="Poda de Árvore")
+        self.assertEqual((poda.canal, poda.entidade.nome), (CanalAtendimento.DIGITAL_TERCEIRO, "Prefeitura"))
+        self.assertEqual(Secretaria.objects.count(), 2)
+
+        # Reimportar só o layout antigo não apaga as colunas que ele não tem, nem o prazo ajustado
+        CartaDeServicos.objects.filter(pk=poda.pk).update(prazo_maximo_dias=10)
+        saida = self.importar(self.arquivo('so_poda.csv', "TITULO,ORGAO\nPoda de Árvore,Secretaria de Serviços Urbanos\n"))
+        self.assertIn("Inalterados: 1", saida)
+        poda.refresh_from_db()
+        self.assertEqual((poda.url_solicitacao, poda.prazo_maximo_dias), ("https://exemplo.gov.br/poda", 10))
+
+    def test_dry_run_mostra_diferencas_sem_gravar(self):
+        servico = criar_servico(nome="Poda de Árvore")
+        saida = self.importar(self.arquivo('carta.csv', (
+            "Titulo,Secretaria,Tipo,Solicitação pela Internet\n"
+            "Poda de Árvore,Secretaria SSUZ,Serviço,ftp:/invalido\n"
+            "Tapa-buraco,Obras,Serviço,\n"
+        )), dry_run=True, verbosity=2)
+        self.assertIn("Link inválido ignorado", saida)
+        self.assertIn("+ secretaria: Obras [OBRAS]", saida)
+        self.assertIn("+ serviço: Tapa-buraco [Obras]", saida)
+        self.assertIn("~ serviço: Poda de Árvore\n    tipo_servico: - -> Serviço", saida)
+        self.assertIn("simulada", saida)
+        self.assertEqual(CartaDeServicos.objects.count(), 1)
+        self.assertFalse(Secretaria.objects.filter(nome="Obras").exists())
+        self.assertEqual(CartaDeServicos.objects.get(pk=servico.pk).tipo_servico, None)
+
+    def test_leitura_em_processos_paralelos(self):
+        arquivos = [self.arquivo(f'parte{n}.csv', f"Titulo,Secretaria\nServiço {n},Obras\n") for n in range(2)]
+        lidos = importacao.ler_arquivos(arquivos, processos=2)
+        self.assertEqual([[l['titulo'] for _, l in lido.linhas] for lido in lidos], [["Serviço 0"], ["Serviço 1"]])
+
+    def test_xlsx(self):
+        try:
+            import openpyxl
+        except ImportError:
+            self.skipTest("openpyxl indisponível")
+        planilha = openpyxl.Workbook()
+        planilha.active.append(["Título", "Secretaria", "Coluna Nova"])
+        planilha.active.append(["Poda de Árvore", "Obras", "x"])
+        caminho = os.path.join(self.diretorio.name, 'carta.xlsx')
+        planilha.save(caminho)
+        saida = self.importar(caminho)
+        self.assertIn("colunas ignoradas: Coluna Nova", saida)
+        self.assertTrue(CartaDeServicos.objects.filter(nome_servico="Poda de Árvore", secretaria__nome="Obras").exists())
+
+    def test_reimportacao_pelo_hash_e_servicos_ausentes(self):
+        carta = self.arquivo('carta.csv', "Titulo,Secretaria,Tipo\nPoda de Árvore,Obras,Serviço\nTapa-buraco,Obras,Serviço\nBueiro,Obras,Serviço\n")
+        self.importar(carta)
+        poda = CartaDeServicos.objects.get(nome_servico="Poda de Árvore")
+        self.assertEqual((poda.arquivo_origem, poda.linha_origem, len(poda.hash_importacao)), ('carta.csv', 2, 64))
+
+        # Mesma planilha: nenhum UPDATE nem INSERT em serviços
+        with CaptureQueriesContext(connection) as consultas:
+            saida = self.importar(carta)
+        self.assertIn("Inalterados: 3", saida)
+        self.assertFalse([q for q in consultas.captured_queries if q['sql'].startswith(('UPDATE', 'INSERT'))])
+
+        # Edição pelo admin/save() invalida o hash; a reimportação restaura o valor da planilha
+        poda.tipo_servico = "Informação"
+        poda.save()
+        self.assertEqual(CartaDeServicos.objects.get(pk=poda.pk).hash_importacao, '')
+
+        # Tapa-buraco e Bueiro somem do arquivo: listados; com --remover-ausentes, marcados
+        self.arquivo('carta.csv', "Titulo,Secretaria,Tipo\nPoda de Árvore,Obras,Serviço\n")
+        saida = self.importar(carta, dry_run=True)
+        self.assertIn("- serviço: Tapa-buraco (ausente de carta.csv, linha 3)", saida)
+        self.assertIn("Ausentes: 2", saida)
+        self.assertFalse(CartaDeServicos.objects.filter(removido_em__isnull=False).exists())
+        self.importar(carta, remover_ausentes=True)
+        self.assertEqual(
+            set(CartaDeServicos.objects.filter(removido_em__isnull=False).values_list('nome_servico', flat=True)),
+            {"Tapa-buraco", "Bueiro"},
+        )
+        self.assertEqual(CartaDeServicos.objects.get(pk=poda.pk).tipo_servico, "Serviço")
+        self.assertEqual(list(CartaDeServicos.objects.ativos().values_list('pk', flat=True)), [poda.pk])
+
+        # Voltou ao arquivo: deixa de estar removido
+        self.arquivo('carta.csv', "Titulo,Secretaria,Tipo\nPoda de Árvore,Obras,Serviço\nBueiro,Obras,Serviço\n")
+        self.assertIn("Atualizados: 1", self.importar(carta))
+        self.assertIsNone(CartaDeServicos.objects.get(nome_servico="Bueiro").removido_em)
+
+    def test_reimportacao_conta_e_reporta_sigla_em_uso(self):
+        saude = Secretaria.objects.create(nome="Secretaria de Saúde", sigla="SDS")
+        carta = self.arquivo('carta.csv', (
+            "Titulo,Secretaria,Tipo\n"
+            "Poda de Árvore,Secretaria de Segurança,Serviço\n"
+            "Tapa-buraco,Secretaria de Saúde,Serviço\n"
+            ",Secretaria de Saúde,Serviço\n"
+            "Bueiro,,Serviço\n"
+        ))
+        saida = self.importar(carta, verbosity=2)
+        self.assertIn(
+            "Linhas lidas: 2 | Inseridos: 2 | Atualizados: 0 | Inalterados: 0 | Ausentes: 0 | Problemas: 3", saida,
+        )
+        self.assertIn("carta.csv, linha 4: Título em branco.", saida)
+        self.assertIn("carta.csv, linha 5: Secretaria (ou Órgão) em branco.", saida)
+        self.assertIn("Secretaria 'Secretaria de Segurança': sigla SDS já usada por 'Secretaria de Saúde'; criada como SDS2.", saida)
+        # A secretaria que já tinha a sigla continua a mesma, com seus serviços
+        self.assertEqual(
+            set(Secretaria.objects.values_list('nome', 'sigla')),
+            {("Secretaria de Saúde", "SDS"), ("Secretaria de Segurança", "SDS2")},
+        )
+        self.assertEqual(CartaDeServicos.objects.get(nome_servico="Tapa-buraco").secretaria_id, saude.pk)
+
+        self.arquivo('carta.csv', (
+            "Titulo,Secretaria,Tipo\n"
+            "Poda de Árvore,Secretaria de Segurança,Serviço\n"
+            "Tapa-buraco,Secretaria de Saúde,Informação\n"
+            "Bueiro,Secretaria de Saúde,Serviço\n"
+        ))
+        saida = self.importar(carta)
+        self.assertIn(
+            "Linhas lidas: 3 | Inseridos: 1 | Atualizados: 1 | Inalterados: 1 | Ausentes: 0 | Problemas: 0", saida,
+        )
+        self.assertEqual(CartaDeServicos.objects.get(nome_servico="Tapa-buraco").tipo_servico, "Informação")
+        self.assertEqual(Secretaria.objects.count(), 2)
+
+
+class CatalogoPublicoTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):  # hierarquia confirmada (on_commit), como fora dos testes
+            self.servicos = [criar_servico(f"Serviço {n}", sigla="SSUZ" if n % 2 else "SOBR") for n in range(5)]
+        self.servicos[0].forma_solicitacao = '1Doc'
+        self.servicos[0].tipo_sistema = 'Terceirizado'
+        self.servicos[0].save()
+        self.url = reverse('api_servicos')
+        hierarquia.obter_arvore()  # carregada uma vez por processo, fora das contagens abaixo
+
+    def test_paginacao_por_cursor_percorre_tudo_sem_repetir(self):
+        ids, parametros = [], {'limite': 2, 'campos': 'id,nome'}
+        while True:
+            with self.assertNumQueries(1):
+                dados = self.client.get(self.url, parametros).json()['dados']
+            self.assertTrue(all(item.keys() == {'id', 'nome'} for item in dados['resultados']))
+            ids.extend(item['id'] for item in dados['resultados'])
+            if dados['proximo'] is None:
+                break
+            self.assertIn(f"cursor={dados['proximo_cursor']}", dados['proximo'])
+            parametros['cursor'] = dados['proximo_cursor']
+        self.assertEqual(ids, [s.pk for s in self.servicos])
+
+    def test_filtros(self):
+        def ids(**filtros):
+            return [item['id'] for item in self.client.get(self.url, filtros).json()['dados']['resultados']]
+
+        self.assertEqual(ids(secretaria='ssuz'), [self.servicos[1].pk, self.servicos[3].pk])
+        self.assertEqual(ids(canal='digital_terceiro'), [self.servicos[0].pk])
+        self.assertEqual(ids(canal='manual', secretaria='SOBR'), [self.servicos[2].pk, self.servicos[4].pk])
+        CartaDeServicos.objects.filter(pk=self.servicos[4].pk).update(removido_em=timezone.now())
+        get_cache().clear()
+        resultado = self.client.get(self.url, {'secretaria': 'SOBR', 'campos': 'secretaria'}).json()['dados']['resultados']
+        self.assertEqual(resultado, [{'secretaria': 'SOBR'}, {'secretaria': 'SOBR'}])
+
+    def test_parametros_invalidos(self):
+        for parametros in ({'cursor': 'xx'}, {'campos': 'id,senha'}, {'canal': 'fax'}, {'secretaria': 'NADA'}, {'limite': 1000},
+                           {'secretaria': '²'}, {'entidade': '³'}, {'entidade': '-1'}, {'cursor': 'wrI'}):
+            response = self.client.get(self.url, parametros)
+            self.assertEqual(response.status_code, 400, parametros)
+            self.assertFalse(response.has_header('ETag'))
+
+    def test_etag_forte_e_cache_por_combinacao_de_filtros(self):
+        response = self.client.get(self.url, {'secretaria': 'SSUZ'})
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, {'secretaria': 'SSUZ'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get(self.url, {'secretaria': 'SSUZ'}).content, response.content)
+        self.assertNotEqual(self.client.get(self.url, {'secretaria': 'SOBR'})['ETag'], etag)
+
+        # Mudança no catálogo invalida a página em cache
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servicos[1].nome_servico = "Poda de Árvore"
+            self.servicos[1].save()
+        response = self.client.get(self.url, {'secretaria': 'SSUZ'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['dados']['resultados'][0]['nome'], "Poda de Árvore")
+
+
+class ExportacaoTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        self.client.force_login(self.admin)
+        self.servico = criar_servico()
+        self.processos = [
+            Processo.objects.create(
+                servico_solicitado=self.servico, solicitante=f"Munícipe {n}", numero_protocolo=f"2026/{n}",
+                detalhes_solicitacao="Galho caído\x0b na calçada",
+            )
+            for n in range(3)
+        ]
+
+    def baixar(self, response):
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content)
+
+    def test_csv_de_processos_com_a_hierarquia(self):
+        response = self.client.get(reverse('api_exportar_processos', args=['csv']), {'status': 'ABERTO'})
+        self.assertIn('attachment; filename="processos-', response['Content-Disposition'])
+        linhas = list(csv.reader(io.StringIO(self.baixar(response).decode('utf-8-sig')), delimiter=';'))
+
+        self.assertEqual(linhas[0][:8], ['ID', 'Protocolo', 'ID ColabGov', 'Solicitante', 'Serviço', 'Secretaria', 'Departamento', 'Divisão'])
+        self.assertEqual(len(linhas), 4)
+        self.assertEqual(
+            linhas[1][:9],
+            [str(self.processos[0].pk), '2026/0', '', 'Munícipe 0', 'Poda de Árvore', 'SSUZ', 'Departamento Geral', 'Atendimento Geral', 'Aberto'],
+        )
+
+    def test_csv_nao_exporta_formulas(self):
+        Processo.objects.filter(pk=self.processos[0].pk).update(
+            solicitante='=HYPERLINK("http://exemplo.com","x")', detalhes_solicitacao="-2+3",
+        )
+        Processo.objects.filter(pk=self.processos[1].pk).update(solicitante="@SUM(A1)", detalhes_solicitacao="+55 11")
+        response = self.client.get(reverse('api_exportar_processos', args=['csv']))
+        linhas = list(csv.reader(io.StringIO(self.baixar(response).decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual(
+            [(linha[3], linha[14]) for linha in linhas[1:3]],
+            [("'=HYPERLINK(\"http://exemplo.com\",\"x\")", "'-2+3"), ("'@SUM(A1)", "'+55 11")],
+        )
+        self.assertEqual(linhas[3][3], "Munícipe 2")
+
+    async def test_iterador_assincrono_sob_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('api_exportar_processos', args=['csv']))
+        self.assertTrue(response.is_async)
+        conteudo = b''.join([pedaco async for pedaco in response.streaming_content])
+        linhas = list(csv.reader(io.StringIO(conteudo.decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual([linha[1] for linha in linhas[1:]], ['2026/0', '2026/1', '2026/2'])
+
+    def test_parametros_e_permissao(self):
+        self.assertEqual(self.client.get(reverse('api_exportar_processos', args=['pdf'])).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_exportar_processos', args=['csv'])).status_code, 403)
+
+    def test_xlsx_dividido_em_abas(self):
+        with unittest.mock.patch.object(exportacao, 'LINHAS_POR_ABA', 3):
+            conteudo = self.baixar(exportacao.exportar(Processo.objects.all(), 'xlsx'))
+
+        pacote = zipfile.ZipFile(io.BytesIO(conteudo))
+        self.assertIsNone(pacote.testzip())
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        abas = ElementTree.fromstring(pacote.read('xl/workbook.xml')).findall('s:sheets/s:sheet', ns)
+        self.assertEqual([aba.get('name') for aba in abas], ['Processos', 'Processos (2)'])
+        planilhas = [ElementTree.fromstring(pacote.read(f'xl/worksheets/sheet{n}.xml')) for n in (1, 2)]
+        self.assertEqual([len(p.findall('s:sheetData/s:row', ns)) for p in planilhas], [3, 2])
+        # Cabeçalho repetido, ID numérico e caractere de controle removido do texto
+        segunda = planilhas[1].findall('s:sheetData/s:row', ns)
+        self.assertEqual(segunda[0].find('s:c/s:is/s:t', ns).text, 'ID')
+        self.assertEqual(segunda[1].find('s:c/s:v', ns).text, str(self.processos[2].pk))
+        self.assertIn('Galho caído na calçada', [t.text for t in segunda[1].iter(f"{{{ns['s']}}}t")])
+
+    def test_acao_do_admin_e_catalogo_reimportavel(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            original = os.path.join(diretorio, 'carta.csv')
+            with open(original, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(
+                    "Titulo,Orgao,Entidade,Secretaria,Forma Solicitação,Tipo Sistema,Solicitação pela Internet\n"
+                    "Tapa-buraco,Secretaria de Obras,Prefeitura,Obras,Sistema 1Doc,Terceirizado,https://exemplo.gov.br/buraco\n"
+                    "Limpeza de Bueiro,Secretaria de Obras,Prefeitura,Obras,Presencial,,\n"
+                    "=Vistoria de Calçada,Secretaria de Obras,Prefeitura,Obras,Presencial,,\n"
+                )
+            call_command('import_carta_completa', original, stdout=io.StringIO())
+            importados = CartaDeServicos.objects.filter(secretaria__nome="Obras").values_list('pk', flat=True)
+
+            response = self.client.post(reverse('admin:core_cartadeservicos_changelist'), {
+                'action': 'exportar_csv', '_selected_action': list(importados),
+            })
+            exportado = os.path.join(diretorio, 'servicos.csv')
+            with open(exportado, 'wb') as arquivo:
+                arquivo.write(self.baixar(response))
+            saida = io.StringIO()
+            call_command('import_carta_completa', exportado, dry_run=True, stdout=saida)
+        self.assertIn("Inseridos: 0 | Atualizados: 0 | Inalterados: 3", saida.getvalue())
+
+
+class DistribuicaoTests(TestCase):
+    def setUp(self):
+        self.poda = criar_servico(nome="Poda de Árvore")
+        self.tapa = criar_servico(nome="Tapa-buraco", sigla="SMOB")
+        self.sem_ninguem = criar_servico(nome="Alvará", sigla="SDET")
+        self.ana, self.bia, self.caio, inativo = (
+            User.objects.create_user(nome, is_active=nome != 'inativo') for nome in ('ana', 'bia', 'caio', 'inativo')
+        )
+        for usuario in (self.ana, self.bia, inativo):
+            Lotacao.objects.create(usuario=usuario, divisao=self.poda.divisao_responsavel)
+        # Ninguém na divisão do tapa-buraco: vale o departamento
+        outra = Divisao.objects.create(departamento=self.tapa.departamento, nome="Fiscalização")
+        Lotacao.objects.create(usuario=self.caio, divisao=outra)
+        Processo.objects.create(
+            servico_solicitado=self.poda, solicitante="x", responsavel_atual=self.ana, situacao_prazo=SituacaoPrazo.ATRASADO,
+        )
+
+    def criar(self, servico, quantidade):
+        return [Processo.objects.create(servico_solicitado=servico, solicitante="x").pk for _ in range(quantidade)]
+
+    def test_distribui_pela_menor_carga_da_divisao(self):
+        podas = self.criar(self.poda, 4)
+        tapas = self.criar(self.tapa, 2)
+        alvara = self.criar(self.sem_ninguem, 1)
+        atribuicoes = distribuicao.distribuir()
+
+        # Ana já tem um atrasado (peso 3): Bia recebe até empatar, e o empate vai para quem veio antes
+        self.assertEqual([atribuicoes[pk] for pk in podas], [self.bia.pk] * 3 + [self.ana.pk])
+        self.assertEqual([atribuicoes[pk] for pk in tapas], [self.caio.pk] * 2)
+        self.assertNotIn(alvara[0], atribuicoes)
+        self.assertEqual(Processo.objects.filter(responsavel_atual=self.bia).count(), 3)
+        self.assertEqual(ProcessoEvento.objects.filter(origem='LOTE', responsavel=self.caio).count(), 2)
+        # Já atribuídos não são redistribuídos
+        self.assertEqual(distribuicao.distribuir(), {})
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        lotacoes = self.client.get(reverse('admin:core_lotacao_changelist')).context['cl'].result_list
+        self.assertEqual({l.usuario.username: l.carga for l in lotacoes}, {'ana': 2, 'bia': 3, 'caio': 2, 'inativo': None})
+
+    def test_planejamento_de_milhares_em_memoria(self):
+        grupos = {('divisao', d): {d * 100 + u for u in range(10)} for d in range(5)}
+        indice = distribuicao.IndiceCarga({0: 50}, grupos)
+        pendentes = [(pk, pk % 5, SituacaoPrazo.NO_PRAZO) for pk in range(20000)]
+        servicos = {s: (('divisao', s),) for s in range(5)}
+        inicio = time.perf_counter()
+        atribuicoes = distribuicao.planejar(pendentes, servicos, indice)
+        self.assertLess(time.perf_counter() - inicio, 1)
+        self.assertEqual(len(atribuicoes), 20000)
+        cargas = Counter(atribuicoes.values())
+        # 4000 processos por divisão: todos terminam com carga 405, inclusive quem já tinha 50
+        self.assertEqual((cargas[0], {cargas[u] for u in range(1, 10)}), (355, {405}))
+        self.assertEqual(max(indice.cargas.values()), 405)
+
+
+class ArvoreHierarquiaTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):  # hierarquia confirmada (on_commit), como fora dos testes
+            self.servico = criar_servico()
+        self.divisao = self.servico.divisao_responsavel
+        self.departamento = self.divisao.departamento
+        self.secretaria = self.departamento.secretaria
+
+    def test_consultas_e_navegacao_em_memoria(self):
+        arvore = hierarquia.obter_arvore()
+        with self.assertNumQueries(0):
+            self.assertIs(hierarquia.obter_arvore(), arvore)
+            self.assertEqual(arvore.secretaria_por_sigla('SSUZ').id, self.secretaria.pk)
+            self.assertEqual(arvore.secretaria_por_nome("Secretaria SSUZ").sigla, 'SSUZ')
+            self.assertEqual(arvore.filho_por_nome(hierarquia.DEPARTAMENTO, self.secretaria.pk, "Departamento Geral").id, self.departamento.pk)
+            self.assertEqual(
+                [(no.tipo, no.id) for no in arvore.ancestrais(hierarquia.DIVISAO, self.divisao.pk)],
+                [(hierarquia.DEPARTAMENTO, self.departamento.pk), (hierarquia.SECRETARIA, self.secretaria.pk)],
+            )
+            self.assertEqual(arvore.secretaria_de(hierarquia.DIVISAO, self.divisao.pk).sigla, 'SSUZ')
+            self.assertEqual(
+                [no.id for no in arvore.descendentes(hierarquia.SECRETARIA, self.secretaria.pk, so_tipo=hierarquia.DIVISAO)],
+                [self.divisao.pk],
+            )
+            self.assertIsNone(arvore.divisao(-1))
+
+    def test_gravacao_invalida_a_arvore(self):
+        arvore = hierarquia.obter_arvore()
+        Divisao.objects.create(departamento=self.departamento, nome="Fiscalização")
+        nova = hierarquia.obter_arvore()
+        self.assertIsNot(nova, arvore)
+        self.assertEqual(len(nova.descendentes(hierarquia.DEPARTAMENTO, self.departamento.pk)), 2)
+
+    def test_rollback_nao_deixa_no_fantasma_na_arvore(self):
+        arvore = hierarquia.obter_arvore()
+        anterior = versao(NAMESPACE_HIERARQUIA)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Divisao.objects.create(departamento=self.departamento, nome="Fiscalização")
+            # A transação lê a própria árvore, sem ocupar o cache do processo
+            dentro = hierarquia.obter_arvore()
+            self.assertEqual(len(dentro.descendentes(hierarquia.DEPARTAMENTO, self.departamento.pk)), 2)
+            raise RuntimeError
+        self.assertEqual(versao(NAMESPACE_HIERARQUIA), anterior)
+        with self.assertNumQueries(0):
+            self.assertIs(hierarquia.obter_arvore(), arvore)
+        self.assertEqual(len(arvore.descendentes(hierarquia.DEPARTAMENTO, self.departamento.pk)), 1)
+
+    def test_gerar_sigla(self):
+        self.assertEqual(hierarquia.gerar_sigla("SEMAE"), "SEMAE")
+        self.assertEqual(hierarquia.gerar_sigla("Secretaria de Saúde"), "SDS")
+        self.assertEqual(hierarquia.gerar_sigla("Secretaria de Segurança", {"SDS", "SDS2"}), "SDS3")
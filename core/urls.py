@@ -1,8 +1,20 @@
 # /var/www/gea/core/urls.py
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.dashboard_view, name='dashboard'),
     path('analise-servicos/', views.analise_servicos_view, name='analise_servicos'),
-]
\ No newline at end of file
+
+    # API JSON das métricas (somente leitura, com GET condicional)
+    path('api/v1/dashboard/', api.dashboard_api, name='api_dashboard'),
+    path('api/v1/analise-servicos/', api.analise_servicos_api, name='api_analise_servicos'),
+    path('api/v1/servicos/', api.servicos_api, name='api_servicos'),
+    path('api/v1/servicos/busca/', api.busca_servicos_api, name='api_busca_servicos'),
+    path('api/v1/mapa/grupos/', api.mapa_grupos_api, name='api_mapa_grupos'),
+    path('api/v1/mapa/tiles/<int:z>/<int:x>/<int:y>.mvt', api.mapa_tile_api, name='api_mapa_tile'),
+
+    # Exportação em CSV/XLSX (exige permissão de visualização no admin)
+    path('api/v1/exportar/processos.<str:formato>', api.exportar_processos_api, name='api_exportar_processos'),
+    path('api/v1/exportar/servicos.<str:formato>', api.exportar_servicos_api, name='api_exportar_servicos'),
+]
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,10 +40,12 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.gis',
+    'django.contrib.postgres',
     'core',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentacaoMiddleware',  # só ativo com GEA_INSTRUMENTACAO = True
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -136,11 +140,75 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Configuração de segurança para CSRF em ambiente de produção com HTTPS
 CSRF_TRUSTED_ORIGINS = ['https://gea.mogidascruzes.sp.gov.br']
 
+# Cache compartilhado por todos os processos (servidor, workers do Celery, comandos): as versões
+# dos namespaces de core.cache, a árvore da hierarquia e os histogramas da instrumentação ficam
+# nele. Requer o pacote redis; um backend local (LocMemCache) gera o aviso core.W001.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    },
+}
+
 # automação da API de dados processos ColabGov
 CELERY_BEAT_SCHEDULE = {
     'importar-colab-a-cada-15-minutos': {
         'task': 'core.tasks.importar_dados_colab',
         'schedule': 900.0,  # 900 segundos = 15 minutos
     },
+    # Fotografia do estoque do dia em core.MetricaDiaria (os fluxos são atualizados em tempo real)
+    'fechar-metricas-do-dia': {
+        'task': 'core.tasks.fechar_dia_metricas',
+        'schedule': crontab(hour=23, minute=55),
+    },
+    # Transições de prazo (no prazo -> próximo -> atrasado) e aviso agrupado aos responsáveis
+    'verificar-prazos': {
+        'task': 'core.tasks.verificar_prazos',
+        'schedule': crontab(minute=10),
+    },
+    # Partições mensais do histórico de status (core.ProcessoEvento), criadas com antecedência
+    'criar-particoes-eventos': {
+        'task': 'core.tasks.criar_particoes_eventos',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    # Navegação por datas da changelist de processos (core.paginacao.HIERARQUIAS_DATAS)
+    'atualizar-resumos-datas-admin': {
+        'task': 'core.tasks.atualizar_resumos_datas',
+        'schedule': 300.0,
+    },
     # Adicionaríamos outras tarefas aqui para o 1Doc, etc.
-}
\ No newline at end of file
+}
+
+# Acesso à API do ColabGov (core.tasks.importar_dados_colab)
+COLAB_API_URL = 'URL_DA_API_COLABGOV'
+COLAB_API_USUARIO = 'usuario'
+COLAB_API_SENHA = 'senha'
+COLAB_TAMANHO_PAGINA = 500  # itens por requisição
+COLAB_TAMANHO_LOTE = 500  # processos por upsert
+
+# Instrumentação por requisição (core.middleware.InstrumentacaoMiddleware): consultas SQL,
+# tempos de banco/template/Python no cabeçalho Server-Timing e histogramas por view
+GEA_INSTRUMENTACAO = False
+GEA_INSTRUMENTACAO_LENTO_MS = 500  # acima disso a requisição é registrada no log como lenta
+GEA_INSTRUMENTACAO_MAX_CONSULTAS = 50  # ... ou com consultas demais
+GEA_INSTRUMENTACAO_MAX_REPETICOES = 10  # ... ou com o mesmo SQL repetido (N+1)
+
+# Changelist de Processo (core.paginacao): acima deste total estimado a contagem exata não é feita,
+# e os resumos da date_hierarchy com filtros ficam em cache por este tempo (segundos); sem filtros
+# ela lê os dias gravados pela tarefa atualizar-resumos-datas-admin
+GEA_ADMIN_LIMIAR_CONTAGEM = 50000
+GEA_ADMIN_TIMEOUT_RESUMOS = 300
+
+# Verificação de prazos (core.alertas): quantos dias antes do vencimento o processo passa a "próximo"
+GEA_ALERTA_ANTECEDENCIA_DIAS = 3
+
+# Distribuição automática (core.distribuicao) dos processos sem responsável ao fim de cada importação do ColabGov
+GEA_DISTRIBUICAO_AUTOMATICA = True
+
+# Views assíncronas do dashboard e da análise (core.paralelo): threads, cada um com sua conexão,
+# para as consultas independentes de uma página; 1 desliga (consultas em sequência)
+GEA_CONSULTAS_PARALELAS = 4
+
+# Mapa dos processos (core.mapa): segundos que um vector tile fica em cache; gravações de
+# processos não o descartam, então é também o atraso máximo do mapa
+GEA_MAPA_TIMEOUT_TILES = 60